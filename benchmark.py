@@ -0,0 +1,492 @@
+import argparse
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+import PIL
+import reportlab
+from PIL import Image
+
+from main import (InvoiceGenerator, ItemStore, TotalsEngine, LOGO_CACHE, PDF_PROFILES, IMAGE_PROFILES,
+                  InvoiceStore, ReportData, build_reports, to_cents,
+                  get_exporter, load_invoice_record, render_pdf_invoice, render_pdf_statement,
+                  invoice_totals, paginate_image_items, render_image_page, image_page_top, _image_logo)
+
+DEFAULT_SIZES = '10,100,1000,10000,100000'
+OPERATIONS = ('calculate_totals', 'create_invoice_template', 'create_pdf_invoice', 'create_image_invoice')
+
+
+def make_invoice(item_count, logo_path=None):
+    return load_invoice_record({
+        'company_name': "Benchmark Co",
+        'company_address': "1 Benchmark Road\nTest City",
+        'customer_name': "Customer",
+        'customer_address': "2 Customer Street",
+        'invoice_number': f"BENCH-{item_count}",
+        'invoice_date': "2026-01-01",
+        'due_date': "2026-01-31",
+        'tax_rate': "7.5",
+        'discount': "2",
+        'logo_path': logo_path,
+        'items': [{'description': f"Metered usage line {i}", 'quantity': 1 + i % 7, 'rate': 0.25}
+                  for i in range(item_count)]
+    })
+
+
+def make_logo(path):
+    # A photo-sized gradient so decoding and scaling cost something real
+    size = (1600, 900)
+    logo = Image.linear_gradient('L').resize(size)
+    Image.merge('RGB', (logo, logo.transpose(Image.Transpose.FLIP_LEFT_RIGHT), logo)).save(path)
+    return path
+
+
+def make_photo_logo(path):
+    # Colour noise: like a photo, it barely compresses losslessly
+    size = (1600, 900)
+    bands = [Image.effect_noise(size, sigma) for sigma in (40, 60, 80)]
+    Image.merge('RGB', bands).save(path, quality=90)
+    return path
+
+
+class _Value:
+    def __init__(self, value):
+        self.value = value
+
+    def get(self):
+        return self.value
+
+
+class HeadlessInvoice:
+    # Just the state InvoiceGenerator's render methods read, so they can be
+    # driven without a Tk window
+    def __init__(self, invoice):
+        self.invoice = invoice
+        self.items = ItemStore()
+        for item in invoice['items']:
+            self.items.add(item)
+        self.totals_engine = TotalsEngine(invoice['items'])
+        self.tax_rate = _Value(invoice['tax_rate'])
+        self.discount = _Value(invoice['discount'])
+        self.logo_path = invoice['logo_path']
+
+    def get_invoice_data(self):
+        return self.invoice
+
+
+def run_operation(op, harness, output_dir):
+    # Returns the size in bytes of whatever the operation produced
+    if op == 'calculate_totals':
+        InvoiceGenerator.calculate_totals(harness)
+        return 0
+    if op == 'create_invoice_template':
+        totals = InvoiceGenerator.calculate_totals(harness)
+        return len(InvoiceGenerator.create_invoice_template(harness, *totals).encode('utf-8'))
+    if op == 'create_pdf_invoice':
+        path = os.path.join(output_dir, 'bench.pdf')
+        InvoiceGenerator.create_pdf_invoice(harness, path)
+        return os.path.getsize(path)
+    paths = InvoiceGenerator.create_image_invoice(harness, os.path.join(output_dir, 'bench.jpg'))
+    return sum(os.path.getsize(path) for path in paths)
+
+
+def measure(op, harness, repeat):
+    with tempfile.TemporaryDirectory() as tmp:
+        # Timed runs without tracing, then one traced run for peak memory
+        best = None
+        for _ in range(repeat):
+            LOGO_CACHE.clear()
+            start = time.perf_counter()
+            output_bytes = run_operation(op, harness, tmp)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+
+        LOGO_CACHE.clear()
+        tracemalloc.start()
+        try:
+            run_operation(op, harness, tmp)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return {'seconds': best, 'peak_bytes': peak, 'output_bytes': output_bytes}
+
+
+def run_suite(args):
+    sizes = [int(s) for s in args.sizes.split(',')]
+    ops = [op.strip() for op in args.ops.split(',')]
+    unknown = [op for op in ops if op not in OPERATIONS]
+    if unknown:
+        raise SystemExit(f"Unknown operation(s): {', '.join(unknown)}")
+
+    # Exporters import Pillow/ReportLab on first use; load them up front so
+    # the first case is not charged for it (see --startup for that cost)
+    for fmt in ('pdf', 'jpg', 'txt'):
+        get_exporter(fmt).load()
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        logo_path = make_logo(os.path.join(tmp, 'logo.png'))
+        print(f"{'operation':<24} {'items':>7} {'logo':>5} {'seconds':>9} {'peak MiB':>9} {'bytes':>11}")
+        for count in sizes:
+            for logo in (False, True):
+                harness = HeadlessInvoice(make_invoice(count, logo_path if logo else None))
+                for op in ops:
+                    if op == 'create_image_invoice' and count > args.image_max:
+                        continue
+                    result = dict(operation=op, items=count, logo=logo,
+                                  **measure(op, harness, args.repeat))
+                    results.append(result)
+                    print(f"{op:<24} {count:>7} {'yes' if logo else 'no':>5} {result['seconds']:>9.4f} "
+                          f"{result['peak_bytes'] / 2**20:>9.2f} {result['output_bytes']:>11}")
+
+    return {
+        'meta': {
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'pillow': PIL.__version__,
+            'reportlab': reportlab.Version,
+            'repeat': args.repeat,
+        },
+        'results': results,
+    }
+
+
+def compare(current, baseline, threshold, min_seconds):
+    # Flags cases that got slower or hungrier than the baseline by more than
+    # the threshold; times below min_seconds are too noisy to judge
+    base = {(r['operation'], r['items'], r['logo']): r for r in baseline['results']}
+    regressions = []
+    for result in current['results']:
+        old = base.get((result['operation'], result['items'], result['logo']))
+        if old is None:
+            continue
+        checks = [('peak_bytes', result['peak_bytes'], old['peak_bytes'])]
+        if max(result['seconds'], old['seconds']) >= min_seconds:
+            checks.append(('seconds', result['seconds'], old['seconds']))
+        for metric, new_value, old_value in checks:
+            if old_value and new_value > old_value * (1 + threshold):
+                regressions.append((result, metric, old_value, new_value))
+
+    for result, metric, old_value, new_value in regressions:
+        print(f"REGRESSION {result['operation']} items={result['items']} logo={result['logo']}: "
+              f"{metric} {old_value:.4g} -> {new_value:.4g} (+{(new_value / old_value - 1) * 100:.0f}%)")
+    print(f"{len(regressions)} regression(s) against baseline ({threshold * 100:.0f}% threshold)")
+    return regressions
+
+
+FIRST_EXPORT_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import main
+imported = time.perf_counter()
+invoice = main.load_invoice_record({'items': [{'description': 'Item', 'quantity': 1, 'rate': 1}]})
+main.render_export(invoice, sys.argv[1], sys.argv[2])
+print(json.dumps({'import': imported - start, 'export': time.perf_counter() - imported}))
+"""
+
+
+def parse_importtime(stderr):
+    # -X importtime lines: "import time: self [us] | cumulative | package"
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        rows.append((name.strip(), int(self_us), int(cumulative_us)))
+    return rows
+
+
+def bench_startup(args):
+    # Fresh interpreters only: importing main with -X importtime, then the
+    # import plus the first export for each built-in backend
+    here = os.path.dirname(os.path.abspath(__file__))
+    runs = max(args.repeat, 3)
+    totals = []
+    for _ in range(runs):
+        proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import main'],
+                              cwd=here, capture_output=True, text=True, check=True)
+        rows = parse_importtime(proc.stderr)
+        totals.append(next(cumulative for name, _, cumulative in rows if name == 'main'))
+    heaviest = sorted(rows, key=lambda row: row[2], reverse=True)[:args.top]
+
+    print(f"import main: {statistics.median(totals) / 1000:.1f} ms (median of {runs})")
+    print(f"{'module':<40} {'self ms':>8} {'cumulative ms':>14}")
+    for name, self_us, cumulative_us in heaviest:
+        print(f"{name:<40} {self_us / 1000:>8.1f} {cumulative_us / 1000:>14.1f}")
+
+    first_exports = {}
+    # Rendered for real each time, not copied out of (or into) the render cache
+    env = dict(os.environ, INVOICE_RENDER_CACHE='')
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"{'format':<8} {'import ms':>10} {'first export ms':>16}")
+        for fmt in ('txt', 'pdf', 'png'):
+            samples = []
+            for _ in range(runs):
+                proc = subprocess.run([sys.executable, '-c', FIRST_EXPORT_SCRIPT, fmt,
+                                       os.path.join(tmp, f'first.{fmt}')],
+                                      cwd=here, env=env, capture_output=True, text=True, check=True)
+                samples.append(json.loads(proc.stdout))
+            first_exports[fmt] = {key: statistics.median(sample[key] for sample in samples)
+                                  for key in ('import', 'export')}
+            print(f"{fmt:<8} {first_exports[fmt]['import'] * 1000:>10.1f} "
+                  f"{first_exports[fmt]['export'] * 1000:>16.1f}")
+
+    return {
+        'import_main_seconds': statistics.median(totals) / 1e6,
+        'heaviest_imports': [{'module': name, 'self_seconds': self_us / 1e6,
+                              'cumulative_seconds': cumulative_us / 1e6}
+                             for name, self_us, cumulative_us in heaviest],
+        'first_export': first_exports,
+    }
+
+
+def time_pdf(invoice, large, repeat, profile=None):
+    best = None
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.pdf')
+        for _ in range(repeat):
+            start = time.perf_counter()
+            render_pdf_invoice(invoice, path, large=large, profile=profile)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        size = os.path.getsize(path)
+    return best, size
+
+
+def bench_large_pdf(args):
+    sizes = [int(s) for s in args.sizes.split(',')]
+    print(f"{'items':>8} {'mode':>6} {'seconds':>9} {'us/item':>9} {'bytes':>11}")
+    for count in sizes:
+        invoice = make_invoice(count)
+        modes = [('canvas', True)]
+        if count <= args.table_max:
+            modes.append(('table', False))
+        for mode, large in modes:
+            seconds, size = time_pdf(invoice, large, args.repeat)
+            print(f"{count:>8} {mode:>6} {seconds:>9.3f} {seconds / count * 1e6:>9.1f} {size:>11}")
+
+
+def bench_pdf_profiles(args):
+    # Every PDF profile against the default output, per size and logo kind.
+    # The first render of each case is not timed: it decodes the logo.
+    sizes = [int(s) for s in args.sizes.split(',')]
+    with tempfile.TemporaryDirectory() as tmp:
+        logos = [('none', None), ('gradient', make_logo(os.path.join(tmp, 'gradient.png'))),
+                 ('photo', make_photo_logo(os.path.join(tmp, 'photo.jpg')))]
+        print(f"{'items':>8} {'logo':>9} {'profile':>8} {'seconds':>9} {'bytes':>11} {'size':>7}")
+        for count in sizes:
+            for logo_name, logo in logos:
+                invoice = make_invoice(count, logo)
+                default_size = None
+                for profile in PDF_PROFILES:
+                    time_pdf(invoice, None, 1, profile)
+                    seconds, size = time_pdf(invoice, None, args.repeat, profile)
+                    default_size = default_size or size
+                    print(f"{count:>8} {logo_name:>9} {profile:>8} {seconds:>9.3f} {size:>11} "
+                          f"{size / default_size:>7.1%}")
+
+
+IMAGE_FORMATS = ('PNG', 'JPEG', 'WEBP', 'TIFF')
+
+
+def bench_image_profiles(args):
+    # Draw and encode time and size of one full page per image profile,
+    # format and scale, with and without a logo
+    scales = [float(s) for s in args.scales.split(',')]
+    with tempfile.TemporaryDirectory() as tmp:
+        logos = [('none', None), ('gradient', make_logo(os.path.join(tmp, 'gradient.png')))]
+        print(f"{'logo':>9} {'scale':>6} {'profile':>8} {'format':>6} {'draw s':>8} {'encode s':>9} {'bytes':>10}")
+        for logo_name, logo_path in logos:
+            invoice = make_invoice(40, logo_path)
+            totals = invoice_totals(invoice)
+            for scale in scales:
+                logo = _image_logo(invoice, scale)
+                pages = paginate_image_items(len(invoice['items']), image_page_top(logo, scale))
+                for name, profile in IMAGE_PROFILES.items():
+                    start = time.perf_counter()
+                    page = render_image_page(invoice, pages, 0, totals, logo, scale, profile.page_mode(logo))
+                    draw = time.perf_counter() - start
+                    for image_format in IMAGE_FORMATS:
+                        encode = None
+                        for _ in range(args.repeat):
+                            buffer = io.BytesIO()
+                            start = time.perf_counter()
+                            profile.save(page, buffer, image_format, scale)
+                            elapsed = time.perf_counter() - start
+                            encode = elapsed if encode is None else min(encode, elapsed)
+                        print(f"{logo_name:>9} {scale:>6g} {name:>8} {image_format:>6} {draw:>8.3f} "
+                              f"{encode:>9.3f} {len(buffer.getvalue()):>10}")
+
+
+def bench_statement(args):
+    # One statement PDF versus a separate PDF per invoice (what you would
+    # otherwise concatenate), with the same logo on every invoice
+    with tempfile.TemporaryDirectory() as tmp:
+        logo = make_logo(os.path.join(tmp, 'logo.png'))
+        invoices = [make_invoice(args.statement_items, logo) for _ in range(args.statement)]
+        for number, invoice in enumerate(invoices, 1):
+            invoice['invoice_number'] = f"BENCH-{number:04d}"
+
+        separate = statement = None
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            separate_bytes = 0
+            for number, invoice in enumerate(invoices):
+                path = os.path.join(tmp, f'invoice-{number}.pdf')
+                render_pdf_invoice(invoice, path)
+                separate_bytes += os.path.getsize(path)
+            elapsed = time.perf_counter() - start
+            separate = elapsed if separate is None else min(separate, elapsed)
+
+            path = os.path.join(tmp, 'statement.pdf')
+            start = time.perf_counter()
+            render_pdf_statement(invoices, path)
+            elapsed = time.perf_counter() - start
+            statement = elapsed if statement is None else min(statement, elapsed)
+            statement_bytes = os.path.getsize(path)
+
+    print(f"{args.statement} invoices x {args.statement_items} items, with logo")
+    print(f"{'mode':>10} {'seconds':>9} {'bytes':>11}")
+    print(f"{'separate':>10} {separate:>9.3f} {separate_bytes:>11}")
+    print(f"{'statement':>10} {statement:>9.3f} {statement_bytes:>11}")
+    print(f"statement is {separate / statement:.1f}x faster and {separate_bytes / statement_bytes:.1f}x smaller")
+
+
+def make_report_invoices(count, item_count):
+    # Spread over 1000 customers, twelve months and a few line tax rates
+    for number in range(count):
+        record = {
+            'customer_name': f"Customer {number % 1000}",
+            'invoice_number': f"REPORT-{number:07d}",
+            'invoice_date': f"2026-{number % 12 + 1:02d}-{number % 28 + 1:02d}",
+            'due_date': f"2026-{(number + 1) % 12 + 1:02d}-{number % 28 + 1:02d}",
+            'tax_rate': "7.5",
+            'discount': "2",
+            'items': [{'description': f"Line {i}", 'quantity': 1 + i % 7, 'rate': 0.25 + number % 13,
+                       'tax_rate': (None, "5", "17.5")[(number + i) % 3]} for i in range(item_count)]
+        }
+        yield load_invoice_record(record)
+
+
+def bench_report(args):
+    # The report engine against loading and totalling each invoice in turn
+    with tempfile.TemporaryDirectory() as tmp:
+        store = InvoiceStore(os.path.join(tmp, 'report.db'))
+        store.save_many(make_report_invoices(args.report, args.report_items))
+
+        start = time.perf_counter()
+        by_customer = {}
+        for (invoice_id,) in store.conn.execute("SELECT id FROM invoices"):
+            invoice = store.load(invoice_id=invoice_id)
+            total = invoice_totals(invoice)[3]
+            by_customer[invoice['customer_name']] = by_customer.get(invoice['customer_name'], 0) + to_cents(total)
+        loop = time.perf_counter() - start
+
+        start = time.perf_counter()
+        data = ReportData(store)
+        loaded = time.perf_counter() - start
+        reports = build_reports(data)
+        vectorized = time.perf_counter() - start
+        store.close()
+
+    customers = {row[0]: row[-1] for row in reports[0].rows}
+    print(f"{args.report} invoices x {args.report_items} items, {len(customers)} customers")
+    print(f"{'mode':>18} {'seconds':>9}")
+    print(f"{'per-invoice loop':>18} {loop:>9.3f}   (revenue by customer only)")
+    print(f"{'vectorized':>18} {vectorized:>9.3f}   (all {len(reports)} reports; {loaded:.3f}s loading)")
+    print(f"vectorized is {loop / vectorized:.1f}x faster; customer totals "
+          f"{'match' if customers == by_customer else 'DIFFER'}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Invoice render benchmarks")
+    parser.add_argument('--sizes', default=DEFAULT_SIZES, help="Comma-separated item counts")
+    parser.add_argument('--ops', default=','.join(OPERATIONS), help="Comma-separated operations to run")
+    parser.add_argument('--repeat', type=int, default=1, help="Runs per case; the best time is kept")
+    parser.add_argument('--image-max', type=int, default=100000,
+                        help="Largest item count to render as images")
+    parser.add_argument('--output', help="Write the results to this JSON file")
+    parser.add_argument('--baseline', help="Compare against results saved by an earlier --output")
+    parser.add_argument('--compare', metavar='RESULTS',
+                        help="Compare saved results against --baseline without running anything")
+    parser.add_argument('--threshold', type=float, default=0.15,
+                        help="Relative slowdown or memory growth that counts as a regression")
+    parser.add_argument('--min-seconds', type=float, default=0.005,
+                        help="Ignore timing changes for cases faster than this")
+    parser.add_argument('--startup', action='store_true',
+                        help="Only measure import time (-X importtime) and first-export latency")
+    parser.add_argument('--top', type=int, default=10, help="Heaviest imports to list with --startup")
+    parser.add_argument('--layouts', action='store_true',
+                        help="Only compare the canvas and single-Table PDF layouts")
+    parser.add_argument('--table-max', type=int, default=2000,
+                        help="Largest item count to also time with the single-Table layout (--layouts)")
+    parser.add_argument('--pdf-profiles', action='store_true',
+                        help="Only compare the PDF output profiles (size and time) with and without a logo")
+    parser.add_argument('--image-profiles', action='store_true',
+                        help="Only compare the image encode profiles (encode time and size per format)")
+    parser.add_argument('--scales', default='1,3.125', help="Comma-separated page scales for --image-profiles")
+    parser.add_argument('--statement', type=int, metavar='N',
+                        help="Only compare one N-invoice statement PDF against N separate PDFs")
+    parser.add_argument('--statement-items', type=int, default=20, help="Items per invoice for --statement")
+    parser.add_argument('--report', type=int, metavar='N',
+                        help="Only compare the NumPy reports against a per-invoice loop over an N-invoice store")
+    parser.add_argument('--report-items', type=int, default=10, help="Items per invoice for --report")
+    args = parser.parse_args(argv)
+
+    if args.statement:
+        bench_statement(args)
+        return 0
+
+    if args.report:
+        bench_report(args)
+        return 0
+
+    if args.pdf_profiles:
+        bench_pdf_profiles(args)
+        return 0
+
+    if args.image_profiles:
+        bench_image_profiles(args)
+        return 0
+
+    if args.layouts:
+        bench_large_pdf(args)
+        return 0
+
+    if args.startup:
+        startup = bench_startup(args)
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as file:
+                json.dump(startup, file, indent=2)
+        return 0
+
+    if args.compare:
+        if not args.baseline:
+            parser.error("--compare needs --baseline")
+        with open(args.compare, encoding='utf-8') as file:
+            current = json.load(file)
+    else:
+        current = run_suite(args)
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as file:
+                json.dump(current, file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as file:
+            baseline = json.load(file)
+        if compare(current, baseline, args.threshold, args.min_seconds):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
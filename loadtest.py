@@ -0,0 +1,159 @@
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from collections import Counter
+from urllib.parse import urlsplit
+
+
+def make_record(item_count):
+    return {
+        'company_name': "Load Test Co",
+        'company_address': "1 Load Test Road\nTest City",
+        'customer_name': "Customer",
+        'customer_address': "2 Customer Street",
+        'invoice_number': f"LOAD-{item_count}",
+        'invoice_date': "2026-01-01",
+        'due_date': "2026-01-31",
+        'tax_rate': "7.5",
+        'discount': "2",
+        'items': [{'description': f"Metered usage line {i}", 'quantity': 1 + i % 7, 'rate': 0.25}
+                  for i in range(item_count)]
+    }
+
+
+async def read_response(reader):
+    head = await reader.readuntil(b'\r\n\r\n')
+    status_line, *header_lines = head.decode('latin-1').split('\r\n')
+    headers = {}
+    for line in filter(None, header_lines):
+        name, _, value = line.partition(':')
+        headers[name.strip().lower()] = value.strip()
+    body = await reader.readexactly(int(headers.get('content-length') or 0))
+    return int(status_line.split(' ')[1]), headers, body
+
+
+async def client(host, port, path, body, jobs, results):
+    # One keep-alive connection, taking requests until the shared counter
+    # runs out; reconnects if the server closes the connection
+    request = (f"POST {path} HTTP/1.1\r\nHost: {host}:{port}\r\n"
+               f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n").encode('latin-1') + body
+    reader = writer = None
+    while next(jobs, None) is not None:
+        start = time.perf_counter()
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection(host, port)
+            writer.write(request)
+            await writer.drain()
+            status, headers, payload = await read_response(reader)
+            if headers.get('connection', '').lower() == 'close':
+                writer.close()
+                writer = None
+        except (OSError, asyncio.IncompleteReadError) as e:
+            status, payload = type(e).__name__, b''
+            if writer is not None:
+                writer.close()
+            writer = None
+        results.append((status, time.perf_counter() - start, len(payload)))
+    if writer is not None:
+        writer.close()
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+async def run_load(url, fmt, body, requests, concurrency):
+    parts = urlsplit(url)
+    path = f"{parts.path.rstrip('/')}/render/{fmt}"
+    jobs = iter(range(requests))
+    results = []
+    start = time.perf_counter()
+    await asyncio.gather(*(client(parts.hostname, parts.port or 80, path, body, jobs, results)
+                           for _ in range(concurrency)))
+    return results, time.perf_counter() - start
+
+
+def report(results, elapsed):
+    statuses = Counter(status for status, _, _ in results)
+    ok = [seconds for status, seconds, _ in results if status == 200]
+    rejected = [seconds for status, seconds, _ in results if status == 429]
+    print(f"Requests:   {len(results)} in {elapsed:.2f}s")
+    print("Statuses:   " + ", ".join(f"{status}: {count}" for status, count in sorted(statuses.items(), key=str)))
+    print(f"Throughput: {len(ok) / elapsed if elapsed else 0.0:.1f} rendered/s "
+          f"({len(results) / elapsed if elapsed else 0.0:.1f} requests/s)")
+    if ok:
+        sizes = [size for status, _, size in results if status == 200]
+        print(f"Latency (200): p50 {percentile(ok, 0.5) * 1000:.1f} ms, p99 {percentile(ok, 0.99) * 1000:.1f} ms, "
+              f"mean {statistics.mean(ok) * 1000:.1f} ms, max {max(ok) * 1000:.1f} ms")
+        print(f"Body size:  {statistics.mean(sizes) / 1024:.1f} KiB average")
+    if rejected:
+        print(f"Latency (429): p50 {percentile(rejected, 0.5) * 1000:.1f} ms, "
+              f"p99 {percentile(rejected, 0.99) * 1000:.1f} ms")
+    return {'requests': len(results), 'seconds': elapsed, 'statuses': {str(k): v for k, v in statuses.items()},
+            'p50': percentile(ok, 0.5), 'p99': percentile(ok, 0.99),
+            'throughput': len(ok) / elapsed if elapsed else 0.0}
+
+
+def start_server(args):
+    # Runs `main.py serve` on the requested port and waits for its banner
+    command = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'main.py'), 'serve',
+               '--port', str(urlsplit(args.url).port or 80), '--queue-limit', str(args.queue_limit)]
+    if args.workers:
+        command += ['--workers', str(args.workers)]
+    server = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+    line = server.stdout.readline()
+    if not line.startswith('Serving'):
+        server.kill()
+        raise SystemExit(f"Server did not start: {line or server.wait()}")
+    print(line.strip())
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test for `main.py serve`")
+    parser.add_argument('--url', default='http://127.0.0.1:8080', help="Server base URL")
+    parser.add_argument('--format', default='pdf', help="Format to request: pdf, jpg, png, tiff or txt")
+    parser.add_argument('--items', type=int, default=20, help="Line items per invoice")
+    parser.add_argument('--input', help="JSON file with the invoice to send instead of a generated one")
+    parser.add_argument('--requests', type=int, default=200, help="Total requests to send")
+    parser.add_argument('--concurrency', type=int, default=16, help="Open connections")
+    parser.add_argument('--output', help="Write the summary to this JSON file")
+    parser.add_argument('--start-server', action='store_true',
+                        help="Start `main.py serve` on the --url port for the duration of the run")
+    parser.add_argument('--workers', type=int, help="Worker processes for --start-server")
+    parser.add_argument('--queue-limit', type=int, default=32, help="Queue limit for --start-server")
+    args = parser.parse_args(argv)
+
+    if args.input:
+        with open(args.input, encoding='utf-8') as f:
+            record = json.load(f)
+    else:
+        record = make_record(args.items)
+    body = json.dumps(record).encode('utf-8')
+
+    server = start_server(args) if args.start_server else None
+    try:
+        results, elapsed = asyncio.run(run_load(args.url, args.format, body, args.requests, args.concurrency))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    summary = report(results, elapsed)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(dict(summary, format=args.format, items=args.items, concurrency=args.concurrency), f, indent=2)
+    return 0 if summary['statuses'].get('200') else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
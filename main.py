@@ -2,14 +2,3214 @@ import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
 from datetime import datetime
 import os
-from PIL import Image, ImageDraw, ImageFont, ImageOps
 from reportlab.lib.pagesizes import letter
-from reportlab.pdfgen import canvas
-from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image as RLImage
-from reportlab.lib import colors
 from reportlab.lib.units import inch
 import io
+import sys
+import signal
+import json
+import csv
+import queue
+import sqlite3
+import time
+import argparse
+import threading
+import functools
+import contextlib
+import contextvars
+import itertools
+import types
+from collections import OrderedDict, deque
+import concurrent.futures
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+import html
+import hashlib
+import shutil
+import tempfile
+import importlib
+import importlib.util
+
+xml_escape = functools.partial(html.escape, quote=False)
+
+_LAZY_LOCK = threading.Lock()
+
+
+def lazy_import(name):
+    # Returns the module without running it; its code runs on first
+    # attribute access (importlib.util.LazyLoader). Pillow and the heavy
+    # parts of ReportLab are imported this way, so a launch only pays for
+    # them once something is exported as an image or PDF.
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ModuleNotFoundError(f"No module named {name!r}", name=name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    parent, _, child = name.rpartition('.')
+    if parent:
+        setattr(sys.modules[parent], child, module)
+    return module
+
+
+def load_modules(*modules):
+    # Forces lazily imported modules to load. Done under a lock before
+    # threads use them: LazyLoader is not thread-safe before Python 3.12.
+    with _LAZY_LOCK:
+        for module in modules:
+            module.__name__
+
+
+Image = lazy_import('PIL.Image')
+ImageDraw = lazy_import('PIL.ImageDraw')
+ImageFont = lazy_import('PIL.ImageFont')
+ImageOps = lazy_import('PIL.ImageOps')
+ImageTk = lazy_import('PIL.ImageTk')
+TiffImagePlugin = lazy_import('PIL.TiffImagePlugin')
+canvas = lazy_import('reportlab.pdfgen.canvas')
+colors = lazy_import('reportlab.lib.colors')
+styles = lazy_import('reportlab.lib.styles')
+platypus = lazy_import('reportlab.platypus')
+rl_utils = lazy_import('reportlab.lib.utils')
+# Only needed by the export queue, batch and serve modes
+multiprocessing = lazy_import('multiprocessing')
+asyncio = lazy_import('asyncio')
+
+IMAGE_MODULES = (Image, ImageDraw, ImageFont, ImageOps, TiffImagePlugin)
+PDF_MODULES = (canvas, colors, styles, platypus, rl_utils)
+
+# Invoice fields shared by the GUI snapshot and headless records
+INVOICE_FIELDS = (
+    'company_name', 'company_address', 'company_phone', 'company_email',
+    'customer_name', 'customer_address', 'customer_phone', 'customer_email',
+    'invoice_number', 'invoice_date', 'due_date', 'payment_terms',
+    'tax_rate', 'discount',
+)
+
+
+CENTS = Decimal('0.01')
+
+
+def to_decimal(value, field="value"):
+    # Parses user or record input exactly; floats go through str() so 0.1
+    # stays 0.1 instead of its binary approximation
+    try:
+        number = Decimal(str(value).strip() or 0)
+    except InvalidOperation:
+        raise ValueError(f"Invalid {field}: {value!r}")
+    if not number.is_finite():
+        raise ValueError(f"Invalid {field}: {value!r}")
+    return number
+
+
+def to_percent(value, field="percentage"):
+    # Optional per-line rates stay None so the invoice-level rate applies
+    if value is None or str(value).strip() == '':
+        return None
+    return to_decimal(value, field)
+
+
+def make_item(description, quantity, rate, tax_rate=None, discount=None):
+    quantity = to_decimal(quantity, "quantity")
+    rate = to_decimal(rate, "rate")
+    return {
+        'description': description,
+        'quantity': quantity,
+        'rate': rate,
+        'amount': (quantity * rate).quantize(CENTS, ROUND_HALF_UP),
+        'tax_rate': to_percent(tax_rate, "tax rate"),
+        'discount': to_percent(discount, "discount")
+    }
+
+
+def load_invoice_record(record):
+    # Normalise a headless invoice record (e.g. one JSONL line) into the
+    # same shape InvoiceGenerator.get_invoice_data() produces
+    invoice = {field: str(record.get(field) or '') for field in INVOICE_FIELDS}
+    if not invoice['invoice_date']:
+        invoice['invoice_date'] = datetime.now().strftime('%Y-%m-%d')
+    if not invoice['payment_terms']:
+        invoice['payment_terms'] = "Net 30"
+    invoice['logo_path'] = record.get('logo_path') or None
+
+    items = record.get('items') or []
+    if not isinstance(items, list):
+        raise ValueError(f"Invalid items: {items!r}")
+    if not items:
+        raise ValueError("Invoice has no items")
+    invoice['items'] = []
+    for item in items:
+        try:
+            invoice['items'].append(make_item(item['description'], item['quantity'], item['rate'],
+                                              item.get('tax_rate'), item.get('discount')))
+        except (KeyError, TypeError, ValueError):
+            raise ValueError(f"Invalid item: {item!r}")
+    return invoice
+
+
+class TotalsEngine:
+    # Running subtotals grouped by (line tax rate, line discount rate), kept
+    # up to date by add()/remove(). totals() only walks the groups, so it is
+    # O(number of distinct rates) however many items there are.
+    #
+    # Rounding: line amounts are rounded to cents when the item is made;
+    # discount and tax are rounded to cents per rate group (ROUND_HALF_UP),
+    # and the total is the sum of the rounded parts, so the printed figures
+    # always add up.
+    def __init__(self, items=()):
+        self.clear()
+        for item in items:
+            self.add(item)
+
+    def clear(self):
+        self.subtotal = Decimal('0.00')
+        self.item_count = 0
+        self._groups = {}
+
+    def add(self, item):
+        key = (item.get('tax_rate'), item.get('discount'))
+        amount, count = self._groups.get(key, (Decimal('0.00'), 0))
+        self._groups[key] = (amount + item['amount'], count + 1)
+        self.subtotal += item['amount']
+        self.item_count += 1
+
+    def remove(self, item):
+        key = (item.get('tax_rate'), item.get('discount'))
+        amount, count = self._groups[key]
+        if count == 1:
+            del self._groups[key]
+        else:
+            self._groups[key] = (amount - item['amount'], count - 1)
+        self.subtotal -= item['amount']
+        self.item_count -= 1
+
+    def totals(self, tax_rate=0, discount=0):
+        # Invoice-level rates apply to lines without their own rate; malformed
+        # rates raise ValueError rather than being treated as 0
+        tax_percent = to_decimal(tax_rate, "tax rate")
+        discount_percent = to_decimal(discount, "discount")
+
+        discount_amount = Decimal('0.00')
+        tax_amount = Decimal('0.00')
+        for (line_tax, line_discount), (amount, _) in self._groups.items():
+            line_tax = tax_percent if line_tax is None else line_tax
+            line_discount = discount_percent if line_discount is None else line_discount
+            group_discount = (amount * line_discount / 100).quantize(CENTS, ROUND_HALF_UP)
+            group_tax = ((amount - group_discount) * line_tax / 100).quantize(CENTS, ROUND_HALF_UP)
+            discount_amount += group_discount
+            tax_amount += group_tax
+
+        total = self.subtotal - discount_amount + tax_amount
+        return self.subtotal, discount_amount, tax_amount, total
+
+
+class ItemStore:
+    # Line items in insertion order under stable ids. Removing an item leaves
+    # a hole in its slot; a Fenwick tree counting live slots finds the n-th
+    # live item and removes by id in O(log n). Holes are compacted away once
+    # they outnumber live items, and clear() just drops everything.
+    def __init__(self, items=()):
+        self._next_id = 0
+        self.clear()
+        for item in items:
+            self.add(item)
+
+    def clear(self):
+        self._slots = []
+        self._slot_ids = []
+        self._slot_of = {}
+        self._tree = [0] * 65
+        self._capacity = 64
+
+    def __len__(self):
+        return len(self._slot_of)
+
+    def __iter__(self):
+        return (item for item in self._slots if item is not None)
+
+    def __getitem__(self, index):
+        return self._slots[self._find(index)]
+
+    def _update(self, slot, delta):
+        i = slot + 1
+        while i <= self._capacity:
+            self._tree[i] += delta
+            i += i & -i
+
+    def _rebuild(self, capacity):
+        # Linear-time Fenwick construction over the current slots
+        self._capacity = capacity
+        tree = [0] * (capacity + 1)
+        for slot, item in enumerate(self._slots):
+            if item is not None:
+                tree[slot + 1] += 1
+        for i in range(1, capacity + 1):
+            parent = i + (i & -i)
+            if parent <= capacity:
+                tree[parent] += tree[i]
+        self._tree = tree
+
+    def _find(self, index):
+        # Slot of the index-th live item (0-based)
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("item index out of range")
+        slot = 0
+        step = 1 << self._capacity.bit_length()
+        remaining = index + 1
+        while step:
+            nxt = slot + step
+            if nxt <= self._capacity and self._tree[nxt] < remaining:
+                slot = nxt
+                remaining -= self._tree[nxt]
+            step >>= 1
+        return slot
+
+    def add(self, item):
+        item_id = self._next_id
+        self._next_id += 1
+        slot = len(self._slots)
+        self._slots.append(item)
+        self._slot_ids.append(item_id)
+        self._slot_of[item_id] = slot
+        if slot >= self._capacity:
+            self._rebuild(self._capacity * 2)
+        else:
+            self._update(slot, 1)
+        return item_id
+
+    def get(self, item_id):
+        return self._slots[self._slot_of[item_id]]
+
+    def index(self, item_id):
+        # Position of the item among the live items: live slots before it
+        i = self._slot_of[item_id]
+        position = 0
+        while i > 0:
+            position += self._tree[i]
+            i -= i & -i
+        return position
+
+    def remove(self, item_id):
+        slot = self._slot_of.pop(item_id)
+        item = self._slots[slot]
+        self._slots[slot] = None
+        self._update(slot, -1)
+        if len(self._slots) > 64 and len(self._slot_of) < len(self._slots) // 2:
+            self._compact()
+        return item
+
+    def _compact(self):
+        live = [(item_id, item) for item_id, item in zip(self._slot_ids, self._slots) if item is not None]
+        self._slot_ids = [item_id for item_id, _ in live]
+        self._slots = [item for _, item in live]
+        self._slot_of = {item_id: slot for slot, item_id in enumerate(self._slot_ids)}
+        self._rebuild(max(64, self._capacity // 2))
+
+    def window(self, start, count):
+        # (id, item) pairs for up to count live items from position start
+        rows = []
+        if start >= len(self):
+            return rows
+        for slot in range(self._find(start), len(self._slots)):
+            if self._slots[slot] is not None:
+                rows.append((self._slot_ids[slot], self._slots[slot]))
+                if len(rows) == count:
+                    break
+        return rows
+
+
+IMPORT_CHUNK_ROWS = 2000
+
+
+def iter_item_rows(path, progress=None):
+    # Yields (row number, raw row dict) from a CSV, JSON or JSONL file; a
+    # JSONL line that is not valid JSON comes through as a ValueError in
+    # place of the row, so one bad line does not end the import.
+    # progress(fraction) is called as the file is consumed.
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.json':
+        with open(path, encoding='utf-8') as file:
+            data = json.load(file)
+        rows = data.get('items', []) if isinstance(data, dict) else data
+        for row_no, row in enumerate(rows, 1):
+            if progress and row_no % IMPORT_CHUNK_ROWS == 0:
+                progress(row_no / len(rows))
+            yield row_no, row
+        return
+
+    size = os.path.getsize(path) or 1
+    consumed = 0
+    with open(path, encoding='utf-8-sig', newline='') as file:
+        def counted_lines():
+            nonlocal consumed
+            for line in file:
+                consumed += len(line)
+                yield line
+
+        if ext == '.jsonl':
+            for row_no, line in enumerate(counted_lines(), 1):
+                if line.strip():
+                    try:
+                        row = json.loads(line)
+                    except ValueError as e:
+                        row = ValueError(f"invalid JSON: {getattr(e, 'msg', e)}")
+                    yield row_no, row
+                if progress and row_no % IMPORT_CHUNK_ROWS == 0:
+                    progress(consumed / size)
+            return
+
+        reader = csv.DictReader(counted_lines())
+        # Header names are matched case-insensitively
+        reader.fieldnames = [name.strip().lower() for name in reader.fieldnames or []]
+        for row_no, row in enumerate(reader, 2):
+            yield row_no, row
+            if progress and row_no % IMPORT_CHUNK_ROWS == 0:
+                progress(consumed / size)
+
+
+def parse_item_file(path, chunk_size=IMPORT_CHUNK_ROWS, progress=None):
+    # Validates rows into items and yields (items, errors) chunks, where
+    # errors is a list of (row number, message)
+    items, errors = [], []
+    for row_no, row in iter_item_rows(path, progress):
+        try:
+            if isinstance(row, ValueError):
+                raise row
+            if not isinstance(row, dict):
+                raise ValueError("expected an object with description, quantity and rate")
+            description = str(row.get('description') or '').strip()
+            if not description:
+                raise ValueError("missing description")
+            items.append(make_item(description, row.get('quantity'), row.get('rate'),
+                                   row.get('tax_rate'), row.get('discount')))
+        except ValueError as e:
+            errors.append((row_no, str(e)))
+        if len(items) + len(errors) >= chunk_size:
+            yield items, errors
+            items, errors = [], []
+    if items or errors:
+        yield items, errors
+
+
+def compute_totals(items, tax_rate=0, discount=0):
+    return TotalsEngine(items).totals(tax_rate, discount)
+
+
+def invoice_totals(invoice):
+    return compute_totals(invoice['items'], invoice['tax_rate'], invoice['discount'])
+
+
+class StageTimer:
+    # Times the stages of one render. Repeated stages (one per page, say)
+    # are summed; the records go to the sinks once the render has finished.
+    # invoice['items'] may be the item list or just its length.
+    def __init__(self, emit, operation, invoice):
+        self.emit = emit
+        self.operation = operation
+        items = invoice['items']
+        self.labels = {'invoice': invoice.get('invoice_number', ''),
+                       'items': items if isinstance(items, int) else len(items)}
+        self.stages = {}
+        self.start = time.perf_counter()
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        yield
+        self.add(name, time.perf_counter() - start)
+
+    def add(self, name, seconds):
+        total, count = self.stages.get(name, (0.0, 0))
+        self.stages[name] = (total + seconds, count + 1)
+
+    def iterate(self, name, iterable):
+        # Times each step of a (lazy) iterator as the named stage
+        iterator = iter(iterable)
+        while True:
+            start = time.perf_counter()
+            try:
+                value = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                self.add(name, time.perf_counter() - start)
+            yield value
+
+    def done(self):
+        self.stages['total'] = (time.perf_counter() - self.start, 1)
+        for name, (seconds, count) in self.stages.items():
+            self.emit(dict(self.labels, operation=self.operation, stage=name,
+                           seconds=seconds, count=count))
+
+
+class _NullTimer:
+    # Handed out while no sink is configured, so instrumented code costs a
+    # method call per stage and nothing more
+    _null = contextlib.nullcontext()
+
+    def stage(self, name):
+        return self._null
+
+    def add(self, name, seconds):
+        pass
+
+    def iterate(self, name, iterable):
+        return iterable
+
+    def done(self):
+        pass
+
+
+NULL_TIMER = _NullTimer()
+
+
+class JsonLinesSink:
+    # Appends one JSON object per stage record
+    def __init__(self, path):
+        self.file = open(path, 'a', encoding='utf-8')
+        self.lock = threading.Lock()
+
+    def __call__(self, record):
+        line = json.dumps(record) + '\n'
+        with self.lock:
+            self.file.write(line)
+            self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class PrometheusTextfileSink:
+    # Keeps per (operation, stage) sums and counts and rewrites a textfile
+    # for node_exporter's textfile collector, at most every `interval` seconds
+    def __init__(self, path, interval=5.0):
+        self.path = path
+        self.interval = interval
+        self.metrics = {}
+        self.written = 0.0
+        self.lock = threading.Lock()
+
+    def __call__(self, record):
+        key = (record['operation'], record['stage'])
+        with self.lock:
+            seconds, count = self.metrics.get(key, (0.0, 0))
+            self.metrics[key] = (seconds + record['seconds'], count + record['count'])
+            if time.monotonic() - self.written >= self.interval:
+                self._write()
+
+    @staticmethod
+    def _label(value):
+        return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+    def _write(self):
+        lines = ["# HELP invoice_render_stage_seconds Time spent in each invoice render stage.",
+                 "# TYPE invoice_render_stage_seconds summary"]
+        for (operation, stage), (seconds, count) in sorted(self.metrics.items()):
+            labels = f'operation="{self._label(operation)}",stage="{self._label(stage)}"'
+            lines.append(f"invoice_render_stage_seconds_sum{{{labels}}} {seconds:.6f}")
+            lines.append(f"invoice_render_stage_seconds_count{{{labels}}} {count}")
+        # Written aside and renamed so the collector never reads half a file
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            file.write('\n'.join(lines) + '\n')
+        os.replace(tmp_path, self.path)
+        self.written = time.monotonic()
+
+    def close(self):
+        with self.lock:
+            self._write()
+
+
+def timing_sink(spec):
+    # "jsonl:PATH" or "prometheus:PATH"
+    kind, _, path = spec.partition(':')
+    if kind == 'jsonl' and path:
+        return JsonLinesSink(path)
+    if kind == 'prometheus' and path:
+        return PrometheusTextfileSink(path)
+    raise ValueError(f"Unknown timing sink {spec!r}; use jsonl:PATH or prometheus:PATH")
+
+
+class Timings:
+    # Stage timings for the exporters. Sinks are callables taking one record
+    # dict (operation, stage, seconds, count, invoice, items); with none
+    # configured, start() hands out NULL_TIMER and nothing is measured.
+    # Inside collect(), timers started in that context record into its list
+    # instead, without touching the sinks other threads are using.
+    def __init__(self):
+        self.sinks = []
+
+    @property
+    def enabled(self):
+        return bool(self.sinks)
+
+    def add_sink(self, sink):
+        self.sinks.append(sink)
+        return sink
+
+    def remove_sink(self, sink):
+        self.sinks.remove(sink)
+
+    def configure(self, specs):
+        # Comma-separated sink specs, as in INVOICE_TIMINGS
+        for spec in filter(None, (spec.strip() for spec in (specs or '').split(','))):
+            self.add_sink(timing_sink(spec))
+
+    def start(self, operation, invoice):
+        collector = _TIMING_COLLECTOR.get()
+        if collector is not None:
+            return StageTimer(collector.append, operation, invoice)
+        if not self.sinks:
+            return NULL_TIMER
+        return StageTimer(self.emit, operation, invoice)
+
+    def emit(self, record):
+        for sink in self.sinks:
+            sink(record)
+
+    @contextlib.contextmanager
+    def collect(self):
+        # Routes records of timers started in this thread (or task) into a
+        # list instead of the sinks. Worker processes use it to send their
+        # timings back to the parent, which owns the sinks.
+        records = []
+        token = _TIMING_COLLECTOR.set(records)
+        try:
+            yield records
+        finally:
+            _TIMING_COLLECTOR.reset(token)
+
+    def close(self):
+        for sink in self.sinks:
+            if hasattr(sink, 'close'):
+                sink.close()
+        self.sinks = []
+
+
+_TIMING_COLLECTOR = contextvars.ContextVar('timing_collector', default=None)
+
+TIMINGS = Timings()
+
+
+class LogoAsset:
+    # Decoded logo plus the variants the exporters need
+    def __init__(self, path, image):
+        self.path = path
+        self.image = image
+        aspect = image.width / image.height
+
+        # 200x80 variant pasted on image invoices
+        self.contained = ImageOps.contain(image, (200, 80)).convert("RGBA")
+
+        # Drawn 0.75 inch high on PDF invoices
+        self.pdf_height = 0.75 * inch
+        self.pdf_width = self.pdf_height * aspect
+        self._reader = None
+        self._pdf_readers = {}
+        self._scaled = {}
+
+        self.nbytes = (len(image.getbands()) * image.width * image.height
+                       + 4 * self.contained.width * self.contained.height)
+
+    @property
+    def reader(self):
+        # ReportLab keeps the extracted RGB data on the reader, so sharing one
+        # reader avoids re-extracting it for every PDF
+        if self._reader is None:
+            self._reader = rl_utils.ImageReader(self.image)
+        return self._reader
+
+    def image_logo(self, scale=1):
+        # The image invoice logo for a page drawn at `scale`, made from the
+        # source once per scale rather than by enlarging `contained`
+        if scale == 1:
+            return self.contained
+        logo = self._scaled.get(scale)
+        if logo is None:
+            box = (round(200 * scale), round(80 * scale))
+            logo = self._scaled[scale] = ImageOps.contain(self.image, box).convert("RGBA")
+        return logo
+
+    def pdf_reader(self, dpi=None, jpeg_quality=85):
+        # Reader for the PDF logo resampled to `dpi` at its 0.75 inch display
+        # size (never enlarged), made once per source file. Photos are stored
+        # as JPEG; transparent or flat-colour logos stay lossless.
+        if dpi is None:
+            return self.reader
+        key = (dpi, jpeg_quality)
+        reader = self._pdf_readers.get(key)
+        if reader is None:
+            image = self.image
+            if image.mode not in ('RGB', 'RGBA', 'L', 'LA'):
+                image = image.convert('RGBA' if image.mode in ('P', 'PA') or 'transparency' in image.info
+                                      else 'RGB')
+            height = max(1, round(self.pdf_height / inch * dpi))
+            if image.height > height:
+                width = max(1, round(image.width * height / image.height))
+                image = image.resize((width, height), Image.Resampling.LANCZOS)
+            if image.mode in ('RGBA', 'LA') or image.getcolors(256) is not None:
+                reader = rl_utils.ImageReader(image)
+            else:
+                # ReportLab copies JPEG data into the PDF as it is
+                encoded = io.BytesIO()
+                image.save(encoded, 'JPEG', quality=jpeg_quality, optimize=True)
+                reader = rl_utils.ImageReader(encoded)
+            self._pdf_readers[key] = reader
+        return reader
+
+
+class LogoCache:
+    # Process-wide LRU of decoded logos keyed by (path, mtime, size), bounded
+    # by the decoded byte size rather than the number of entries
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, path):
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        key = (path, stat.st_mtime_ns, stat.st_size)
+
+        with self._lock:
+            asset = self._entries.get(key)
+            if asset is not None:
+                self._entries.move_to_end(key)
+                return asset
+
+        load_modules(*IMAGE_MODULES)
+        image = Image.open(path)
+        image.load()
+        asset = LogoAsset(path, image)
+
+        with self._lock:
+            # Drop stale versions of the same file
+            for old_key in [k for k in self._entries if k[0] == path]:
+                self.total_bytes -= self._entries.pop(old_key).nbytes
+            self._entries[key] = asset
+            self.total_bytes += asset.nbytes
+            while self.total_bytes > self.max_bytes and len(self._entries) > 1:
+                _, evicted = self._entries.popitem(last=False)
+                self.total_bytes -= evicted.nbytes
+        return asset
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.total_bytes = 0
+
+
+LOGO_CACHE = LogoCache()
+
+
+@functools.lru_cache(maxsize=None)
+def _logo_flowable_class():
+    # Defined on first use, since subclassing Flowable loads reportlab.platypus
+    class LogoFlowable(platypus.Flowable):
+        # Draws a cached logo; unlike RLImage it never goes back to the file
+        def __init__(self, asset, reader=None):
+            platypus.Flowable.__init__(self)
+            self.asset = asset
+            self.reader = reader or asset.reader
+            self.width = asset.pdf_width
+            self.height = asset.pdf_height
+            self.hAlign = 'CENTER'
+
+        def draw(self):
+            # drawImage hashes the image's RGB data on every call to find its
+            # XObject. Remember the name per canvas, so a logo repeated on
+            # every invoice of a statement is hashed and embedded once.
+            canv = self.canv
+            names = canv.__dict__.setdefault('_logo_xobjects', {})
+            name = names.get(self.reader)
+            if name is None:
+                found = {'name': None}
+                canv.drawImage(self.reader, 0, 0, self.width, self.height, mask='auto',
+                               extraReturn=found)
+                names[self.reader] = found['name']
+            else:
+                canv.saveState()
+                canv.scale(self.width, self.height)
+                canv.doForm(name)
+                canv.restoreState()
+
+    return LogoFlowable
+
+
+def logo_flowable(asset, reader=None):
+    return _logo_flowable_class()(asset, reader)
+
+
+# Font files tried in order for each family used by the image exporter
+FONT_FAMILIES = {
+    'arial': ('arial.ttf', 'LiberationSans-Regular.ttf', 'DejaVuSans.ttf', 'FreeSans.ttf'),
+}
+
+DEFAULT_FONT_DIRS = (
+    os.path.join(os.environ.get('WINDIR', 'C:\\Windows'), 'Fonts'),
+    '/usr/share/fonts',
+    '/usr/local/share/fonts',
+    os.path.expanduser('~/.fonts'),
+    os.path.expanduser('~/.local/share/fonts'),
+    '/Library/Fonts',
+    '/System/Library/Fonts',
+)
+
+
+class FontRegistry:
+    # Resolves and loads each (family, size) once per process. Extra font
+    # directories come from INVOICE_FONT_PATH (os.pathsep separated) and are
+    # searched before the system ones.
+    def __init__(self, search_path=None):
+        if search_path is None:
+            search_path = [p for p in os.environ.get('INVOICE_FONT_PATH', '').split(os.pathsep) if p]
+        self.search_path = list(search_path) + list(DEFAULT_FONT_DIRS)
+        self._index = None
+        self._files = {}
+        self._fonts = {}
+        self._lock = threading.Lock()
+
+    def add_search_path(self, path):
+        with self._lock:
+            self.search_path.insert(0, path)
+            self._index = None
+            self._files.clear()
+            self._fonts.clear()
+        self.measure.cache_clear()
+
+    def _build_index(self):
+        # Lower-cased file name -> first matching path, in search order
+        index = {}
+        for directory in self.search_path:
+            for dirpath, _, filenames in os.walk(directory):
+                for name in filenames:
+                    if name.lower().endswith(('.ttf', '.otf', '.ttc')):
+                        index.setdefault(name.lower(), os.path.join(dirpath, name))
+        return index
+
+    def resolve(self, family):
+        family = family.lower()
+        with self._lock:
+            if family not in self._files:
+                if self._index is None:
+                    self._index = self._build_index()
+                candidates = FONT_FAMILIES.get(family, (family + '.ttf',))
+                self._files[family] = next(
+                    (self._index[c.lower()] for c in candidates if c.lower() in self._index), None)
+                if self._files[family] is None:
+                    print(f"Font '{family}' not found in {os.pathsep.join(self.search_path)}; "
+                          f"using the default font", file=sys.stderr)
+            return self._files[family]
+
+    def get(self, family, size):
+        key = (family.lower(), size)
+        font = self._fonts.get(key)
+        if font is None:
+            path = self.resolve(family)
+            if path:
+                font = ImageFont.truetype(path, size)
+            else:
+                try:
+                    font = ImageFont.load_default(size)
+                except TypeError:
+                    # Pillow < 10.1 only has the fixed-size bitmap font
+                    font = ImageFont.load_default()
+            with self._lock:
+                font = self._fonts.setdefault(key, font)
+        return font
+
+    @functools.lru_cache(maxsize=4096)
+    def measure(self, text, family, size):
+        # (width, height) of text, memoized for repeated headers, labels and amounts
+        left, top, right, bottom = self.get(family, size).getbbox(text)
+        return right - left, bottom - top
+
+
+FONTS = FontRegistry()
+
+
+TEXT_CHUNK_LINES = 1000
+
+
+def invoice_text_header(invoice):
+    # Everything above the item lines
+    company_addr = invoice['company_address'].strip()
+    customer_addr = invoice['customer_address'].strip()
+
+    logo_info = f"Logo: {os.path.basename(invoice['logo_path'])}" if invoice['logo_path'] else "No logo"
+
+    return f"""
+{'='*80}
+                           INVOICE
+{'='*80}
+
+From:                                    To:
+{invoice['company_name']:<35} {invoice['customer_name']}
+{company_addr.replace(chr(10), ', '):<35} {customer_addr.replace(chr(10), ', ')}
+Phone: {invoice['company_phone']:<27} Phone: {invoice['customer_phone']}
+Email: {invoice['company_email']:<27} Email: {invoice['customer_email']}
+{logo_info}
+
+{'-'*80}
+
+Invoice Details:
+Invoice Number: {invoice['invoice_number']:<20} Invoice Date: {invoice['invoice_date']}
+Due Date: {invoice['due_date']:<26} Payment Terms: {invoice['payment_terms']}
+
+{'-'*80}
+
+ITEMS:
+{'-'*80}
+{'Description':<40} {'Qty':<8} {'Rate':<12} {'Amount':<12}
+{'-'*80}
+"""
+
+
+def invoice_text_line(item):
+    return f"{item['description']:<40} {item['quantity']:<8.1f} ₨{item['rate']:<11.2f} ₨{item['amount']:<11.2f}\n"
+
+
+def invoice_text_footer(totals):
+    # Totals and footer below the item lines
+    subtotal, discount_amount, tax_amount, total = totals
+    return f"""
+{'-'*80}
+                                                    Subtotal: ₨{subtotal:>11.2f}
+                                                    Discount: ₨{discount_amount:>11.2f}
+                                                    Tax:      ₨{tax_amount:>11.2f}
+                                                    {'='*20}
+                                                    TOTAL:    ₨{total:>11.2f}
+{'-'*80}
+
+Payment Instructions:
+
+
+{'-'*80}
+Generated on: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
+{'='*80}
+"""
+
+
+def iter_invoice_text(invoice, totals=None):
+    # Yields the text invoice in chunks: the header, blocks of
+    # TEXT_CHUNK_LINES item lines, then the totals and footer
+    totals = totals or invoice_totals(invoice)
+    yield invoice_text_header(invoice)
+
+    # Add items
+    lines = []
+    for item in invoice['items']:
+        lines.append(invoice_text_line(item))
+        if len(lines) == TEXT_CHUNK_LINES:
+            yield ''.join(lines)
+            lines = []
+    if lines:
+        yield ''.join(lines)
+
+    yield invoice_text_footer(totals)
+
+
+def build_invoice_text(invoice, totals=None):
+    return ''.join(iter_invoice_text(invoice, totals))
+
+
+def write_invoice_text(invoice, output, totals=None):
+    # Streams the chunks to a file name or a binary stream (as UTF-8), so
+    # large invoices are never held as one string
+    timer = TIMINGS.start('text', invoice)
+    if totals is None:
+        with timer.stage('totals'):
+            totals = invoice_totals(invoice)
+    with timer.stage('write'):
+        if isinstance(output, (str, os.PathLike)):
+            with open(output, 'w', encoding='utf-8', buffering=1024 * 1024) as file:
+                file.writelines(iter_invoice_text(invoice, totals))
+        else:
+            for chunk in iter_invoice_text(invoice, totals):
+                output.write(chunk.encode('utf-8'))
+    timer.done()
+
+
+# Item table columns a PDF template can pick from: heading, default width
+# in inches, alignment and how the cell text is built
+PDF_ITEM_COLUMNS = {
+    'description': ('Description', 3, 'LEFT', lambda item, currency: item['description']),
+    'quantity': ('Quantity', 1, 'RIGHT', lambda item, currency: f"{item['quantity']:.1f}"),
+    'rate': ('Rate', 1, 'RIGHT', lambda item, currency: f"{currency}{item['rate']:.2f}"),
+    'amount': ('Amount', 1, 'RIGHT', lambda item, currency: f"{currency}{item['amount']:.2f}"),
+}
+
+DEFAULT_PDF_TEMPLATE = {
+    'title': "INVOICE",
+    'statement_title': "STATEMENT",
+    'header_background': 'lightgrey',
+    'total_background': 'lightgrey',
+    'grid_color': 'black',
+    'columns': ['description', 'quantity', 'rate', 'amount'],
+    'currency': "₨",
+    'footer': "",
+}
+
+
+class PdfTemplate:
+    # The static part of the PDF layout (styles, table styles, column
+    # widths, headings) built once and then shared by every invoice and
+    # thread. Instances are frozen after __init__; nothing here is mutated
+    # while rendering, unlike the shared getSampleStyleSheet() styles.
+    def __init__(self, settings=None):
+        settings = dict(DEFAULT_PDF_TEMPLATE, **(settings or {}))
+        unknown = set(settings) - set(DEFAULT_PDF_TEMPLATE)
+        if unknown:
+            raise ValueError(f"Unknown PDF template settings: {', '.join(sorted(unknown))}")
+
+        self.title = settings['title']
+        self.statement_title = settings['statement_title']
+        self.currency = settings['currency']
+        self.footer = settings['footer']
+        header_bg = colors.toColor(settings['header_background'])
+        total_bg = colors.toColor(settings['total_background'])
+        grid = colors.toColor(settings['grid_color'])
+        self.header_background, self.total_background, self.grid_color = header_bg, total_bg, grid
+
+        # Item columns: names or {"key", "heading", "width"} objects
+        columns = []
+        for column in settings['columns']:
+            if isinstance(column, str):
+                column = {'key': column}
+            if column.get('key') not in PDF_ITEM_COLUMNS:
+                raise ValueError(f"Unknown PDF template column: {column.get('key')!r}")
+            heading, width, align, formatter = PDF_ITEM_COLUMNS[column['key']]
+            columns.append((column['key'], column.get('heading', heading),
+                            float(column.get('width', width)) * inch, align, formatter))
+        if not columns:
+            raise ValueError("A PDF template needs at least one item column")
+        self.columns = tuple(columns)
+        self.item_widths = tuple(column[2] for column in columns)
+        self.item_headings = tuple(column[1] for column in columns)
+        table_width = sum(self.item_widths)
+        self.info_widths = (3*inch, 3*inch)
+        self.details_widths = (1.5*inch, 1.5*inch, 1.5*inch, 1.5*inch)
+        self.totals_widths = (max(table_width - 2*inch, 1*inch), 2*inch)
+        self.summary_widths = (2.25*inch, 1.25*inch, 1.25*inch, 1.25*inch)
+
+        # Private styles derived from the sample sheet instead of edits to it
+        base = styles.getSampleStyleSheet()
+        self.title_style = styles.ParagraphStyle('InvoiceTitle', parent=base['Title'], alignment=1)
+        self.party_style = styles.ParagraphStyle('InvoiceParty', parent=base['Normal'], fontSize=10, leading=12)
+        self.footer_style = styles.ParagraphStyle('InvoiceFooter', parent=base['Normal'], fontSize=9, alignment=1)
+
+        self.info_style = platypus.TableStyle([
+            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, -1), 10),
+            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+            ('GRID', (0, 0), (-1, -1), 1, grid),
+            ('BACKGROUND', (0, 0), (-1, 0), header_bg),
+        ])
+        self.details_style = platypus.TableStyle([
+            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+            ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
+            ('FONTSIZE', (0, 0), (-1, -1), 10),
+            ('GRID', (0, 0), (-1, -1), 1, grid),
+            ('BACKGROUND', (0, 0), (0, -1), header_bg),
+            ('BACKGROUND', (2, 0), (2, -1), header_bg),
+        ])
+        self.items_style = platypus.TableStyle(
+            [('ALIGN', (col, 0), (col, -1), column[3]) for col, column in enumerate(columns)] + [
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+            ('FONTSIZE', (0, 0), (-1, -1), 10),
+            ('GRID', (0, 0), (-1, -1), 1, grid),
+            ('BACKGROUND', (0, 0), (-1, 0), header_bg),
+        ])
+        self.summary_style = platypus.TableStyle([
+            ('ALIGN', (0, 0), (2, -1), 'LEFT'),
+            ('ALIGN', (3, 0), (3, -1), 'RIGHT'),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTNAME', (0, 1), (-1, -2), 'Helvetica'),
+            ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, -1), 10),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+            ('GRID', (0, 0), (-1, -1), 1, grid),
+            ('BACKGROUND', (0, 0), (-1, 0), header_bg),
+            ('BACKGROUND', (0, -1), (-1, -1), total_bg),
+        ])
+        self.totals_style = platypus.TableStyle([
+            ('ALIGN', (0, 0), (-1, -1), 'RIGHT'),
+            ('FONTNAME', (0, 0), (-1, 2), 'Helvetica'),
+            ('FONTNAME', (0, 3), (-1, 3), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, 2), 10),
+            ('FONTSIZE', (0, 3), (-1, 3), 12),
+            ('GRID', (0, 0), (-1, -1), 1, grid),
+            ('BACKGROUND', (0, 3), (-1, 3), total_bg),
+        ])
+        self._frozen = True
+
+    def __setattr__(self, name, value):
+        if getattr(self, '_frozen', False):
+            raise AttributeError("PdfTemplate is read-only once compiled")
+        object.__setattr__(self, name, value)
+
+    def money(self, value):
+        return f"{self.currency}{value:.2f}"
+
+    def item_cells(self, item):
+        return [column[4](item, self.currency) for column in self.columns]
+
+    def party_cell(self, invoice, prefix):
+        # Paragraph so the name is really bold and addresses break lines
+        lines = [f"<b>{xml_escape(invoice[f'{prefix}_name'])}</b>"]
+        lines += [xml_escape(line) for line in invoice[f'{prefix}_address'].strip().splitlines()]
+        lines += [f"Phone: {xml_escape(invoice[f'{prefix}_phone'])}",
+                  f"Email: {xml_escape(invoice[f'{prefix}_email'])}"]
+        return platypus.Paragraph('<br/>'.join(lines), self.party_style)
+
+
+@functools.lru_cache(maxsize=32)
+def _compile_pdf_template(path, mtime_ns):
+    if path is None:
+        return PdfTemplate()
+    with open(path, encoding='utf-8') as file:
+        return PdfTemplate(json.load(file))
+
+
+def load_pdf_template(path=None):
+    # Compiled templates are cached per process by (path, mtime), so an
+    # edited template file is picked up on the next render. Without a path,
+    # INVOICE_PDF_TEMPLATE or the built-in layout is used.
+    path = path or os.environ.get('INVOICE_PDF_TEMPLATE') or None
+    if path is None:
+        return _compile_pdf_template(None, None)
+    path = os.path.abspath(path)
+    return _compile_pdf_template(path, os.stat(path).st_mtime_ns)
+
+
+class PdfProfile:
+    # How a PDF is encoded, as opposed to what it shows (PdfTemplate).
+    # 'default' is ReportLab's own output. 'compact' writes binary instead
+    # of ASCII85-armoured streams (a quarter smaller) and embeds the logo
+    # resampled to logo_dpi instead of at its source resolution.
+    def __init__(self, name, binary_streams=False, logo_dpi=None, jpeg_quality=85):
+        self.name = name
+        self.binary_streams = binary_streams
+        self.logo_dpi = logo_dpi
+        self.jpeg_quality = jpeg_quality
+
+    def logo_reader(self, asset):
+        return asset.pdf_reader(self.logo_dpi, self.jpeg_quality)
+
+    @contextlib.contextmanager
+    def encoding(self):
+        # ReportLab has no per-document switch for its stream filters; it
+        # reads rl_config.useA85 whenever a stream is created or written.
+        # The flag is kept per context instead, so it covers this render
+        # (its thread or task) only and leaves concurrent renders alone.
+        if not self.binary_streams:
+            yield
+            return
+        _install_stream_switch()
+        token = _BINARY_STREAMS.set(True)
+        try:
+            yield
+        finally:
+            _BINARY_STREAMS.reset(token)
+
+
+_BINARY_STREAMS = contextvars.ContextVar('binary_streams', default=False)
+
+
+class _RlConfigModule(types.ModuleType):
+    # rl_config with useA85 switched off inside PdfProfile.encoding();
+    # everywhere else it reads and writes the module's own setting
+    @property
+    def useA85(self):
+        return 0 if _BINARY_STREAMS.get() else self.__dict__['useA85']
+
+    @useA85.setter
+    def useA85(self, value):
+        self.__dict__['useA85'] = value
+
+
+def _install_stream_switch():
+    from reportlab import rl_config
+    with _LAZY_LOCK:
+        if not isinstance(rl_config, _RlConfigModule):
+            rl_config.useA85  # loads the module if it was imported lazily
+            rl_config.__class__ = _RlConfigModule
+
+
+PDF_PROFILES = {
+    'default': PdfProfile('default'),
+    'compact': PdfProfile('compact', binary_streams=True, logo_dpi=150),
+}
+
+
+def pdf_profile_name(name=None):
+    name = name or os.environ.get('INVOICE_PDF_PROFILE') or 'default'
+    if name not in PDF_PROFILES:
+        raise ValueError(f"Unknown PDF profile {name!r} (choose from {', '.join(PDF_PROFILES)})")
+    return name
+
+
+def load_pdf_profile(profile=None):
+    # A PdfProfile, a profile name, or None for INVOICE_PDF_PROFILE/default
+    if isinstance(profile, PdfProfile):
+        return profile
+    return PDF_PROFILES[pdf_profile_name(profile)]
+
+
+@functools.lru_cache(maxsize=256)
+def file_digest(path, mtime_ns, size):
+    # Content hash of a file, remembered per (path, mtime, size)
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for block in iter(functools.partial(file.read, 1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def pdf_template_version(path=None):
+    # Hash of the template file the PDF exporter would use, without
+    # compiling it (which would load ReportLab)
+    path = path or os.environ.get('INVOICE_PDF_TEMPLATE') or None
+    if path is None:
+        return 'default'
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    return file_digest(path, stat.st_mtime_ns, stat.st_size)
+
+
+# Above this many items render_pdf_invoice switches to the canvas path;
+# splitting one huge Table across pages gets slower with every page
+PDF_LARGE_ITEM_THRESHOLD = 500
+
+
+def render_pdf_invoice(invoice, filename, large=None, template=None, profile=None):
+    # filename may also be a binary stream; ReportLab writes the finished
+    # document to it in one go
+    load_modules(*PDF_MODULES)
+    if not isinstance(template, PdfTemplate):
+        template = load_pdf_template(template)
+    profile = load_pdf_profile(profile)
+    if large is None:
+        large = len(invoice['items']) > PDF_LARGE_ITEM_THRESHOLD
+    with profile.encoding():
+        if large:
+            return render_large_pdf_invoice(invoice, filename, template, profile)
+        _render_pdf_story(invoice, filename, template, profile)
+
+
+def _render_pdf_story(invoice, filename, template, profile):
+    timer = TIMINGS.start('pdf', invoice)
+    with timer.stage('totals'):
+        totals = invoice_totals(invoice)
+
+    # Create PDF document
+    doc = platypus.SimpleDocTemplate(filename, pagesize=letter, rightMargin=72, leftMargin=72,
+                                     topMargin=72, bottomMargin=18)
+
+    # Container for the 'Flowable' objects
+    elements = pdf_invoice_flowables(invoice, totals, template, timer, profile)
+
+    # Build PDF
+    with timer.stage('doc_build'):
+        doc.build(elements)
+    timer.done()
+
+
+def pdf_logo_flowables(invoice, timer=NULL_TIMER, profile=None):
+    # Logo and the space below it, or nothing if there is no usable logo
+    if invoice['logo_path']:
+        try:
+            # Decoded once per process and sized for a 0.75 inch height
+            with timer.stage('logo'):
+                asset = LOGO_CACHE.get(invoice['logo_path'])
+                logo = logo_flowable(asset, load_pdf_profile(profile).logo_reader(asset))
+            return [logo, platypus.Spacer(1, 12)]
+        except Exception as e:
+            print(f"Error loading logo: {e}")
+    return []
+
+
+def pdf_invoice_flowables(invoice, totals, template, timer=NULL_TIMER, profile=None):
+    # The platypus story for one invoice: logo, title, parties, details,
+    # items, totals and footer
+    subtotal, discount_amount, tax_amount, total = totals
+    elements = pdf_logo_flowables(invoice, timer, profile)
+
+    with timer.stage('tables'):
+        # Title
+        elements.append(platypus.Paragraph(xml_escape(template.title), template.title_style))
+        elements.append(platypus.Spacer(1, 12))
+
+        # Company and Customer info table
+        info_data = [
+            ['From:', 'To:'],
+            [template.party_cell(invoice, 'company'), template.party_cell(invoice, 'customer')]
+        ]
+
+        info_table = platypus.Table(info_data, colWidths=template.info_widths)
+        info_table.setStyle(template.info_style)
+        elements.append(info_table)
+        elements.append(platypus.Spacer(1, 12))
+
+        # Invoice details
+        details_data = [
+            ['Invoice Number:', invoice['invoice_number'], 'Invoice Date:', invoice['invoice_date']],
+            ['Due Date:', invoice['due_date'], 'Payment Terms:', invoice['payment_terms']]
+        ]
+
+        details_table = platypus.Table(details_data, colWidths=template.details_widths)
+        details_table.setStyle(template.details_style)
+        elements.append(details_table)
+        elements.append(platypus.Spacer(1, 12))
+
+        # Items table
+        items_data = [template.item_headings]
+        for item in invoice['items']:
+            items_data.append(template.item_cells(item))
+
+        items_table = platypus.Table(items_data, colWidths=template.item_widths)
+        items_table.setStyle(template.items_style)
+        elements.append(items_table)
+        elements.append(platypus.Spacer(1, 12))
+
+        # Totals table
+        totals_data = [
+            ['Subtotal:', template.money(subtotal)],
+            ['Discount:', template.money(discount_amount)],
+            ['Tax:', template.money(tax_amount)],
+            ['TOTAL:', template.money(total)]
+        ]
+
+        totals_table = platypus.Table(totals_data, colWidths=template.totals_widths)
+        totals_table.setStyle(template.totals_style)
+        elements.append(totals_table)
+        elements.append(platypus.Spacer(1, 24))
+
+        if template.footer:
+            elements.append(platypus.Paragraph(xml_escape(template.footer), template.footer_style))
+    return elements
+
+
+def pdf_bookmark(key, title, show_outline=False):
+    # Zero-size flowable that names the page it lands on and adds it to the
+    # document outline (the viewer's bookmarks panel)
+    def draw(flowable):
+        flowable.canv.bookmarkPage(key)
+        flowable.canv.addOutlineEntry(title, key, level=0)
+        if show_outline:
+            flowable.canv.showOutline()
+    return platypus.CallerMacro(draw)
+
+
+def pdf_statement_summary(invoices, totals, template, profile=None):
+    # Cover page: who it is for, then one linked row per invoice and the
+    # amount due across all of them
+    first = invoices[0]
+    dates = sorted(invoice['invoice_date'] for invoice in invoices if invoice['invoice_date']) or ['']
+    elements = [pdf_bookmark('summary', "Summary", show_outline=True)]
+    elements += pdf_logo_flowables(first, profile=profile)
+    elements.append(platypus.Paragraph(xml_escape(template.statement_title), template.title_style))
+    elements.append(platypus.Spacer(1, 12))
+
+    info_table = platypus.Table([['From:', 'To:'],
+                                 [template.party_cell(first, 'company'), template.party_cell(first, 'customer')]],
+                                colWidths=template.info_widths)
+    info_table.setStyle(template.info_style)
+    elements.append(info_table)
+    elements.append(platypus.Spacer(1, 12))
+
+    details_table = platypus.Table([
+        ['Statement Date:', datetime.now().strftime('%Y-%m-%d'), 'Invoices:', str(len(invoices))],
+        ['First Invoice:', dates[0], 'Last Invoice:', dates[-1]],
+    ], colWidths=template.details_widths)
+    details_table.setStyle(template.details_style)
+    elements.append(details_table)
+    elements.append(platypus.Spacer(1, 12))
+
+    rows = [['Invoice Number', 'Invoice Date', 'Due Date', 'Amount']]
+    for index, (invoice, invoice_total) in enumerate(zip(invoices, totals)):
+        link = f'<a href="#invoice-{index}" color="blue">{xml_escape(invoice["invoice_number"])}</a>'
+        rows.append([platypus.Paragraph(link, template.party_style), invoice['invoice_date'],
+                     invoice['due_date'], template.money(invoice_total[3])])
+    rows.append(['TOTAL DUE:', '', '', template.money(sum(total[3] for total in totals))])
+    summary_table = platypus.Table(rows, colWidths=template.summary_widths, repeatRows=1)
+    summary_table.setStyle(template.summary_style)
+    elements.append(summary_table)
+    return elements
+
+
+def render_pdf_statement(invoices, filename, template=None, profile=None):
+    # Renders several invoices into one PDF with a single doc.build: a
+    # summary page, then each invoice from a new page with its own bookmark.
+    # ReportLab stores an image once per document, so a logo shared by the
+    # invoices is embedded once, and fonts and styles are shared too.
+    # filename may also be a binary stream.
+    load_modules(*PDF_MODULES)
+    if not isinstance(template, PdfTemplate):
+        template = load_pdf_template(template)
+    profile = load_pdf_profile(profile)
+    invoices = list(invoices)
+    if not invoices:
+        raise ValueError("A statement needs at least one invoice")
+
+    timer = TIMINGS.start('statement', {
+        'invoice_number': f"{invoices[0]['invoice_number']}..{invoices[-1]['invoice_number']}",
+        'items': sum(len(invoice['items']) for invoice in invoices)})
+    with timer.stage('totals'):
+        totals = [invoice_totals(invoice) for invoice in invoices]
+
+    doc = platypus.SimpleDocTemplate(filename, pagesize=letter, rightMargin=72, leftMargin=72,
+                                     topMargin=72, bottomMargin=18, title=template.statement_title.title())
+    with timer.stage('tables'):
+        elements = pdf_statement_summary(invoices, totals, template, profile)
+    for index, (invoice, invoice_total) in enumerate(zip(invoices, totals)):
+        elements.append(platypus.PageBreak())
+        elements.append(pdf_bookmark(f"invoice-{index}",
+                                     f"{invoice['invoice_number']} ({invoice['invoice_date']})"))
+        elements.extend(pdf_invoice_flowables(invoice, invoice_total, template, timer, profile))
+
+    with timer.stage('doc_build'), profile.encoding():
+        doc.build(elements)
+    timer.done()
+
+
+class LargePdfWriter:
+    # Draws the invoice straight onto a canvas with fixed-height rows, so the
+    # cost per item is constant no matter how many pages there are. Mirrors
+    # the platypus layout: letter page, grid tables centred between 1 inch
+    # margins, Helvetica 10, with columns and colours from the template.
+    page_width, page_height = letter
+    top = page_height - 72
+    bottom = 18
+    row_height = 18
+
+    def __init__(self, invoice, filename, template=None, profile=None):
+        self.invoice = invoice
+        self.template = template or load_pdf_template()
+        self.profile = load_pdf_profile(profile)
+        self.item_columns = self.template.item_widths
+        self.left = (self.page_width - max(sum(self.item_columns), 6*inch)) / 2
+        self.canv = canvas.Canvas(filename, pagesize=letter)
+        self.page_number = 1
+        self.y = self.top
+
+    def grid(self, col_widths, row_count, shade_rows=(), shade_cols=(), row_height=None, shade=None):
+        # Grid lines and backgrounds for a block of rows starting at self.y
+        row_height = row_height or self.row_height
+        width = sum(col_widths)
+        height = row_count * row_height
+        canv = self.canv
+        canv.setFillColor(shade or self.template.header_background)
+        for row in shade_rows:
+            canv.rect(self.left, self.y - (row + 1) * row_height, width, row_height, stroke=0, fill=1)
+        x = self.left
+        for col, col_width in enumerate(col_widths):
+            if col in shade_cols:
+                canv.rect(x, self.y - height, col_width, height, stroke=0, fill=1)
+            x += col_width
+        canv.setFillColor(colors.black)
+
+        lines = [(self.left, self.y - r * row_height, self.left + width, self.y - r * row_height)
+                 for r in range(row_count + 1)]
+        x = self.left
+        for col_width in col_widths + (0,):
+            lines.append((x, self.y, x, self.y - height))
+            x += col_width
+        canv.setStrokeColor(self.template.grid_color)
+        canv.lines(lines)
+        canv.setStrokeColor(colors.black)
+
+    def cell(self, text, col_widths, col, row, font='Helvetica', size=10, align='LEFT'):
+        x = self.left + sum(col_widths[:col])
+        baseline = self.y - row * self.row_height - self.row_height + 6
+        self.canv.setFont(font, size)
+        if align == 'RIGHT':
+            self.canv.drawRightString(x + col_widths[col] - 6, baseline, text)
+        elif align == 'CENTER':
+            self.canv.drawCentredString(x + col_widths[col] / 2, baseline, text)
+        else:
+            self.canv.drawString(x + 6, baseline, text)
+
+    def load_logo(self):
+        # Logo, sized and decoded once per process
+        if self.invoice['logo_path']:
+            try:
+                return LOGO_CACHE.get(self.invoice['logo_path'])
+            except Exception as e:
+                print(f"Error loading logo: {e}")
+        return None
+
+    def draw_header(self, asset=None):
+        invoice = self.invoice
+        canv = self.canv
+
+        if asset is not None:
+            self.y -= asset.pdf_height
+            canv.drawImage(self.profile.logo_reader(asset), (self.page_width - asset.pdf_width) / 2, self.y,
+                           asset.pdf_width, asset.pdf_height, mask='auto')
+            self.y -= 12
+
+        # Title
+        canv.setFont('Helvetica-Bold', 18)
+        self.y -= 24
+        canv.drawCentredString(self.page_width / 2, self.y, self.template.title)
+        self.y -= 18
+
+        # Company and Customer info
+        parties = []
+        for prefix in ('company', 'customer'):
+            parties.append([invoice[f'{prefix}_name']]
+                           + invoice[f'{prefix}_address'].strip().splitlines()
+                           + [f"Phone: {invoice[f'{prefix}_phone']}", f"Email: {invoice[f'{prefix}_email']}"])
+        body_lines = max(len(lines) for lines in parties)
+        info_widths = self.template.info_widths
+        self.grid(info_widths, 1, shade_rows=(0,))
+        self.cell("From:", info_widths, 0, 0, 'Helvetica-Bold')
+        self.cell("To:", info_widths, 1, 0, 'Helvetica-Bold')
+        self.y -= self.row_height
+        body_height = body_lines * 12 + 6
+        self.grid(info_widths, 1, row_height=body_height)
+        for col, lines in enumerate(parties):
+            for i, line in enumerate(lines):
+                canv.setFont('Helvetica-Bold' if i == 0 else 'Helvetica', 10)
+                canv.drawString(self.left + sum(info_widths[:col]) + 6, self.y - 12 * (i + 1), line)
+        self.y -= body_height + 12
+
+        # Invoice details
+        details_widths = self.template.details_widths
+        details = [
+            ('Invoice Number:', invoice['invoice_number'], 'Invoice Date:', invoice['invoice_date']),
+            ('Due Date:', invoice['due_date'], 'Payment Terms:', invoice['payment_terms'])
+        ]
+        self.grid(details_widths, 2, shade_cols=(0, 2))
+        for row, values in enumerate(details):
+            for col, value in enumerate(values):
+                self.cell(value, details_widths, col, row)
+        self.y -= 2 * self.row_height + 12
+
+    def draw_item_header(self):
+        self.grid(self.item_columns, 1, shade_rows=(0,))
+        for col, column in enumerate(self.template.columns):
+            self.cell(column[1], self.item_columns, col, 0, 'Helvetica-Bold', align=column[3])
+        self.y -= self.row_height
+
+    def draw_subtotal_row(self, page_subtotal, running_total):
+        widths = self.template.totals_widths
+        money = self.template.money
+        self.grid(widths, 1, shade_rows=(0,))
+        self.cell(f"Page subtotal: {money(page_subtotal)}", widths, 0, 0, 'Helvetica-Bold')
+        self.cell(f"Running total: {money(running_total)}", widths, 1, 0, 'Helvetica-Bold', align='RIGHT')
+        self.y -= self.row_height
+
+    def new_page(self, running_total):
+        self.canv.setFont('Helvetica', 8)
+        self.canv.drawCentredString(self.page_width / 2, self.bottom, f"Page {self.page_number}")
+        self.canv.showPage()
+        self.page_number += 1
+        self.y = self.top
+
+        # Continuation pages repeat the invoice reference and column headers
+        self.canv.setFont('Helvetica-Bold', 12)
+        self.canv.drawString(self.left, self.y - 12,
+                             f"{self.template.title} {self.invoice['invoice_number']} (continued)")
+        self.canv.setFont('Helvetica', 10)
+        self.canv.drawRightString(self.left + sum(self.item_columns), self.y - 12,
+                                  f"Brought forward: {self.template.money(running_total)}")
+        self.y -= 24
+        self.draw_item_header()
+
+    def draw_items(self):
+        # Room for one more row plus the page subtotal row and footer
+        limit = self.bottom + 2 * self.row_height + 12
+        page_subtotal = 0
+        running_total = 0
+
+        self.draw_item_header()
+        page_rows = []
+        for item in self.invoice['items']:
+            if self.y - (len(page_rows) + 1) * self.row_height < limit:
+                self.draw_item_rows(page_rows)
+                self.draw_subtotal_row(page_subtotal, running_total)
+                self.new_page(running_total)
+                page_rows = []
+                page_subtotal = 0
+            page_rows.append(item)
+            page_subtotal += item['amount']
+            running_total += item['amount']
+
+        self.draw_item_rows(page_rows)
+        self.draw_subtotal_row(page_subtotal, running_total)
+        return running_total
+
+    def draw_item_rows(self, rows):
+        if not rows:
+            return
+        self.grid(self.item_columns, len(rows))
+        canv = self.canv
+        canv.setFont('Helvetica', 10)
+        currency = self.template.currency
+
+        # (draw function, x, formatter, max characters) per column
+        cells = []
+        x = self.left
+        for (key, heading, width, align, formatter) in self.template.columns:
+            if align == 'RIGHT':
+                cells.append((canv.drawRightString, x + width - 6, formatter, None))
+            else:
+                cells.append((canv.drawString, x + 6, formatter, int(width / 4.8)))
+            x += width
+
+        baseline = self.y - self.row_height + 6
+        for item in rows:
+            for draw, x, formatter, max_chars in cells:
+                draw(x, baseline, formatter(item, currency)[:max_chars])
+            baseline -= self.row_height
+        self.y -= len(rows) * self.row_height
+
+    def draw_totals(self, totals):
+        subtotal, discount_amount, tax_amount, total = totals
+        widths = self.template.totals_widths
+        money = self.template.money
+        if self.y - 12 - 4 * self.row_height < self.bottom + 12:
+            self.new_page(subtotal)
+        self.y -= 12
+        self.grid(widths, 3)
+        self.y -= 3 * self.row_height
+        self.grid(widths, 1, shade_rows=(0,), shade=self.template.total_background)
+        self.y += 3 * self.row_height
+        rows = [
+            ('Subtotal:', money(subtotal)),
+            ('Discount:', money(discount_amount)),
+            ('Tax:', money(tax_amount)),
+            ('TOTAL:', money(total))
+        ]
+        for row, (label, value) in enumerate(rows):
+            font = 'Helvetica-Bold' if row == 3 else 'Helvetica'
+            self.cell(label, widths, 0, row, font, 12 if row == 3 else 10, align='RIGHT')
+            self.cell(value, widths, 1, row, font, 12 if row == 3 else 10, align='RIGHT')
+        self.y -= 4 * self.row_height
+
+        if self.template.footer:
+            self.canv.setFont('Helvetica', 9)
+            self.canv.drawCentredString(self.page_width / 2, self.y - 24, self.template.footer)
+
+    def render(self):
+        timer = TIMINGS.start('pdf', self.invoice)
+        with timer.stage('logo'):
+            asset = self.load_logo()
+        with timer.stage('draw'):
+            self.draw_header(asset)
+            self.draw_items()
+        with timer.stage('totals'):
+            totals = invoice_totals(self.invoice)
+        with timer.stage('draw'):
+            self.draw_totals(totals)
+            self.canv.setFont('Helvetica', 8)
+            self.canv.drawCentredString(self.page_width / 2, self.bottom, f"Page {self.page_number}")
+            self.canv.showPage()
+        with timer.stage('save'):
+            self.canv.save()
+        timer.done()
+
+
+def render_large_pdf_invoice(invoice, filename, template=None, profile=None):
+    LargePdfWriter(invoice, filename, template, profile).render()
+
+
+# Image page geometry. Header heights are measured from the top of the
+# title, which sits below the logo when there is one.
+IMAGE_PAGE_SIZE = (800, 1100)
+IMAGE_ROW_HEIGHT = 20
+IMAGE_BOTTOM_MARGIN = 50
+IMAGE_FIRST_HEADER = 325
+IMAGE_CONTINUED_HEADER = 150
+IMAGE_TOTALS_HEIGHT = 145
+
+
+def _image_logo(invoice, scale=1):
+    if invoice['logo_path']:
+        try:
+            # Pre-resized to fit 200x80 (times scale) and converted to RGBA
+            return LOGO_CACHE.get(invoice['logo_path']).image_logo(scale)
+        except Exception as e:
+            print(f"Error loading logo: {e}")
+    return None
+
+
+def image_logo_height(logo, scale=1):
+    # Logo height in page units, which is what pagination works in
+    return round(logo.height / scale)
+
+
+def image_page_top(logo, scale=1):
+    return 20 + image_logo_height(logo, scale) + 20 if logo is not None else 30
+
+
+# Resolution of an unscaled 800x1100 page
+IMAGE_BASE_DPI = 96
+
+
+class ImageProfile:
+    # How image pages are drawn and encoded. `gray` draws pages without a
+    # logo in 8-bit grayscale (everything else is black on white) and saves
+    # them as lossless WebP, `palette` reduces PNG pages to 16 grays or 64
+    # colours, and `bilevel` thresholds pages to 1 bit for PNG, TIFF and
+    # WebP. `options` are Pillow save() options per format.
+
+    # 16 evenly spaced grays, stored as 4-bit palette indices
+    gray_levels = [(value * 15 + 127) // 255 for value in range(256)]
+    gray_palette = bytes(level * 17 for level in range(16) for _ in range(3))
+
+    def __init__(self, name, gray=False, palette=False, bilevel=False, options=None):
+        self.name = name
+        self.gray = gray
+        self.palette = palette
+        self.bilevel = bilevel
+        self.options = options or {}
+
+    def page_mode(self, logo):
+        if self.bilevel or (self.gray and logo is None):
+            return 'L'
+        return 'RGB'
+
+    def save(self, img, output, image_format, scale=1):
+        options = dict(self.options.get(image_format, {}))
+        if self.gray and img.mode == 'L' and image_format == 'WEBP':
+            # A page without a logo is only text, which lossless WebP keeps
+            # sharp and stores in less space than lossy
+            options = {'lossless': True}
+        if self.bilevel and image_format != 'JPEG':
+            img = img.convert('1', dither=Image.Dither.NONE)
+        elif self.palette and image_format == 'PNG':
+            if img.mode == 'L':
+                # A lookup table: several times quicker than quantize()
+                img = img.point(self.gray_levels)
+                img.putpalette(self.gray_palette)
+                options['bits'] = 4
+            else:
+                img = img.quantize(64, method=Image.Quantize.FASTOCTREE, dither=Image.Dither.NONE)
+        if scale != 1 or image_format == 'TIFF':
+            # So the page prints at its intended size. Pillow writes 1 dpi
+            # into a TIFF that is not given one
+            options['dpi'] = (IMAGE_BASE_DPI * scale,) * 2
+        img.save(output, image_format, **options)
+
+
+IMAGE_PROFILES = {
+    'default': ImageProfile('default', options={
+        'JPEG': {'quality': 95}, 'TIFF': {'compression': 'tiff_deflate'}, 'WEBP': {'quality': 90}}),
+    'compact': ImageProfile('compact', gray=True, palette=True, options={
+        'JPEG': {'quality': 85, 'optimize': True, 'progressive': True},
+        'TIFF': {'compression': 'tiff_deflate'}, 'WEBP': {'quality': 80, 'method': 6}}),
+    'bilevel': ImageProfile('bilevel', bilevel=True, options={
+        'JPEG': {'quality': 85, 'optimize': True, 'progressive': True},
+        'PNG': {'optimize': True}, 'TIFF': {'compression': 'group4'}, 'WEBP': {'lossless': True}}),
+}
+
+
+def image_profile_name(name=None):
+    name = name or os.environ.get('INVOICE_IMAGE_PROFILE') or 'default'
+    if name not in IMAGE_PROFILES:
+        raise ValueError(f"Unknown image profile {name!r} (choose from {', '.join(IMAGE_PROFILES)})")
+    return name
+
+
+def load_image_profile(profile=None):
+    # An ImageProfile, a profile name, or None for INVOICE_IMAGE_PROFILE/default
+    if isinstance(profile, ImageProfile):
+        return profile
+    return IMAGE_PROFILES[image_profile_name(profile)]
+
+
+def image_scale(scale=None):
+    # Page resolution factor: 1 is 800x1100 (96 dpi), 3.125 is 300 dpi
+    scale = float(scale or os.environ.get('INVOICE_IMAGE_SCALE') or 1)
+    if not 0.25 <= scale <= 8:
+        raise ValueError(f"Image scale must be between 0.25 and 8, not {scale:g}")
+    return scale
+
+
+def paginate_image_items(item_count, top):
+    # Splits the items into (start, end) ranges, one per page. The last page
+    # always keeps room for the totals block, even if that means a page with
+    # no item rows.
+    bottom = IMAGE_PAGE_SIZE[1] - IMAGE_BOTTOM_MARGIN
+    pages = []
+    start = 0
+    header = IMAGE_FIRST_HEADER
+    while True:
+        room = bottom - top - header
+        remaining = item_count - start
+        if remaining * IMAGE_ROW_HEIGHT + IMAGE_TOTALS_HEIGHT <= room:
+            pages.append((start, item_count))
+            return pages
+        end = start + min(room // IMAGE_ROW_HEIGHT, remaining)
+        pages.append((start, end))
+        start = end
+        header = IMAGE_CONTINUED_HEADER
+
+
+def render_image_page(invoice, pages, page_index, totals, logo=None, scale=1, mode='RGB'):
+    # Draws one page on its own canvas; pages share nothing but read-only inputs.
+    # Layout is in 800x1100 page units; scale draws it at a higher
+    # resolution directly (fonts, lines and logo included), and logo must
+    # already be sized for that scale.
+    subtotal, discount_amount, tax_amount, total = totals
+    first_page = page_index == 0
+    last_page = page_index == len(pages) - 1
+
+    def px(value):
+        return round(value * scale)
+
+    # Create image
+    img_width, img_height = IMAGE_PAGE_SIZE
+    img = Image.new(mode, (px(img_width), px(img_height)), 'white')
+    draw = ImageDraw.Draw(img)
+
+    def text(x, y, value, font):
+        draw.text((px(x), px(y)), value, fill='black', font=font)
+
+    def rule(x1, x2, y, width=1):
+        draw.line([(px(x1), px(y)), (px(x2), px(y))], fill='black', width=max(1, px(width)))
+
+    # Loaded once per process by the font registry
+    title_font = FONTS.get('arial', px(24))
+    header_font = FONTS.get('arial', px(14))
+    normal_font = FONTS.get('arial', px(12))
+    small_font = FONTS.get('arial', px(10))
+
+    y_pos = 30
+
+    # Add logo if available
+    if logo is not None:
+        # Paste logo at top center
+        logo_x = (img.width - logo.width) // 2
+        img.paste(logo, (logo_x, px(20)), logo)
+
+        # Adjust y position below logo
+        y_pos = 20 + image_logo_height(logo, scale) + 20
+
+    # Title
+    title_text = "INVOICE"
+    title_width, _ = FONTS.measure(title_text, 'arial', px(24))
+    draw.text(((img.width - title_width) // 2, px(y_pos)), title_text, fill='black', font=title_font)
+    y_pos += 50
+
+    # Draw line
+    rule(50, img_width - 50, y_pos, 2)
+    y_pos += 20
+
+    if first_page:
+        # Company and Customer info
+        text(50, y_pos, "From:", header_font)
+        text(400, y_pos, "To:", header_font)
+        y_pos += 25
+
+        # Company info
+        company_info = [
+            invoice['company_name'],
+            invoice['company_address'].strip(),
+            f"Phone: {invoice['company_phone']}",
+            f"Email: {invoice['company_email']}"
+        ]
+
+        # Customer info
+        customer_info = [
+            invoice['customer_name'],
+            invoice['customer_address'].strip(),
+            f"Phone: {invoice['customer_phone']}",
+            f"Email: {invoice['customer_email']}"
+        ]
+
+        for i, (comp_line, cust_line) in enumerate(zip(company_info, customer_info)):
+            text(50, y_pos + i * 20, comp_line, normal_font)
+            text(400, y_pos + i * 20, cust_line, normal_font)
+
+        y_pos += 100
+
+        # Invoice details
+        rule(50, img_width - 50, y_pos)
+        y_pos += 15
+
+        invoice_details = [
+            f"Invoice Number: {invoice['invoice_number']}",
+            f"Invoice Date: {invoice['invoice_date']}",
+            f"Due Date: {invoice['due_date']}",
+            f"Payment Terms: {invoice['payment_terms']}"
+        ]
+
+        for i, detail in enumerate(invoice_details):
+            x_pos = 50 if i % 2 == 0 else 400
+            y_offset = (i // 2) * 20
+            text(x_pos, y_pos + y_offset, detail, normal_font)
+
+        y_pos += 60
+    else:
+        # Continuation pages only repeat the invoice reference
+        text(50, y_pos, f"Invoice Number: {invoice['invoice_number']}", normal_font)
+        text(400, y_pos, f"Invoice Date: {invoice['invoice_date']}", normal_font)
+        y_pos += 25
+
+    # Items header
+    rule(50, img_width - 50, y_pos)
+    y_pos += 15
+
+    # Items table header
+    text(50, y_pos, "Description", header_font)
+    text(400, y_pos, "Qty", header_font)
+    text(500, y_pos, "Rate", header_font)
+    text(600, y_pos, "Amount", header_font)
+    y_pos += 25
+
+    rule(50, img_width - 50, y_pos)
+    y_pos += 15
+
+    # Items
+    start, end = pages[page_index]
+    for item in invoice['items'][start:end]:
+        text(50, y_pos, item['description'][:40], normal_font)
+        text(400, y_pos, f"{item['quantity']:.1f}", normal_font)
+        text(500, y_pos, f"₨{item['rate']:.2f}", normal_font)
+        text(600, y_pos, f"₨{item['amount']:.2f}", normal_font)
+        y_pos += IMAGE_ROW_HEIGHT
+
+    if last_page:
+        y_pos += 20
+        rule(50, img_width - 50, y_pos)
+        y_pos += 15
+
+        # Totals
+        totals = [
+            f"Subtotal: ₨{subtotal:>11.2f}",
+            f"Discount: ₨{discount_amount:>11.2f}",
+            f"Tax: ₨{tax_amount:>11.2f}",
+            f"TOTAL: ₨{total:>11.2f}"
+        ]
+
+        for total_line in totals:
+            text(500, y_pos, total_line, normal_font)
+            y_pos += 20
+
+        # Final total with emphasis
+        rule(450, img_width - 50, y_pos, 2)
+        y_pos += 30
+
+    # Page number, only on multi-page invoices
+    if len(pages) > 1:
+        page_text = f"Page {page_index + 1} of {len(pages)}"
+        page_width, _ = FONTS.measure(page_text, 'arial', px(10))
+        draw.text(((img.width - page_width) // 2, px(img_height - 35)), page_text, fill='black', font=small_font)
+
+    return img
+
+
+def iter_image_pages(invoice, pages, totals, logo=None, workers=1, scale=1, mode='RGB'):
+    # Yields rendered pages in order. With several workers, at most `workers`
+    # pages are being rendered or waiting to be saved at any time.
+    if workers <= 1:
+        for page_index in range(len(pages)):
+            yield render_image_page(invoice, pages, page_index, totals, logo, scale, mode)
+        return
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for page_index in range(len(pages)):
+            pending.append(executor.submit(render_image_page, invoice, pages, page_index, totals, logo,
+                                           scale, mode))
+            if len(pending) >= workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def render_image_thumbnail(invoice, totals, reduce=4):
+    # First page only, shrunk for the preview tab
+    load_modules(*IMAGE_MODULES)
+    logo = _image_logo(invoice)
+    pages = paginate_image_items(len(invoice['items']), image_page_top(logo))
+    return render_image_page(invoice, pages, 0, totals, logo).reduce(reduce)
+
+
+def image_page_filename(filename, page_number):
+    stem, ext = os.path.splitext(filename)
+    return f"{stem}-{page_number:03d}{ext}"
+
+
+def _image_page_iter(invoice, timer, workers=1, profile=None, scale=1):
+    # (pages, lazily drawn page images) for an image export
+    load_modules(*IMAGE_MODULES)
+    with timer.stage('totals'):
+        totals = invoice_totals(invoice)
+    with timer.stage('logo'):
+        logo = _image_logo(invoice, scale)
+    pages = paginate_image_items(len(invoice['items']), image_page_top(logo, scale))
+    mode = profile.page_mode(logo) if profile is not None else 'RGB'
+    # Pages are drawn lazily, so 'draw' is the wait for each next page
+    return pages, timer.iterate('draw', iter_image_pages(invoice, pages, totals, logo, workers, scale, mode))
+
+
+def _save_tiff_pages(page_iter, output, timer, profile, scale=1):
+    with TiffImagePlugin.AppendingTiffWriter(output, True) as tiff:
+        for img in page_iter:
+            with timer.stage('save'):
+                profile.save(img, tiff, 'TIFF', scale)
+                tiff.newFrame()
+
+
+IMAGE_EXTENSION_FORMATS = {'.jpg': 'JPEG', '.jpeg': 'JPEG', '.webp': 'WEBP', '.tif': 'TIFF', '.tiff': 'TIFF'}
+
+
+def render_image_invoice(invoice, filename, workers=1, profile=None, scale=None):
+    # Single-page invoices are written to filename. Longer ones become a
+    # multi-page TIFF for .tif/.tiff, otherwise a numbered series
+    # (name-001.jpg, name-002.jpg, ...). Returns the paths written.
+    profile = load_image_profile(profile)
+    scale = image_scale(scale)
+    timer = TIMINGS.start('image', invoice)
+    pages, page_iter = _image_page_iter(invoice, timer, workers, profile, scale)
+
+    image_format = IMAGE_EXTENSION_FORMATS.get(os.path.splitext(filename)[1].lower(), 'PNG')
+    if image_format == 'TIFF':
+        _save_tiff_pages(page_iter, filename, timer, profile, scale)
+        timer.done()
+        return [filename]
+
+    # Save image
+    paths = []
+    for page_number, img in enumerate(page_iter, 1):
+        path = filename if len(pages) == 1 else image_page_filename(filename, page_number)
+        with timer.stage('save'):
+            profile.save(img, path, image_format, scale)
+        paths.append(path)
+    timer.done()
+    return paths
+
+
+def write_image_invoice(invoice, stream, image_format='PNG', workers=1, profile=None, scale=None):
+    # Writes the image export to a binary stream. A TIFF holds every page;
+    # JPEG and PNG hold one, so longer invoices need TIFF or
+    # iter_image_page_bytes(). The TIFF writer seeks back to patch offsets,
+    # so for a stream that cannot seek it is assembled in memory first.
+    profile = load_image_profile(profile)
+    scale = image_scale(scale)
+    timer = TIMINGS.start('image', invoice)
+    pages, page_iter = _image_page_iter(invoice, timer, workers, profile, scale)
+    if image_format == 'TIFF':
+        if stream.seekable():
+            _save_tiff_pages(page_iter, stream, timer, profile, scale)
+        else:
+            buffer = io.BytesIO()
+            _save_tiff_pages(page_iter, buffer, timer, profile, scale)
+            stream.write(buffer.getbuffer())
+    elif len(pages) > 1:
+        raise ValueError(f"The invoice spans {len(pages)} pages; write it as TIFF "
+                         f"or use iter_image_page_bytes()")
+    else:
+        for img in page_iter:
+            with timer.stage('save'):
+                profile.save(img, stream, image_format, scale)
+    timer.done()
+
+
+def iter_image_page_bytes(invoice, image_format='PNG', workers=1, profile=None, scale=None):
+    # Yields each page encoded on its own, e.g. for one zip entry per page
+    profile = load_image_profile(profile)
+    scale = image_scale(scale)
+    timer = TIMINGS.start('image', invoice)
+    pages, page_iter = _image_page_iter(invoice, timer, workers, profile, scale)
+    try:
+        for img in page_iter:
+            buffer = io.BytesIO()
+            with timer.stage('save'):
+                profile.save(img, buffer, image_format, scale)
+            yield buffer.getvalue()
+    finally:
+        # Also when the caller stops early or the generator is closed
+        timer.done()
+
+
+DEFAULT_STORE_PATH = os.environ.get(
+    'INVOICE_DB', os.path.join(os.path.expanduser('~'), '.invoice_generator', 'invoices.db'))
+
+STORE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS invoices (
+    id INTEGER PRIMARY KEY,
+    invoice_number TEXT NOT NULL UNIQUE,
+    company_name TEXT, company_address TEXT, company_phone TEXT, company_email TEXT,
+    customer_name TEXT, customer_address TEXT, customer_phone TEXT, customer_email TEXT,
+    customer_key TEXT,
+    invoice_date TEXT, due_date TEXT, payment_terms TEXT,
+    tax_rate TEXT, discount TEXT, logo_path TEXT,
+    subtotal_cents INTEGER, discount_cents INTEGER, tax_cents INTEGER, total_cents INTEGER,
+    item_count INTEGER, saved_at TEXT
+);
+CREATE INDEX IF NOT EXISTS invoices_customer ON invoices (customer_key, id);
+CREATE INDEX IF NOT EXISTS invoices_date ON invoices (invoice_date, id);
+CREATE INDEX IF NOT EXISTS invoices_due ON invoices (due_date, id);
+CREATE TABLE IF NOT EXISTS items (
+    invoice_id INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    description TEXT, quantity TEXT, rate TEXT, amount_cents INTEGER,
+    tax_rate TEXT, discount TEXT,
+    PRIMARY KEY (invoice_id, position)
+) WITHOUT ROWID;
+"""
+
+
+def to_cents(amount):
+    return int(amount.quantize(CENTS, ROUND_HALF_UP) * 100)
+
+
+def from_cents(cents):
+    return (Decimal(cents) / 100).quantize(CENTS)
+
+
+class InvoiceStore:
+    # Local SQLite archive of invoices. Money is kept as integer cents and
+    # quantities/rates as exact decimal text; saving an invoice number that
+    # already exists replaces it. Searches are keyset-paged (newest first),
+    # so fetching the next page costs the same at any depth.
+    def __init__(self, path=DEFAULT_STORE_PATH):
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(STORE_SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def _write(self, invoice):
+        if not invoice['invoice_number']:
+            raise ValueError("Invoice number is required to save an invoice")
+        subtotal, discount_amount, tax_amount, total = invoice_totals(invoice)
+        row = {field: invoice[field] for field in INVOICE_FIELDS}
+        row.update(
+            customer_key=invoice['customer_name'].strip().lower(),
+            logo_path=invoice['logo_path'],
+            subtotal_cents=to_cents(subtotal), discount_cents=to_cents(discount_amount),
+            tax_cents=to_cents(tax_amount), total_cents=to_cents(total),
+            item_count=len(invoice['items']),
+            saved_at=datetime.now().isoformat(timespec='seconds'),
+        )
+        columns = list(row)
+
+        existing = self.conn.execute("SELECT id FROM invoices WHERE invoice_number = ?",
+                                     (invoice['invoice_number'],)).fetchone()
+        if existing:
+            invoice_id = existing['id']
+            self.conn.execute(
+                f"UPDATE invoices SET {', '.join(f'{c} = :{c}' for c in columns)} WHERE id = :id",
+                dict(row, id=invoice_id))
+            self.conn.execute("DELETE FROM items WHERE invoice_id = ?", (invoice_id,))
+        else:
+            invoice_id = self.conn.execute(
+                f"INSERT INTO invoices ({', '.join(columns)}) VALUES ({', '.join(':' + c for c in columns)})",
+                row).lastrowid
+
+        self.conn.executemany(
+            "INSERT INTO items VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            ((invoice_id, position, item['description'], str(item['quantity']), str(item['rate']),
+              to_cents(item['amount']),
+              None if item.get('tax_rate') is None else str(item['tax_rate']),
+              None if item.get('discount') is None else str(item['discount']))
+             for position, item in enumerate(invoice['items'])))
+        return invoice_id
+
+    def save(self, invoice):
+        with self.conn:
+            return self._write(invoice)
+
+    def save_many(self, invoices, batch_size=1000):
+        # One transaction per batch_size invoices; returns how many were saved.
+        # invoices may be any iterable, including a list
+        invoices = iter(invoices)
+        saved = 0
+        for batch in iter(lambda: list(itertools.islice(invoices, batch_size)), []):
+            with self.conn:
+                for invoice in batch:
+                    self._write(invoice)
+            saved += len(batch)
+        return saved
+
+    def load(self, invoice_id=None, invoice_number=None):
+        # Returns an invoice dict shaped like InvoiceGenerator.get_invoice_data()
+        if invoice_id is not None:
+            row = self.conn.execute("SELECT * FROM invoices WHERE id = ?", (invoice_id,)).fetchone()
+        else:
+            row = self.conn.execute("SELECT * FROM invoices WHERE invoice_number = ?",
+                                    (invoice_number,)).fetchone()
+        if row is None:
+            raise KeyError(f"No stored invoice {invoice_number or invoice_id}")
+
+        invoice = {field: row[field] or '' for field in INVOICE_FIELDS}
+        invoice['logo_path'] = row['logo_path']
+        invoice['items'] = [
+            make_item(item['description'], item['quantity'], item['rate'], item['tax_rate'], item['discount'])
+            for item in self.conn.execute(
+                "SELECT * FROM items WHERE invoice_id = ? ORDER BY position", (row['id'],))
+        ]
+        return invoice
+
+    def search(self, invoice_number=None, customer=None, date_from=None, date_to=None,
+               due_from=None, due_to=None, before_id=None, limit=100):
+        # Prefix match on number and customer, inclusive ISO date ranges.
+        # Pass the last row's id as before_id to get the next page.
+        where, params = self.filter_clause(invoice_number, customer, date_from, date_to, due_from, due_to, before_id)
+        rows = self.conn.execute(
+            f"SELECT id, invoice_number, customer_name, invoice_date, due_date, total_cents, item_count "
+            f"FROM invoices {where} ORDER BY id DESC LIMIT ?", params + [limit])
+        return [dict(row, total=from_cents(row['total_cents'])) for row in rows]
+
+    @staticmethod
+    def filter_clause(invoice_number=None, customer=None, date_from=None, date_to=None,
+                      due_from=None, due_to=None, before_id=None):
+        # The WHERE clause (or "") and its parameters for search() filters
+        clauses, params = [], []
+        if invoice_number:
+            clauses.append("invoice_number >= ? AND invoice_number < ?")
+            params += [invoice_number, invoice_number + '\uffff']
+        if customer:
+            key = customer.strip().lower()
+            clauses.append("customer_key >= ? AND customer_key < ?")
+            params += [key, key + '\uffff']
+        for column, op, value in (('invoice_date', '>=', date_from), ('invoice_date', '<=', date_to),
+                                  ('due_date', '>=', due_from), ('due_date', '<=', due_to)):
+            if value:
+                clauses.append(f"{column} {op} ?")
+                params.append(value)
+        if before_id is not None:
+            clauses.append("id < ?")
+            params.append(before_id)
+        return (f"WHERE {' AND '.join(clauses)}" if clauses else ""), params
+
+    def count(self):
+        return self.conn.execute("SELECT COUNT(*) FROM invoices").fetchone()[0]
+
+
+DEFAULT_NUMBER_FORMAT = os.environ.get('INVOICE_NUMBER_FORMAT', "INV-{date:%Y%m%d}-{seq:05d}")
+
+
+class InvoiceNumberAllocator:
+    # Hands out invoice numbers from a named counter in SQLite. Each
+    # reservation is one BEGIN IMMEDIATE transaction, so numbers are unique
+    # across threads and processes sharing the database file. Numbers are
+    # taken from the database in blocks of block_size and then handed out
+    # locally, so a batch run touches the lock once per block rather than
+    # once per invoice. Unused numbers in a block are simply skipped.
+    #
+    # number_format is a str.format template with {seq} (the counter) and
+    # {date} (the allocation time), e.g. "INV-{date:%Y}-{seq:06d}".
+    def __init__(self, path=DEFAULT_STORE_PATH, name='default', number_format=DEFAULT_NUMBER_FORMAT,
+                 block_size=1):
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self.name = name
+        self.number_format = number_format
+        self.block_size = block_size
+        self._block = iter(())
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS sequences (name TEXT PRIMARY KEY, next_value INTEGER NOT NULL)")
+        # Fail early on a bad template rather than on the first allocation
+        self.format(1)
+
+    def close(self):
+        self.conn.close()
+
+    def format(self, seq):
+        return self.number_format.format(seq=seq, date=datetime.now())
+
+    def reserve(self, count):
+        # Atomically claims count consecutive sequence values; returns a range
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self.conn.execute("SELECT next_value FROM sequences WHERE name = ?",
+                                        (self.name,)).fetchone()
+                first = row[0] if row else 1
+                self.conn.execute("INSERT OR REPLACE INTO sequences (name, next_value) VALUES (?, ?)",
+                                  (self.name, first + count))
+                self.conn.execute("COMMIT")
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+        return range(first, first + count)
+
+    def next(self):
+        seq = next(self._block, None)
+        if seq is None:
+            self._block = iter(self.reserve(self.block_size))
+            seq = next(self._block)
+        return self.format(seq)
+
+
+def fallback_invoice_number():
+    # Used when the sequence database cannot be opened
+    return f"INV-{datetime.now().strftime('%Y%m%d%H%M%S')}"
+
+
+def assign_missing_numbers(records, allocator):
+    # Fills in invoice numbers for (line number, invoice, error) records
+    for line_no, invoice, error in records:
+        if invoice is not None and not invoice['invoice_number']:
+            invoice['invoice_number'] = allocator.next()
+        yield line_no, invoice, error
+
+
+def load_numpy():
+    # NumPy is only needed by the reports, so it is imported on first use
+    # and stays an optional dependency
+    try:
+        return importlib.import_module('numpy')
+    except ImportError:
+        raise RuntimeError("Reports need NumPy: pip install numpy") from None
+
+
+def round_half_up_div(np, numerator, denominator):
+    # numerator / denominator rounded to an integer, halves away from zero
+    # like Decimal's ROUND_HALF_UP; exact on integer (or object) arrays
+    return np.sign(numerator) * ((np.abs(numerator) * 2 + denominator) // (2 * denominator))
+
+
+def group_sums(np, codes, size, values):
+    # Exact per-group sums of an integer column (np.bincount sums in float)
+    sums = np.zeros(size, dtype=values.dtype)
+    np.add.at(sums, codes, values)
+    return sums
+
+
+def iso_dates(np, values):
+    # ISO date strings as datetime64[D]; blank or malformed ones become NaT
+    dates = np.array(values, dtype=object)
+    try:
+        return dates.astype('datetime64[D]')
+    except ValueError:
+        parsed = []
+        for value in values:
+            try:
+                parsed.append(np.datetime64(value, 'D'))
+            except ValueError:
+                parsed.append(np.datetime64('NaT', 'D'))
+        return np.array(parsed, dtype='datetime64[D]')
+
+
+class ReportData:
+    # Columnar snapshot of stored invoices for the reports: one NumPy array
+    # per invoice column, and one row per (invoice, line tax rate, line
+    # discount) group of items with its amount. Tax and discount are
+    # recomputed per group with TotalsEngine's rounding in integer cents,
+    # so the per-rate figures add up to the stored invoice totals.
+    # `filters` are those of InvoiceStore.search().
+    INHERIT = -1
+
+    def __init__(self, store, **filters):
+        np = self.np = load_numpy()
+        where, params = store.filter_clause(**filters)
+        cursor = store.conn.cursor()
+        cursor.row_factory = None
+        rows = cursor.execute(
+            f"SELECT id, COALESCE(customer_key, ''), COALESCE(customer_name, ''), invoice_date, due_date, "
+            f"tax_rate, discount, subtotal_cents, discount_cents, tax_cents, total_cents "
+            f"FROM invoices {where} ORDER BY id", params).fetchall()
+        columns = list(zip(*rows)) or [()] * 11
+        del rows
+        self.ids = np.array(columns[0], dtype=np.int64)
+        self.customer_key = np.array(columns[1], dtype=str)
+        self.customer_name = columns[2]
+        self.invoice_date = iso_dates(np, columns[3])
+        self.due_date = iso_dates(np, columns[4])
+        self.subtotal, self.discount, self.tax, self.total = (
+            np.array(column, dtype=np.int64) for column in columns[7:11])
+
+        item_where = f"WHERE invoice_id IN (SELECT id FROM invoices {where})" if where else ""
+        groups = cursor.execute(
+            f"SELECT invoice_id, COALESCE(tax_rate, '*'), COALESCE(discount, '*'), "
+            f"SUM(amount_cents), COUNT(*) FROM items {item_where} "
+            f"GROUP BY invoice_id, tax_rate, discount", params).fetchall()
+        group_columns = list(zip(*groups)) or [()] * 5
+        del groups
+
+        # Every distinct rate text is parsed once; equal rates ("5", "5.0")
+        # share a code, as they share a group in TotalsEngine
+        self.rates = []
+        rate_codes = {}
+
+        def encode(texts, inherit=False):
+            unique, inverse = np.unique(np.array(texts, dtype=str), return_inverse=True)
+            codes = []
+            for text in unique:
+                if inherit and text == '*':
+                    codes.append(self.INHERIT)
+                    continue
+                rate = to_decimal(text, "rate").normalize()
+                if rate not in rate_codes:
+                    rate_codes[rate] = len(self.rates)
+                    self.rates.append(rate)
+                codes.append(rate_codes[rate])
+            return np.array(codes, dtype=np.int64)[inverse] if len(unique) else np.zeros(0, np.int64)
+
+        invoice_tax, invoice_discount = encode(columns[5]), encode(columns[6])
+        line_tax, line_discount = encode(group_columns[1], True), encode(group_columns[2], True)
+        invoice = np.searchsorted(self.ids, np.array(group_columns[0], dtype=np.int64))
+        amount = np.array(group_columns[3], dtype=np.int64)
+        count = np.array(group_columns[4], dtype=np.int64)
+
+        # Merge groups whose rate texts differ but whose rates are equal
+        width = len(self.rates) + 1
+        key = (invoice * width + line_tax + 1) * width + line_discount + 1
+        key, first, merged = np.unique(key, return_index=True, return_inverse=True)
+        self.group_invoice = invoice[first]
+        self.group_items = group_sums(np, merged, len(key), count)
+        amount = group_sums(np, merged, len(key), amount)
+        line_tax, line_discount = line_tax[first], line_discount[first]
+        tax_code = np.where(line_tax == self.INHERIT, invoice_tax[self.group_invoice], line_tax)
+        discount_code = np.where(line_discount == self.INHERIT, invoice_discount[self.group_invoice], line_discount)
+
+        # Rates as integers scaled to the most decimal places any rate has;
+        # Python ints take over if the products could overflow int64
+        places = max([0] + [-rate.as_tuple().exponent for rate in self.rates])
+        scaled = np.array([int(rate.scaleb(places)) for rate in self.rates] or [0], dtype=np.int64)
+        denominator = 100 * 10 ** places
+        if len(amount) and int(np.abs(amount).max()) * int(np.abs(scaled).max()) * 2 + denominator >= 2 ** 63:
+            amount, scaled = amount.astype(object), scaled.astype(object)
+        self.group_tax_code = tax_code
+        self.group_amount = amount
+        self.group_discount = round_half_up_div(np, amount * scaled[discount_code], denominator)
+        self.group_tax = round_half_up_div(np, (amount - self.group_discount) * scaled[tax_code], denominator)
+
+    def __len__(self):
+        return len(self.ids)
+
+
+# Longest customer name printed in a PDF report's first column
+REPORT_LABEL_CHARS = 34
+
+
+class Report:
+    # One table of a report. Cells are text or integers; integers in
+    # money_columns are cents. The total row sums every integer column.
+    def __init__(self, title, headings, rows, money_columns=(), note=""):
+        self.title = title
+        self.headings = headings
+        self.rows = rows
+        self.money_columns = set(money_columns)
+        self.note = note
+
+    def total_row(self):
+        total = ["Total"] + [""] * (len(self.headings) - 1)
+        for column in range(1, len(self.headings)):
+            if self.rows and all(isinstance(row[column], int) for row in self.rows):
+                total[column] = sum(row[column] for row in self.rows)
+        return total
+
+    def cells(self, row, money=None):
+        # Text cells; money columns through `money`, plain decimal by default
+        return [(money or cents_text)(cell) if column in self.money_columns and isinstance(cell, int)
+                else str(cell) for column, cell in enumerate(row)]
+
+
+def cents_text(cents):
+    sign = '-' if cents < 0 else ''
+    return f"{sign}{abs(cents) // 100}.{abs(cents) % 100:02d}"
+
+
+def customer_report(data, as_of=None):
+    np = data.np
+    keys, first, codes = np.unique(data.customer_key, return_index=True, return_inverse=True)
+    counts = np.bincount(codes, minlength=len(keys))
+    sums = [group_sums(np, codes, len(keys), column)
+            for column in (data.subtotal, data.discount, data.tax, data.total)]
+    rows = [[data.customer_name[first[i]] or "(no customer)", int(counts[i])] + [int(s[i]) for s in sums]
+            for i in np.argsort(-sums[3], kind='stable')]
+    return Report("Revenue by customer", ["Customer", "Invoices", "Subtotal", "Discount", "Tax", "Total"],
+                  rows, money_columns=range(2, 6))
+
+
+def month_report(data, as_of=None):
+    np = data.np
+    months, codes = np.unique(data.invoice_date.astype('datetime64[M]'), return_inverse=True)
+    counts = np.bincount(codes, minlength=len(months))
+    sums = [group_sums(np, codes, len(months), column)
+            for column in (data.subtotal, data.discount, data.tax, data.total)]
+    rows = [[str(month) if not np.isnat(month) else "No date", int(counts[i])] + [int(s[i]) for s in sums]
+            for i, month in enumerate(months)]
+    return Report("Revenue by month", ["Month", "Invoices", "Subtotal", "Discount", "Tax", "Total"],
+                  rows, money_columns=range(2, 6))
+
+
+def tax_rate_report(data, as_of=None):
+    np = data.np
+    size = len(data.rates)
+    items = group_sums(np, data.group_tax_code, size, data.group_items)
+    sums = [group_sums(np, data.group_tax_code, size, column)
+            for column in (data.group_amount, data.group_discount, data.group_amount - data.group_discount,
+                           data.group_tax)]
+    rows = [[f"{data.rates[code]:f}%", int(items[code])] + [int(s[code]) for s in sums]
+            for code in sorted(np.unique(data.group_tax_code), key=lambda code: data.rates[code])]
+    return Report("Tax by rate", ["Tax rate", "Items", "Amount", "Discount", "Taxable", "Tax"],
+                  rows, money_columns=range(2, 6))
+
+
+# Aging buckets by days past due: up to 0 (not yet due), 1-30, 31-60,
+# 61-90 and over 90, then invoices without a usable due date
+AGING_LIMITS = (0, 30, 60, 90)
+AGING_HEADINGS = ("Current", "1-30 days", "31-60 days", "61-90 days", "Over 90 days", "No due date")
+
+
+def aging_report(data, as_of=None):
+    np = data.np
+    as_of = np.datetime64(as_of or datetime.now().strftime('%Y-%m-%d'), 'D')
+    overdue = (as_of - data.due_date).astype(np.int64)
+    bucket = np.where(np.isnat(data.due_date), len(AGING_LIMITS) + 1,
+                      np.searchsorted(np.array(AGING_LIMITS), overdue, side='left'))
+    keys, first, codes = np.unique(data.customer_key, return_index=True, return_inverse=True)
+    width = len(AGING_HEADINGS)
+    buckets = group_sums(np, codes * width + bucket, len(keys) * width, data.total).reshape(len(keys), width)
+    balance = buckets.sum(axis=1)
+    rows = [[data.customer_name[first[i]] or "(no customer)"] + [int(v) for v in buckets[i]] + [int(balance[i])]
+            for i in np.argsort(-balance, kind='stable')]
+    return Report(f"Receivables aging as of {as_of}", ["Customer", *AGING_HEADINGS, "Balance"], rows,
+                  money_columns=range(1, width + 2),
+                  note="The store does not record payments, so every invoice counts as open.")
+
+
+REPORTS = {
+    'customer': customer_report,
+    'month': month_report,
+    'tax': tax_rate_report,
+    'aging': aging_report,
+}
+
+
+def build_reports(data, kinds=tuple(REPORTS), as_of=None):
+    return [REPORTS[kind](data, as_of) for kind in kinds]
+
+
+def format_report_text(report):
+    rows = [report.headings] + [report.cells(row) for row in report.rows] + [report.cells(report.total_row())]
+    widths = [max(len(row[column]) for row in rows) for column in range(len(report.headings))]
+    lines = [report.title]
+    if report.note:
+        lines.append(report.note)
+    for index, row in enumerate(rows):
+        if index in (1, len(rows) - 1):
+            lines.append('  '.join('-' * width for width in widths))
+        lines.append('  '.join(cell.ljust(width) if column == 0 else cell.rjust(width)
+                               for column, (cell, width) in enumerate(zip(row, widths))).rstrip())
+    return '\n'.join(lines) + '\n'
+
+
+def write_reports_csv(reports, filename):
+    # Each report as a block: title, note, header, rows, total, blank line
+    with open(filename, 'w', encoding='utf-8', newline='') as file:
+        writer = csv.writer(file)
+        for report in reports:
+            writer.writerow([report.title])
+            if report.note:
+                writer.writerow([report.note])
+            writer.writerow(report.headings)
+            writer.writerows(report.cells(row) for row in report.rows)
+            writer.writerow(report.cells(report.total_row()))
+            writer.writerow([])
+
+
+def render_pdf_report(reports, filename, template=None, title="Invoice Report", subtitle=""):
+    # The report tables on letter pages with half-inch margins, in the
+    # template's colours and currency. filename may also be a binary stream.
+    load_modules(*PDF_MODULES)
+    if not isinstance(template, PdfTemplate):
+        template = load_pdf_template(template)
+    doc = platypus.SimpleDocTemplate(filename, pagesize=letter, rightMargin=36, leftMargin=36,
+                                     topMargin=54, bottomMargin=36, title=title)
+    # Headings and notes stay on the page their table starts on
+    heading_style = styles.ParagraphStyle('ReportHeading', parent=styles.getSampleStyleSheet()['Heading2'],
+                                          keepWithNext=1)
+    note_style = styles.ParagraphStyle('ReportNote', parent=template.party_style, keepWithNext=1, spaceAfter=6)
+
+    def money(cents):
+        return template.money(from_cents(cents))
+
+    elements = [platypus.Paragraph(xml_escape(title), template.title_style)]
+    if subtitle:
+        elements.append(platypus.Paragraph(xml_escape(subtitle), template.footer_style))
+    for report in reports:
+        elements.append(platypus.Spacer(1, 12))
+        elements.append(platypus.Paragraph(xml_escape(report.title), heading_style))
+        if report.note:
+            elements.append(platypus.Paragraph(xml_escape(report.note), note_style))
+        rows = [report.headings] + [report.cells(row, money) for row in report.rows]
+        rows.append(report.cells(report.total_row(), money))
+        for row in rows:
+            if len(row[0]) > REPORT_LABEL_CHARS:
+                row[0] = row[0][:REPORT_LABEL_CHARS - 3] + "..."
+        label_width = 1.75 * inch
+        widths = [label_width] + [(doc.width - label_width) / (len(report.headings) - 1)] * (len(report.headings) - 1)
+        # Fixed row heights: otherwise every page split measures all the
+        # remaining rows again, which is quadratic on long tables
+        table = platypus.Table(rows, colWidths=widths, rowHeights=14, repeatRows=1)
+        table.setStyle(platypus.TableStyle([
+            ('ALIGN', (0, 0), (0, -1), 'LEFT'),
+            ('ALIGN', (1, 0), (-1, -1), 'RIGHT'),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTNAME', (0, 1), (-1, -2), 'Helvetica'),
+            ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, -1), 8),
+            ('GRID', (0, 0), (-1, -1), 0.5, template.grid_color),
+            ('BACKGROUND', (0, 0), (-1, 0), template.header_background),
+            ('BACKGROUND', (0, -1), (-1, -1), template.total_background),
+        ]))
+        elements.append(table)
+    with load_pdf_profile().encoding():
+        doc.build(elements)
+
+
+class Exporter:
+    # A named export backend. `loader` is called the first time the exporter
+    # is used; it imports whatever the backend needs and returns
+    # render(invoice, filename) -> list of paths written. With streams=True
+    # render also accepts a binary stream in place of filename. `version`,
+    # if set, returns a string naming the current template/layout; only
+    # exporters with one are cached by RenderCache.
+    def __init__(self, name, loader, description="", version=None, streams=False):
+        self.name = name
+        self.loader = loader
+        self.description = description
+        self.version = version
+        self.streams = streams
+        self._render = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self):
+        return self._render is not None
+
+    def load(self):
+        with self._lock:
+            if self._render is None:
+                self._render = self.loader()
+        return self._render
+
+    def render(self, invoice, filename):
+        return self.load()(invoice, filename)
+
+
+EXPORTERS = OrderedDict()
+_exporters_discovered = False
+
+
+def _import_object(target):
+    # "package.module:function" -> the function
+    module_name, _, attr = target.partition(':')
+    obj = importlib.import_module(module_name)
+    for part in filter(None, attr.split('.')):
+        obj = getattr(obj, part)
+    return obj
+
+
+def register_exporter(name, loader, description="", version=None, streams=False):
+    # loader is a zero-argument callable returning the render function, or a
+    # "module:function" string naming the render function itself. Either way
+    # nothing is imported until the exporter is first used.
+    if isinstance(loader, str):
+        loader = functools.partial(_import_object, loader)
+    EXPORTERS[name] = Exporter(name, loader, description, version, streams)
+    return EXPORTERS[name]
+
+
+def discover_exporters():
+    # Third-party exporters come from INVOICE_EXPORTERS ("name=module:function",
+    # comma-separated; inherited by worker processes) and from the
+    # "invoice_generator.exporters" entry point group. Built-in names win.
+    global _exporters_discovered
+    if _exporters_discovered:
+        return
+    _exporters_discovered = True
+    for spec in filter(None, (s.strip() for s in os.environ.get('INVOICE_EXPORTERS', '').split(','))):
+        name, _, target = spec.partition('=')
+        if name.strip() not in EXPORTERS and target:
+            register_exporter(name.strip(), target.strip())
+
+    from importlib.metadata import entry_points
+    try:
+        points = entry_points(group='invoice_generator.exporters')
+    except TypeError:
+        # Before Python 3.10 entry_points() takes no group and returns a dict
+        points = entry_points().get('invoice_generator.exporters', ())
+    for entry_point in points:
+        if entry_point.name not in EXPORTERS:
+            register_exporter(entry_point.name, entry_point.load)
+
+
+def get_exporter(name):
+    if name not in EXPORTERS:
+        discover_exporters()
+    try:
+        return EXPORTERS[name]
+    except KeyError:
+        raise ValueError(f"Unknown export format: {name}") from None
+
+
+def export_formats():
+    discover_exporters()
+    return tuple(EXPORTERS)
+
+
+def _is_path(output):
+    return isinstance(output, (str, os.PathLike))
+
+
+def _pdf_exporter():
+    load_modules(*PDF_MODULES)
+
+    def render(invoice, output):
+        render_pdf_invoice(invoice, output)
+        return [output] if _is_path(output) else []
+    return render
+
+
+def _image_exporter(image_format):
+    load_modules(*IMAGE_MODULES)
+
+    def render(invoice, output):
+        if _is_path(output):
+            return render_image_invoice(invoice, output)
+        write_image_invoice(invoice, output, image_format)
+        return []
+    return render
+
+
+def _text_exporter():
+    def render(invoice, output):
+        write_invoice_text(invoice, output)
+        return [output] if _is_path(output) else []
+    return render
+
+
+# Bump when a change to the renderers alters their output, so exports
+# cached by older code are not reused
+RENDER_VERSION = 1
+
+
+def _pdf_version():
+    return f"{RENDER_VERSION}/{pdf_template_version()}/{pdf_profile_name()}"
+
+
+def _image_version():
+    return f"{RENDER_VERSION}/{IMAGE_PAGE_SIZE}/{image_profile_name()}/{image_scale():g}/" + ','.join(
+        str(FONTS.resolve(family)) for family in sorted(FONT_FAMILIES))
+
+
+# Text exports are not cached: they are cheap and carry a "Generated on" time
+register_exporter('pdf', _pdf_exporter, "PDF document (ReportLab)", _pdf_version, streams=True)
+register_exporter('jpg', functools.partial(_image_exporter, 'JPEG'), "JPEG image pages (Pillow)",
+                  _image_version, streams=True)
+register_exporter('png', functools.partial(_image_exporter, 'PNG'), "PNG image pages (Pillow)",
+                  _image_version, streams=True)
+register_exporter('tiff', functools.partial(_image_exporter, 'TIFF'), "Multi-page TIFF (Pillow)",
+                  _image_version, streams=True)
+register_exporter('webp', functools.partial(_image_exporter, 'WEBP'), "WebP image pages (Pillow)",
+                  _image_version, streams=True)
+register_exporter('txt', _text_exporter, "Plain text", streams=True)
+
+
+def invoice_digest(invoice):
+    # Canonical hash of everything an export shows: the fields, every item
+    # (hashed one at a time, not serialised as a whole) and the logo's
+    # content. Totals follow from the items and rates.
+    digest = hashlib.sha256()
+    digest.update(json.dumps([invoice.get(field, '') for field in INVOICE_FIELDS]).encode('utf-8'))
+    for item in invoice['items']:
+        digest.update('\x1f'.join([item['description'], str(item['quantity']), str(item['rate']),
+                                    str(item['amount']), str(item.get('tax_rate')),
+                                    str(item.get('discount'))]).encode('utf-8'))
+        digest.update(b'\x1e')
+    logo_path = invoice.get('logo_path')
+    if logo_path:
+        try:
+            stat = os.stat(logo_path)
+            digest.update(file_digest(os.path.abspath(logo_path), stat.st_mtime_ns, stat.st_size).encode())
+        except OSError:
+            digest.update(b'missing logo')
+    return digest.hexdigest()
+
+
+class RenderCache:
+    # Finished exports on disk, keyed by a hash of the invoice, the
+    # exporter's template version and the format. An entry is one file: a
+    # JSON header line listing the outputs (as page suffixes such as "" or
+    # "-001", put between the requested file's stem and extension) and
+    # their sizes, then their bytes. Entries are written aside and renamed
+    # into place, so processes can share the directory. A hit refreshes
+    # the entry's mtime. Past max_bytes the least recently used entries are
+    # deleted down to low_water of it, so the directory is walked once per
+    # many stores rather than on each one.
+    def __init__(self, path, max_bytes=256 * 1024 * 1024, low_water=0.9):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.low_water = low_water
+        os.makedirs(path, exist_ok=True)
+        self.total_bytes = sum(size for _, size, _ in self._entries())
+
+    def key(self, invoice, fmt, version):
+        return hashlib.sha256(f"{fmt}\0{version}\0{invoice_digest(invoice)}".encode()).hexdigest()
+
+    def _entry_path(self, key):
+        return os.path.join(self.path, key[:2], key)
+
+    def _entries(self):
+        # (mtime, size, path) of every complete entry
+        entries = []
+        for dirpath, _, filenames in os.walk(self.path):
+            for name in filenames:
+                if name.endswith('.tmp'):
+                    continue
+                path = os.path.join(dirpath, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def fetch(self, key, filename):
+        # Writes the cached outputs next to filename; returns their paths, or
+        # None on a miss
+        entry_path = self._entry_path(key)
+        try:
+            entry = open(entry_path, 'rb')
+        except FileNotFoundError:
+            return None
+        stem, ext = os.path.splitext(filename)
+        paths = []
+        try:
+            with entry:
+                for suffix, size in json.loads(entry.readline())['pages']:
+                    path = stem + suffix + ext
+                    with open(path, 'wb') as output:
+                        remaining = size
+                        while remaining:
+                            block = entry.read(min(remaining, 1024 * 1024))
+                            if not block:
+                                raise ValueError("truncated cache entry")
+                            output.write(block)
+                            remaining -= len(block)
+                    paths.append(path)
+        except (ValueError, KeyError):
+            # Damaged entry: drop it and render again
+            self._remove(entry_path)
+            return None
+        os.utime(entry_path)
+        return paths
+
+    def store(self, key, filename, paths):
+        stem, ext = os.path.splitext(filename)
+        if not all(path.startswith(stem) and path.endswith(ext) for path in paths):
+            return False
+        entry_path = self._entry_path(key)
+        os.makedirs(os.path.dirname(entry_path), exist_ok=True)
+        tmp_path = f"{entry_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            pages = [[path[len(stem):len(path) - len(ext)], os.path.getsize(path)] for path in paths]
+            with open(tmp_path, 'wb') as entry:
+                entry.write(json.dumps({'pages': pages}).encode('utf-8') + b'\n')
+                for path in paths:
+                    with open(path, 'rb') as output:
+                        shutil.copyfileobj(output, entry, 1024 * 1024)
+            self.total_bytes += os.path.getsize(tmp_path)
+            os.replace(tmp_path, entry_path)
+        except OSError:
+            self._remove(tmp_path)
+            return False
+        if self.total_bytes > self.max_bytes:
+            self.evict()
+        return True
+
+    def evict(self):
+        # Recounted from disk, since other processes write here too
+        entries = sorted(self._entries())
+        self.total_bytes = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if self.total_bytes <= self.max_bytes * self.low_water:
+                break
+            self._remove(path)
+            self.total_bytes -= size
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def clear(self):
+        for _, _, path in self._entries():
+            self._remove(path)
+        self.total_bytes = 0
+
+
+DEFAULT_RENDER_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.invoice_generator', 'render-cache')
+_render_cache = None
+
+
+def get_render_cache():
+    # Off unless INVOICE_RENDER_CACHE names a directory (batch --cache sets it
+    # to DEFAULT_RENDER_CACHE_DIR); INVOICE_RENDER_CACHE_MB bounds its size.
+    # Worker processes inherit both.
+    global _render_cache
+    path = os.environ.get('INVOICE_RENDER_CACHE', '')
+    if not path:
+        return None
+    if _render_cache is None or _render_cache.path != path:
+        max_bytes = int(os.environ.get('INVOICE_RENDER_CACHE_MB', 256)) * 1024 * 1024
+        _render_cache = RenderCache(path, max_bytes)
+    return _render_cache
+
+
+def export_format_for(filename, default='pdf'):
+    ext = os.path.splitext(filename)[1].lower().lstrip('.')
+    ext = {'jpeg': 'jpg', 'tif': 'tiff'}.get(ext, ext)
+    return ext if ext in export_formats() else default
+
+
+def export_to_stream(invoice, fmt, stream):
+    # Writes one format of an invoice to a binary stream (BytesIO, a
+    # socket's makefile('wb'), a zip entry, ...) without touching the disk
+    exporter = get_exporter(fmt)
+    if not exporter.streams:
+        raise ValueError(f"The {fmt} exporter can only write files")
+    exporter.render(invoice, stream)
+    return stream
+
+
+def export_bytes(invoice, fmt):
+    return export_to_stream(invoice, fmt, io.BytesIO()).getvalue()
+
+
+def render_export(invoice, fmt, filename):
+    # Renders one format of an invoice snapshot; returns the paths written.
+    # Unchanged invoices are copied out of the render cache instead.
+    exporter = get_exporter(fmt)
+    cache = get_render_cache() if exporter.version is not None else None
+    if cache is None:
+        return exporter.render(invoice, filename)
+
+    key = cache.key(invoice, fmt, exporter.version())
+    paths = cache.fetch(key, filename)
+    if paths is None:
+        paths = exporter.render(invoice, filename)
+        cache.store(key, filename, paths)
+    return paths
+
+
+def _render_export_job(invoice, fmt, filename, timed=False):
+    # Runs inside an export worker; stage timings travel back to the
+    # parent's sinks along with the paths
+    if not timed:
+        return render_export(invoice, fmt, filename), []
+    with TIMINGS.collect() as records:
+        paths = render_export(invoice, fmt, filename)
+    return paths, records
+
+
+class ExportJob:
+    def __init__(self, job_id, fmt, filename, scratch, future):
+        self.job_id = job_id
+        self.fmt = fmt
+        self.filename = filename
+        self.scratch = scratch
+        self.future = future
+        self.status = 'Queued'
+        self.outputs = []
+        self.error = None
+        self.cancel_requested = False
+        self.submitted = time.perf_counter()
+        self.elapsed = None
+
+    @property
+    def finished(self):
+        return self.status in ('Done', 'Failed', 'Cancelled')
+
+
+EXPORT_SCRATCH_PREFIX = '.exporting-'
+
+
+class ExportQueue:
+    # Renders invoice snapshots on a pool of worker processes so the Tk
+    # thread never blocks on doc.build or img.save. Callers poll() from the
+    # event loop to pick up status changes; progress is reported per job
+    # (Queued, Rendering, then Done/Failed/Cancelled), not within a render.
+    #
+    # Each job renders into a scratch directory next to its target and its
+    # files are moved into place only once it is done and still wanted, so
+    # a cancelled or failed export never leaves a file behind or replaces
+    # one that was already there.
+    def __init__(self, max_workers=3):
+        self.max_workers = max_workers
+        self.jobs = OrderedDict()
+        self._executor = None
+        self._next_id = 1
+
+    def submit(self, invoice, fmt, filename):
+        if self._executor is None:
+            # spawn rather than fork: the parent process owns a Tk interpreter
+            self._executor = concurrent.futures.ProcessPoolExecutor(
+                max_workers=self.max_workers, mp_context=multiprocessing.get_context('spawn'))
+        filename = os.path.abspath(filename)
+        scratch = tempfile.mkdtemp(prefix=EXPORT_SCRATCH_PREFIX, dir=os.path.dirname(filename))
+        future = self._executor.submit(_render_export_job, invoice, fmt,
+                                       os.path.join(scratch, os.path.basename(filename)), TIMINGS.enabled)
+        job = ExportJob(self._next_id, fmt, filename, scratch, future)
+        self._next_id += 1
+        self.jobs[job.job_id] = job
+        return job
+
+    def cancel(self, job_id):
+        # Queued jobs never start; a job that is already rendering finishes in
+        # its worker and what it wrote is discarded when it comes back
+        job = self.jobs[job_id]
+        if job.finished:
+            return False
+        job.cancel_requested = True
+        if job.future.cancel():
+            shutil.rmtree(job.scratch, ignore_errors=True)
+            job.status = 'Cancelled'
+        else:
+            job.status = 'Cancelling'
+        return True
+
+    @property
+    def active(self):
+        return any(not job.finished for job in self.jobs.values())
+
+    def poll(self):
+        # Returns the jobs whose status changed since the last poll
+        changed = []
+        for job in self.jobs.values():
+            if job.finished:
+                continue
+            status = job.status
+            if job.future.done():
+                job.elapsed = time.perf_counter() - job.submitted
+                error = job.future.exception()
+                if job.cancel_requested:
+                    job.status = 'Cancelled'
+                elif error is not None:
+                    job.error = error
+                    job.status = 'Failed'
+                else:
+                    paths, records = job.future.result()
+                    try:
+                        job.outputs = self._move_into_place(job, paths)
+                    except OSError as e:
+                        job.error = e
+                        job.status = 'Failed'
+                    else:
+                        for record in records:
+                            TIMINGS.emit(record)
+                        job.status = 'Done'
+                shutil.rmtree(job.scratch, ignore_errors=True)
+            elif job.future.running() and status == 'Queued':
+                job.status = 'Rendering'
+            if job.status != status:
+                changed.append(job)
+        return changed
+
+    @staticmethod
+    def _move_into_place(job, paths):
+        # First page of a series last, as the batch renderer does
+        target = os.path.dirname(job.filename)
+        finals = [os.path.join(target, os.path.basename(path)) for path in paths]
+        for path, final in reversed(list(zip(paths, finals))):
+            os.replace(path, final)
+        return finals
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        for job in self.jobs.values():
+            if not job.finished:
+                shutil.rmtree(job.scratch, ignore_errors=True)
+
+
+class VirtualItemTable:
+    # Items view that only materialises the rows currently on screen. The
+    # Treeview never holds more than `height` rows; scrolling refills them
+    # from the ItemStore, and selections are tracked by stable item id.
+    def __init__(self, parent, store, height=8):
+        self.store = store
+        self.height = height
+        self.first = 0
+        self.row_items = {}
+
+        self.frame = ttk.Frame(parent)
+        self.tree = ttk.Treeview(self.frame, columns=('Description', 'Quantity', 'Rate', 'Amount'),
+                                 show='headings', height=height, selectmode='browse')
+        self.tree.heading('Description', text='Description')
+        self.tree.heading('Quantity', text='Quantity')
+        self.tree.heading('Rate', text='Rate')
+        self.tree.heading('Amount', text='Amount')
+
+        self.tree.column('Description', width=300)
+        self.tree.column('Quantity', width=100)
+        self.tree.column('Rate', width=100)
+        self.tree.column('Amount', width=100)
+
+        self.scrollbar = ttk.Scrollbar(self.frame, orient="vertical", command=self.on_scroll)
+        self.tree.pack(side='left', fill='x', expand=True)
+        self.scrollbar.pack(side='right', fill='y')
+
+        self.tree.bind('<MouseWheel>', self.on_mousewheel)
+        self.tree.bind('<Button-4>', lambda e: self.scroll_to(self.first - 3))
+        self.tree.bind('<Button-5>', lambda e: self.scroll_to(self.first + 3))
+
+    def pack(self, **kwargs):
+        self.frame.pack(**kwargs)
+
+    def selected_item_id(self):
+        selected = self.tree.selection()
+        return self.row_items.get(selected[0]) if selected else None
+
+    def on_scroll(self, action, value, unit=None):
+        if action == 'moveto':
+            self.scroll_to(int(float(value) * len(self.store)))
+        elif unit == 'pages':
+            self.scroll_to(self.first + int(value) * self.height)
+        else:
+            self.scroll_to(self.first + int(value))
+
+    def on_mousewheel(self, event):
+        self.scroll_to(self.first - 3 * (1 if event.delta > 0 else -1))
+        return 'break'
+
+    def scroll_to(self, first):
+        self.first = max(0, min(first, len(self.store) - self.height))
+        self.refresh()
+
+    def scroll_to_end(self):
+        self.scroll_to(len(self.store))
+
+    def refresh(self):
+        # Re-materialise the visible window, keeping the selection if it is
+        # still on screen
+        count = len(self.store)
+        self.first = max(0, min(self.first, count - self.height))
+        selected_id = self.selected_item_id()
+
+        self.tree.delete(*self.tree.get_children())
+        self.row_items = {}
+        for item_id, item in self.store.window(self.first, self.height):
+            row = self.tree.insert('', 'end', values=(item['description'], item['quantity'],
+                                                      f"₨{item['rate']:.2f}", f"₨{item['amount']:.2f}"))
+            self.row_items[row] = item_id
+            if item_id == selected_id:
+                self.tree.selection_set(row)
+
+        if count > self.height:
+            self.scrollbar.set(self.first / count, (self.first + self.height) / count)
+        else:
+            self.scrollbar.set(0, 1)
+
+
+class OpenInvoiceDialog:
+    # Searches the invoice store a page at a time and hands the chosen
+    # invoice back through on_open(invoice)
+    page_size = 100
+
+    def __init__(self, root, store, on_open):
+        self.store = store
+        self.on_open = on_open
+        self.last_id = None
+
+        self.window = tk.Toplevel(root)
+        self.window.title("Open Invoice")
+        self.window.geometry("760x420")
+
+        search_frame = ttk.Frame(self.window, padding=10)
+        search_frame.pack(fill='x')
+        ttk.Label(search_frame, text="Invoice Number:").grid(row=0, column=0, sticky='w')
+        self.number = ttk.Entry(search_frame, width=18)
+        self.number.grid(row=0, column=1, padx=5)
+        ttk.Label(search_frame, text="Customer:").grid(row=0, column=2, sticky='w')
+        self.customer = ttk.Entry(search_frame, width=18)
+        self.customer.grid(row=0, column=3, padx=5)
+        ttk.Label(search_frame, text="Date From:").grid(row=1, column=0, sticky='w')
+        self.date_from = ttk.Entry(search_frame, width=18)
+        self.date_from.grid(row=1, column=1, padx=5, pady=2)
+        ttk.Label(search_frame, text="Date To:").grid(row=1, column=2, sticky='w')
+        self.date_to = ttk.Entry(search_frame, width=18)
+        self.date_to.grid(row=1, column=3, padx=5, pady=2)
+        ttk.Button(search_frame, text="Search", command=self.search,
+                  style='Custom.TButton').grid(row=0, column=4, rowspan=2, padx=10)
+
+        self.results = ttk.Treeview(self.window, columns=('Number', 'Customer', 'Date', 'Due', 'Total'),
+                                    show='headings', height=12)
+        for column, width in (('Number', 160), ('Customer', 220), ('Date', 100), ('Due', 100), ('Total', 100)):
+            self.results.heading(column, text=column)
+            self.results.column(column, width=width)
+        self.results.pack(fill='both', expand=True, padx=10)
+        self.results.bind('<Double-1>', lambda e: self.open_selected())
+
+        button_frame = ttk.Frame(self.window, padding=10)
+        button_frame.pack(fill='x')
+        self.more_button = ttk.Button(button_frame, text="Next Page", command=self.next_page,
+                                      style='Custom.TButton')
+        self.more_button.pack(side='left')
+        ttk.Button(button_frame, text="Open", command=self.open_selected,
+                  style='Custom.TButton').pack(side='right')
+        self.status = ttk.Label(button_frame, text="")
+        self.status.pack(side='left', padx=10)
+
+        for entry in (self.number, self.customer, self.date_from, self.date_to):
+            entry.bind('<Return>', lambda e: self.search())
+        self.search()
+
+    def search(self):
+        self.last_id = None
+        self.results.delete(*self.results.get_children())
+        self.next_page()
+
+    def next_page(self):
+        rows = self.store.search(invoice_number=self.number.get().strip(),
+                                 customer=self.customer.get().strip(),
+                                 date_from=self.date_from.get().strip(),
+                                 date_to=self.date_to.get().strip(),
+                                 before_id=self.last_id, limit=self.page_size)
+        for row in rows:
+            self.results.insert('', 'end', iid=str(row['id']),
+                                values=(row['invoice_number'], row['customer_name'], row['invoice_date'],
+                                        row['due_date'], f"₨{row['total']:.2f}"))
+        if rows:
+            self.last_id = rows[-1]['id']
+        self.more_button.config(state='normal' if len(rows) == self.page_size else 'disabled')
+        self.status.config(text=f"{len(self.results.get_children())} shown")
+
+    def open_selected(self):
+        selected = self.results.selection()
+        if not selected:
+            messagebox.showwarning("Warning", "Please select an invoice to open", parent=self.window)
+            return
+        self.on_open(self.store.load(invoice_id=int(selected[0])))
+        self.window.destroy()
+
+
+# The live preview waits this long after the last edit before updating;
+# more queued item changes than PREVIEW_MAX_CHANGES are replayed as a rebuild
+PREVIEW_DEBOUNCE_MS = 300
+PREVIEW_MAX_CHANGES = 5000
+
 
 class InvoiceGenerator:
     def __init__(self, root):
@@ -26,9 +3226,29 @@ class InvoiceGenerator:
         style.configure('Custom.TButton', font=('Arial', 10, 'bold'))
         
         # Variables
-        self.items = []
+        self.items = ItemStore()
+        self.totals_engine = TotalsEngine()
         self.logo_path = None  # Store logo path
+        self.export_queue = ExportQueue()
+        self.store = None
+        self.number_allocator = None
+        self.export_polling = False
+        # Live preview state: what the preview text currently shows, and the
+        # item changes it has not caught up with yet
+        self.preview_after = None
+        self.preview_header = None
+        self.preview_footer_key = None
+        self.preview_lines = (0, 0)
+        self.preview_changes = [('reset',)]
+        self.thumbnail_executor = ThreadPoolExecutor(max_workers=1)
+        self.thumbnail_future = None
+        self.thumbnail_polling = False
+        self.thumbnail_image = None
         self.setup_ui()
+        for field in INVOICE_FIELDS:
+            getattr(self, field).bind('<KeyRelease>', self.schedule_preview, add='+')
+        self.schedule_preview()
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
         
     def setup_ui(self):
         # Main container
@@ -130,7 +3350,7 @@ class InvoiceGenerator:
         ttk.Label(invoice_frame, text="Invoice Number:").grid(row=0, column=0, sticky='w', pady=2)
         self.invoice_number = ttk.Entry(invoice_frame, width=20)
         self.invoice_number.grid(row=0, column=1, padx=10, pady=2)
-        self.invoice_number.insert(0, f"INV-{datetime.now().strftime('%Y%m%d%H%M')}")
+        self.invoice_number.insert(0, self.next_invoice_number())
         
         ttk.Label(invoice_frame, text="Invoice Date:").grid(row=0, column=2, sticky='w', pady=2)
         self.invoice_date = ttk.Entry(invoice_frame, width=20)
@@ -169,24 +3389,23 @@ class InvoiceGenerator:
         ttk.Button(item_input_frame, text="Add Item", command=self.add_item,
                   style='Custom.TButton').grid(row=0, column=6, padx=10, pady=2)
         
-        # Items list
-        self.items_tree = ttk.Treeview(items_frame, columns=('Description', 'Quantity', 'Rate', 'Amount'), 
-                                      show='headings', height=8)
-        self.items_tree.heading('Description', text='Description')
-        self.items_tree.heading('Quantity', text='Quantity')
-        self.items_tree.heading('Rate', text='Rate')
-        self.items_tree.heading('Amount', text='Amount')
-        
-        self.items_tree.column('Description', width=300)
-        self.items_tree.column('Quantity', width=100)
-        self.items_tree.column('Rate', width=100)
-        self.items_tree.column('Amount', width=100)
-        
-        self.items_tree.pack(fill='x', pady=5)
+        # Items list, virtualised so only the visible rows exist as widgets
+        self.items_table = VirtualItemTable(items_frame, self.items, height=8)
+        self.items_tree = self.items_table.tree
+        self.items_table.pack(fill='x', pady=5)
         
-        # Remove item button
-        ttk.Button(items_frame, text="Remove Selected Item", command=self.remove_item,
-                  style='Custom.TButton').pack(pady=5)
+        # Remove item and bulk import buttons
+        item_buttons = ttk.Frame(items_frame)
+        item_buttons.pack(fill='x', pady=5)
+        ttk.Button(item_buttons, text="Remove Selected Item", command=self.remove_item,
+                  style='Custom.TButton').pack(side='left', padx=5)
+        self.import_button = ttk.Button(item_buttons, text="Import Items (CSV/JSON)",
+                                        command=self.import_items, style='Custom.TButton')
+        self.import_button.pack(side='left', padx=5)
+        self.import_progress = ttk.Progressbar(item_buttons, length=200, maximum=1.0)
+        self.import_progress.pack(side='left', padx=5)
+        self.import_status = ttk.Label(item_buttons, text="")
+        self.import_status.pack(side='left', padx=5)
         
         # Tax and Total Section
         totals_frame = ttk.LabelFrame(scrollable_frame, text="Totals", padding=15)
@@ -214,16 +3433,43 @@ class InvoiceGenerator:
                   style='Custom.TButton').pack(side='left', padx=5)
         ttk.Button(button_frame, text="Download as JPG", command=self.download_jpg,
                   style='Custom.TButton').pack(side='left', padx=5)
+        ttk.Button(button_frame, text="Export All (PDF + JPG + TXT)", command=self.export_all,
+                  style='Custom.TButton').pack(side='left', padx=5)
+        ttk.Button(button_frame, text="Save to Store", command=self.save_to_store,
+                  style='Custom.TButton').pack(side='left', padx=5)
+        ttk.Button(button_frame, text="Open Invoice", command=self.open_invoice,
+                  style='Custom.TButton').pack(side='left', padx=5)
         ttk.Button(button_frame, text="Clear All", command=self.clear_all,
                   style='Custom.TButton').pack(side='left', padx=5)
         
+        # Export queue
+        exports_frame = ttk.LabelFrame(scrollable_frame, text="Exports", padding=15)
+        exports_frame.pack(fill='x', padx=10, pady=5)
+        
+        self.exports_tree = ttk.Treeview(exports_frame, columns=('Format', 'File', 'Status'),
+                                         show='headings', height=4)
+        self.exports_tree.heading('Format', text='Format')
+        self.exports_tree.heading('File', text='File')
+        self.exports_tree.heading('Status', text='Status')
+        self.exports_tree.column('Format', width=60)
+        self.exports_tree.column('File', width=400)
+        self.exports_tree.column('Status', width=140)
+        self.exports_tree.pack(fill='x', pady=5)
+        
+        ttk.Button(exports_frame, text="Cancel Selected Export", command=self.cancel_export,
+                  style='Custom.TButton').pack(pady=5)
+        
         canvas.pack(side="left", fill="both", expand=True)
         scrollbar.pack(side="right", fill="y")
         
     def setup_preview_tab(self):
+        # Low-resolution image of the first page, rendered in the background
+        self.preview_thumbnail = ttk.Label(self.preview_frame)
+        self.preview_thumbnail.pack(side="right", anchor="n", padx=10, pady=10)
+        
         # Create scrollable text widget for preview
         self.preview_text = tk.Text(self.preview_frame, wrap=tk.WORD, width=100, height=40,
-                                   font=('Courier', 10), bg='white', fg='black')
+                                   font=('Courier', 10), bg='white', fg='black', state='disabled')
         
         preview_scrollbar = ttk.Scrollbar(self.preview_frame, orient="vertical", 
                                         command=self.preview_text.yview)
@@ -240,10 +3486,11 @@ class InvoiceGenerator:
         
         if file_path:
             try:
-                # Validate image
-                img = Image.open(file_path)
+                # Validate image (and warm the cache for the exporters)
+                LOGO_CACHE.get(file_path)
                 self.logo_path = file_path
                 self.logo_status.config(text=os.path.basename(file_path))
+                self.schedule_preview()
                 messagebox.showinfo("Success", "Logo uploaded successfully!")
             except Exception as e:
                 messagebox.showerror("Error", f"Failed to load image: {str(e)}")
@@ -260,18 +3507,11 @@ class InvoiceGenerator:
             return
             
         try:
-            qty = float(qty)
-            rate = float(rate)
-            amount = qty * rate
-            
-            self.items.append({
-                'description': desc,
-                'quantity': qty,
-                'rate': rate,
-                'amount': amount
-            })
-            
-            self.items_tree.insert('', 'end', values=(desc, qty, f"₨{rate:.2f}", f"₨{amount:.2f}"))
+            item = make_item(desc, qty, rate)
+            self.items.add(item)
+            self.totals_engine.add(item)
+            self.items_table.scroll_to_end()
+            self.preview_items_changed(('add', item))
             
             # Clear input fields
             self.item_desc.delete(0, tk.END)
@@ -281,109 +3521,267 @@ class InvoiceGenerator:
         except ValueError:
             messagebox.showerror("Error", "Quantity and Rate must be numbers")
             
+    def import_items(self):
+        file_path = filedialog.askopenfilename(
+            title="Import Invoice Items",
+            filetypes=[("CSV files", "*.csv"), ("JSON files", "*.json *.jsonl"), ("All files", "*.*")]
+        )
+        if not file_path:
+            return
+
+        # Parsing and validation run on a worker thread; the Tk thread only
+        # drains the queue from root.after and commits whole chunks
+        self.import_queue = queue.Queue()
+        self.import_counts = [0, 0]
+        self.import_errors = []
+        self.import_button.config(state='disabled')
+        self.import_progress['value'] = 0
+        self.import_status.config(text="Importing...")
+        threading.Thread(target=self._import_worker, args=(file_path, self.import_queue),
+                         daemon=True).start()
+        self.root.after(50, self._poll_import)
+
+    def _import_worker(self, file_path, results):
+        progress = lambda fraction: results.put(('progress', fraction))
+        try:
+            for items, errors in parse_item_file(file_path, progress=progress):
+                results.put(('chunk', items, errors))
+            results.put(('done',))
+        except Exception as e:
+            results.put(('failed', str(e)))
+
+    def _poll_import(self):
+        finished = None
+        added = []
+        try:
+            # Bounded per tick so a fast parser cannot starve the event loop
+            for _ in range(5):
+                message = self.import_queue.get_nowait()
+                if message[0] == 'progress':
+                    self.import_progress['value'] = min(message[1], 1.0)
+                elif message[0] == 'chunk':
+                    _, items, errors = message
+                    for item in items:
+                        self.items.add(item)
+                        self.totals_engine.add(item)
+                    added.extend(items)
+                    self.import_counts[0] += len(items)
+                    self.import_counts[1] += len(errors)
+                    self.import_errors.extend(errors[:20 - len(self.import_errors)])
+                else:
+                    finished = message
+                    break
+        except queue.Empty:
+            pass
+
+        if added:
+            # One table redraw and one preview update per tick, however many
+            # rows the chunks held
+            self.items_table.refresh()
+            self.preview_items_changed(*(('add', item) for item in added))
+        imported, failed = self.import_counts
+        self.import_status.config(text=f"Imported {imported} items ({failed} errors)")
+
+        if finished is None:
+            self.root.after(50, self._poll_import)
+            return
+
+        self.import_button.config(state='normal')
+        self.import_progress['value'] = 1.0
+        if finished[0] == 'failed':
+            messagebox.showerror("Error", f"Failed to import items: {finished[1]}")
+        elif failed:
+            details = "\n".join(f"Row {row_no}: {error}" for row_no, error in self.import_errors)
+            messagebox.showwarning("Import finished",
+                                   f"Imported {imported} items, {failed} rows skipped:\n{details}")
+        else:
+            messagebox.showinfo("Success", f"Imported {imported} items")
+
     def remove_item(self):
-        selected = self.items_tree.selection()
-        if not selected:
+        item_id = self.items_table.selected_item_id()
+        if item_id is None:
             messagebox.showwarning("Warning", "Please select an item to remove")
             return
             
-        # Get the index of selected item
-        item_index = self.items_tree.index(selected[0])
-        
-        # Remove from items list and tree
-        self.items.pop(item_index)
-        self.items_tree.delete(selected[0])
+        # Remove from the store by stable id and redraw the visible rows
+        self.preview_items_changed(('remove', self.items.index(item_id)))
+        self.totals_engine.remove(self.items.remove(item_id))
+        self.items_table.refresh()
         
+    def get_invoice_data(self):
+        # Snapshot the current widget state into a plain invoice dict
+        return {
+            'company_name': self.company_name.get(),
+            'company_address': self.company_address.get(1.0, tk.END).strip(),
+            'company_phone': self.company_phone.get(),
+            'company_email': self.company_email.get(),
+            'customer_name': self.customer_name.get(),
+            'customer_address': self.customer_address.get(1.0, tk.END).strip(),
+            'customer_phone': self.customer_phone.get(),
+            'customer_email': self.customer_email.get(),
+            'invoice_number': self.invoice_number.get(),
+            'invoice_date': self.invoice_date.get(),
+            'due_date': self.due_date.get(),
+            'payment_terms': self.payment_terms.get(),
+            'tax_rate': self.tax_rate.get(),
+            'discount': self.discount.get(),
+            'logo_path': self.logo_path,
+            'items': list(self.items)
+        }
+
     def calculate_totals(self):
-        subtotal = sum(item['amount'] for item in self.items)
-        
-        try:
-            discount_percent = float(self.discount.get() or 0)
-            tax_percent = float(self.tax_rate.get() or 0)
-        except ValueError:
-            discount_percent = 0
-            tax_percent = 0
-            
-        discount_amount = subtotal * (discount_percent / 100)
-        taxable_amount = subtotal - discount_amount
-        tax_amount = taxable_amount * (tax_percent / 100)
-        total = taxable_amount + tax_amount
-        
-        return subtotal, discount_amount, tax_amount, total
+        # O(1) in the number of items; raises ValueError for a malformed rate
+        return self.totals_engine.totals(self.tax_rate.get(), self.discount.get())
         
     def generate_invoice(self):
         if not self.items:
             messagebox.showerror("Error", "Please add at least one item")
             return
             
-        subtotal, discount_amount, tax_amount, total = self.calculate_totals()
-        
-        # Generate invoice content
-        invoice_content = self.create_invoice_template(subtotal, discount_amount, tax_amount, total)
+        try:
+            # Only validates the rates; update_preview renders the totals
+            self.calculate_totals()
+        except ValueError as e:
+            messagebox.showerror("Error", f"Tax Rate and Discount must be numbers ({e})")
+            return
         
-        # Display in preview tab
-        self.preview_text.delete(1.0, tk.END)
-        self.preview_text.insert(1.0, invoice_content)
+        # Rebuild the preview right away instead of waiting for the debounce
+        self.preview_items_changed(('reset',))
+        self.update_preview()
         
         messagebox.showinfo("Success", "Invoice generated successfully! Check the Preview tab.")
-        
-    def create_invoice_template(self, subtotal, discount_amount, tax_amount, total):
-        company_addr = self.company_address.get(1.0, tk.END).strip()
-        customer_addr = self.customer_address.get(1.0, tk.END).strip()
-        
-        logo_info = f"Logo: {os.path.basename(self.logo_path)}" if self.logo_path else "No logo"
-        
-        invoice_template = f"""
-{'='*80}
-                           INVOICE
-{'='*80}
-
-From:                                    To:
-{self.company_name.get():<35} {self.customer_name.get()}
-{company_addr.replace(chr(10), ', '):<35} {customer_addr.replace(chr(10), ', ')}
-Phone: {self.company_phone.get():<27} Phone: {self.customer_phone.get()}
-Email: {self.company_email.get():<27} Email: {self.customer_email.get()}
-{logo_info}
-
-{'-'*80}
-
-Invoice Details:
-Invoice Number: {self.invoice_number.get():<20} Invoice Date: {self.invoice_date.get()}
-Due Date: {self.due_date.get():<26} Payment Terms: {self.payment_terms.get()}
-
-{'-'*80}
-
-ITEMS:
-{'-'*80}
-{'Description':<40} {'Qty':<8} {'Rate':<12} {'Amount':<12}
-{'-'*80}
-"""
-        
-        # Add items
-        for item in self.items:
-            invoice_template += f"{item['description']:<40} {item['quantity']:<8.1f} ₨{item['rate']:<11.2f} ₨{item['amount']:<11.2f}\n"
-            
-        invoice_template += f"""
-{'-'*80}
-                                                    Subtotal: ₨{subtotal:>11.2f}
-                                                    Discount: ₨{discount_amount:>11.2f}
-                                                    Tax:      ₨{tax_amount:>11.2f}
-                                                    {'='*20}
-                                                    TOTAL:    ₨{total:>11.2f}
-{'-'*80}
+        
+    def schedule_preview(self, event=None):
+        # Debounced: every edit restarts the timer and the preview updates
+        # once typing pauses
+        if self.preview_after is not None:
+            self.root.after_cancel(self.preview_after)
+        self.preview_after = self.root.after(PREVIEW_DEBOUNCE_MS, self.update_preview)
 
-Payment Instructions:
+    def preview_items_changed(self, *changes):
+        # ('add', item), ('remove', position) or ('reset',). Changes are
+        # replayed on the preview's item lines in order; once a rebuild is
+        # pending, it picks up everything that follows anyway. A batch of
+        # changes schedules the preview once.
+        if self.preview_changes[:1] != [('reset',)]:
+            if (any(change[0] == 'reset' for change in changes)
+                    or len(self.preview_changes) + len(changes) > PREVIEW_MAX_CHANGES):
+                self.preview_changes = [('reset',)]
+            else:
+                self.preview_changes.extend(changes)
+        self.schedule_preview()
 
+    def update_preview(self):
+        # Rewrites only what changed: the header block, the added or removed
+        # item lines and the totals. The text is laid out as header lines,
+        # one line per item, then the totals and footer.
+        if self.preview_after is not None:
+            self.root.after_cancel(self.preview_after)
+            self.preview_after = None
+        text = self.preview_text
+        invoice = self.get_invoice_data()
+        header_lines, item_lines = self.preview_lines
+        changes, self.preview_changes = self.preview_changes, []
+        changed = bool(changes)
 
-{'-'*80}
-Generated on: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
-{'='*80}
-"""
-        return invoice_template
+        # Read-only to the user: edits typed into it would shift the line
+        # numbers the incremental updates rely on
+        text.configure(state='normal')
+        try:
+            if changes[:1] == [('reset',)]:
+                text.delete(1.0, tk.END)
+                self.preview_header = None
+                self.preview_footer_key = None
+                header_lines = item_lines = 0
+                changes = []
+                lines = []
+                for item in invoice['items']:
+                    lines.append(self.preview_line(item))
+                    if len(lines) == TEXT_CHUNK_LINES:
+                        text.insert(tk.END, ''.join(lines))
+                        lines = []
+                text.insert(tk.END, ''.join(lines))
+                item_lines = len(invoice['items'])
+
+            header = invoice_text_header(invoice)
+            if header != self.preview_header:
+                text.delete(1.0, f"{header_lines + 1}.0")
+                text.insert(1.0, header)
+                header_lines = header.count('\n')
+                self.preview_header = header
+                changed = True
+
+            first = header_lines + 1
+            for kind, group in itertools.groupby(changes, key=lambda change: change[0]):
+                if kind == 'add':
+                    lines = [self.preview_line(item) for _, item in group]
+                    text.insert(f"{first + item_lines}.0", ''.join(lines))
+                    item_lines += len(lines)
+                else:
+                    for _, position in group:
+                        text.delete(f"{first + position}.0", f"{first + position + 1}.0")
+                        item_lines -= 1
+
+            try:
+                totals = self.calculate_totals()
+                footer_key = totals
+            except ValueError:
+                totals = None
+                footer_key = 'invalid'
+            if footer_key != self.preview_footer_key:
+                if totals is None:
+                    footer = f"\n{'-'*80}\nTax Rate and Discount must be numbers\n"
+                else:
+                    footer = invoice_text_footer(totals)
+                text.delete(f"{first + item_lines}.0", tk.END)
+                text.insert(tk.END, footer)
+                self.preview_footer_key = footer_key
+                changed = True
+        finally:
+            text.configure(state='disabled')
+
+        self.preview_lines = (header_lines, item_lines)
+        if changed:
+            self.request_thumbnail(invoice, totals)
+
+    @staticmethod
+    def preview_line(item):
+        # Exactly one text line per item, so line numbers map to positions
+        line = invoice_text_line(item)
+        return line[:-1].replace('\n', ' ') + '\n'
+
+    def request_thumbnail(self, invoice, totals):
+        # Only the newest request matters; an older one still waiting is dropped
+        if self.thumbnail_future is not None:
+            self.thumbnail_future.cancel()
+        if totals is None or not invoice['items']:
+            self.thumbnail_future = None
+            self.thumbnail_image = None
+            self.preview_thumbnail.config(image='')
+            return
+        self.thumbnail_future = self.thumbnail_executor.submit(render_image_thumbnail, invoice, totals)
+        if not self.thumbnail_polling:
+            self.thumbnail_polling = True
+            self.root.after(50, self._poll_thumbnail)
+
+    def _poll_thumbnail(self):
+        future = self.thumbnail_future
+        if future is not None and not future.done():
+            self.root.after(50, self._poll_thumbnail)
+            return
+        self.thumbnail_polling = False
+        if future is None or future.cancelled() or future.exception() is not None:
+            return
+        # PhotoImage must be created on the Tk thread
+        self.thumbnail_image = ImageTk.PhotoImage(future.result())
+        self.preview_thumbnail.config(image=self.thumbnail_image)
+
+    def create_invoice_template(self, subtotal, discount_amount, tax_amount, total):
+        return build_invoice_text(self.get_invoice_data(),
+                                  (subtotal, discount_amount, tax_amount, total))
         
     def save_invoice(self):
-        invoice_content = self.preview_text.get(1.0, tk.END)
-        if not invoice_content.strip():
+        if not self.items or self.preview_text.compare('end-1c', '==', '1.0'):
             messagebox.showerror("Error", "Please generate an invoice first")
             return
             
@@ -395,12 +3793,64 @@ Generated on: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
         
         if filename:
             try:
-                with open(filename, 'w') as file:
-                    file.write(invoice_content)
-                messagebox.showinfo("Success", f"Invoice saved to {filename}")
+                # Rendered by the text exporter like the other formats; the
+                # preview is read-only, so it has nothing the export lacks
+                self.queue_export('txt', filename)
             except Exception as e:
                 messagebox.showerror("Error", f"Failed to save invoice: {str(e)}")
                 
+    def next_invoice_number(self):
+        try:
+            if self.number_allocator is None:
+                self.number_allocator = InvoiceNumberAllocator()
+            return self.number_allocator.next()
+        except (sqlite3.Error, OSError) as e:
+            print(f"Error allocating invoice number: {e}")
+            return fallback_invoice_number()
+
+    def get_store(self):
+        if self.store is None:
+            self.store = InvoiceStore()
+        return self.store
+
+    def save_to_store(self):
+        if not self.items:
+            messagebox.showerror("Error", "Please add at least one item")
+            return
+        try:
+            self.get_store().save(self.get_invoice_data())
+            messagebox.showinfo("Success", f"Invoice {self.invoice_number.get()} saved to the store")
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to save invoice: {str(e)}")
+
+    def open_invoice(self):
+        try:
+            OpenInvoiceDialog(self.root, self.get_store(), self.set_invoice_data)
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to open the invoice store: {str(e)}")
+
+    def set_invoice_data(self, invoice):
+        # Load an invoice dict (as produced by get_invoice_data) into the form
+        for field in INVOICE_FIELDS:
+            widget = getattr(self, field)
+            if isinstance(widget, tk.Text):
+                widget.delete(1.0, tk.END)
+                widget.insert(1.0, invoice[field])
+            else:
+                widget.delete(0, tk.END)
+                widget.insert(0, invoice[field])
+        
+        self.logo_path = invoice['logo_path']
+        self.logo_status.config(text=os.path.basename(self.logo_path) if self.logo_path else "No logo uploaded")
+        
+        self.items.clear()
+        self.totals_engine.clear()
+        for item in invoice['items']:
+            self.items.add(item)
+            self.totals_engine.add(item)
+        self.items_table.scroll_to(0)
+        self.preview_items_changed(('reset',))
+        
     def clear_all(self):
         # Clear all input fields
         self.company_name.delete(0, tk.END)
@@ -416,7 +3866,7 @@ Generated on: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
         self.customer_email.delete(0, tk.END)
         
         self.invoice_number.delete(0, tk.END)
-        self.invoice_number.insert(0, f"INV-{datetime.now().strftime('%Y%m%d%H%M')}")
+        self.invoice_number.insert(0, self.next_invoice_number())
         self.invoice_date.delete(0, tk.END)
         self.invoice_date.insert(0, datetime.now().strftime('%Y-%m-%d'))
         self.due_date.delete(0, tk.END)
@@ -430,11 +3880,11 @@ Generated on: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
         
         # Clear items
         self.items.clear()
-        for item in self.items_tree.get_children():
-            self.items_tree.delete(item)
+        self.totals_engine.clear()
+        self.items_table.scroll_to(0)
             
-        # Clear preview
-        self.preview_text.delete(1.0, tk.END)
+        # Reset the preview
+        self.preview_items_changed(('reset',))
         
         messagebox.showinfo("Success", "All fields cleared")
 
@@ -451,8 +3901,7 @@ Generated on: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
         
         if filename:
             try:
-                self.create_pdf_invoice(filename)
-                messagebox.showinfo("Success", f"Invoice saved as PDF: {filename}")
+                self.queue_export('pdf', filename)
             except Exception as e:
                 messagebox.showerror("Error", f"Failed to save PDF: {str(e)}")
                 
@@ -463,286 +3912,900 @@ Generated on: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
             
         filename = filedialog.asksaveasfilename(
             defaultextension=".jpg",
-            filetypes=[("JPEG files", "*.jpg"), ("PNG files", "*.png"), ("All files", "*.*")],
+            filetypes=[("JPEG files", "*.jpg"), ("PNG files", "*.png"), ("WebP files", "*.webp"),
+                       ("Multi-page TIFF", "*.tif"), ("All files", "*.*")],
             title="Save Invoice as Image"
         )
         
         if filename:
             try:
-                self.create_image_invoice(filename)
-                messagebox.showinfo("Success", f"Invoice saved as image: {filename}")
+                self.queue_export(export_format_for(filename, 'png'), filename)
             except Exception as e:
                 messagebox.showerror("Error", f"Failed to save image: {str(e)}")
                 
-    def create_pdf_invoice(self, filename):
-        subtotal, discount_amount, tax_amount, total = self.calculate_totals()
-        
-        # Create PDF document
-        doc = SimpleDocTemplate(filename, pagesize=letter, rightMargin=72, leftMargin=72,
-                               topMargin=72, bottomMargin=18)
-        
-        # Container for the 'Flowable' objects
-        elements = []
-        styles = getSampleStyleSheet()
+    def export_all(self):
+        if not self.items:
+            messagebox.showerror("Error", "Please generate an invoice first")
+            return
+            
+        filename = filedialog.asksaveasfilename(
+            title="Export Invoice as PDF, JPG and Text (choose a base name)"
+        )
         
-        # Add logo if available
-        if self.logo_path:
-            try:
-                # Get image dimensions to maintain aspect ratio
-                img = Image.open(self.logo_path)
-                img_width, img_height = img.size
-                aspect = img_width / img_height
-                new_height = 0.75 * inch
-                new_width = new_height * aspect
+        if filename:
+            # One snapshot, three formats rendering side by side
+            base = os.path.splitext(filename)[0]
+            invoice = self.get_invoice_data()
+            for fmt in ('pdf', 'jpg', 'txt'):
+                self.queue_export(fmt, f"{base}.{fmt}", invoice)
                 
-                # Create logo image
-                logo = RLImage(self.logo_path, width=new_width, height=new_height)
-                elements.append(logo)
-                elements.append(Spacer(1, 12))
-            except Exception as e:
-                print(f"Error loading logo: {e}")
-        
-        # Title
-        title_style = styles['Title']
-        title_style.alignment = 1  # Center alignment
-        title = Paragraph("INVOICE", title_style)
-        elements.append(title)
-        elements.append(Spacer(1, 12))
-        
-        # Company and Customer info table
-        company_addr = self.company_address.get(1.0, tk.END).strip().replace('\n', '<br/>')
-        customer_addr = self.customer_address.get(1.0, tk.END).strip().replace('\n', '<br/>')
-        
-        info_data = [
-            ['From:', 'To:'],
-            [f"<b>{self.company_name.get()}</b><br/>{company_addr}<br/>Phone: {self.company_phone.get()}<br/>Email: {self.company_email.get()}",
-             f"<b>{self.customer_name.get()}</b><br/>{customer_addr}<br/>Phone: {self.customer_phone.get()}<br/>Email: {self.customer_email.get()}"]
-        ]
-        
-        info_table = Table(info_data, colWidths=[3*inch, 3*inch])
-        info_table.setStyle(TableStyle([
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, -1), 10),
-            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black),
-            ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
-        ]))
-        elements.append(info_table)
-        elements.append(Spacer(1, 12))
-        
-        # Invoice details
-        details_data = [
-            ['Invoice Number:', self.invoice_number.get(), 'Invoice Date:', self.invoice_date.get()],
-            ['Due Date:', self.due_date.get(), 'Payment Terms:', self.payment_terms.get()]
-        ]
-        
-        details_table = Table(details_data, colWidths=[1.5*inch, 1.5*inch, 1.5*inch, 1.5*inch])
-        details_table.setStyle(TableStyle([
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
-            ('FONTSIZE', (0, 0), (-1, -1), 10),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black),
-            ('BACKGROUND', (0, 0), (0, -1), colors.lightgrey),
-            ('BACKGROUND', (2, 0), (2, -1), colors.lightgrey),
-        ]))
-        elements.append(details_table)
-        elements.append(Spacer(1, 12))
-        
-        # Items table
-        items_data = [['Description', 'Quantity', 'Rate', 'Amount']]
-        for item in self.items:
-            items_data.append([
-                item['description'],
-                f"{item['quantity']:.1f}",
-                f"₨{item['rate']:.2f}",
-                f"₨{item['amount']:.2f}"
-            ])
+    def queue_export(self, fmt, filename, invoice=None):
+        # Renders from a snapshot, so editing can continue while it runs
+        job = self.export_queue.submit(invoice or self.get_invoice_data(), fmt, filename)
+        self.exports_tree.insert('', 0, iid=str(job.job_id),
+                                 values=(fmt.upper(), filename, job.status))
+        if not self.export_polling:
+            self.export_polling = True
+            self.root.after(100, self._poll_exports)
             
-        items_table = Table(items_data, colWidths=[3*inch, 1*inch, 1*inch, 1*inch])
-        items_table.setStyle(TableStyle([
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('ALIGN', (1, 0), (-1, -1), 'RIGHT'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-            ('FONTSIZE', (0, 0), (-1, -1), 10),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black),
-            ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
-        ]))
-        elements.append(items_table)
-        elements.append(Spacer(1, 12))
-        
-        # Totals table
-        totals_data = [
-            ['Subtotal:', f"₨{subtotal:.2f}"],
-            ['Discount:', f"₨{discount_amount:.2f}"],
-            ['Tax:', f"₨{tax_amount:.2f}"],
-            ['TOTAL:', f"₨{total:.2f}"]
-        ]
-        
-        totals_table = Table(totals_data, colWidths=[4*inch, 2*inch])
-        totals_table.setStyle(TableStyle([
-            ('ALIGN', (0, 0), (-1, -1), 'RIGHT'),
-            ('FONTNAME', (0, 0), (-1, 2), 'Helvetica'),
-            ('FONTNAME', (0, 3), (-1, 3), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 2), 10),
-            ('FONTSIZE', (0, 3), (-1, 3), 12),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black),
-            ('BACKGROUND', (0, 3), (-1, 3), colors.lightgrey),
-        ]))
-        elements.append(totals_table)
-        elements.append(Spacer(1, 24))
+    def cancel_export(self):
+        selected = self.exports_tree.selection()
+        if not selected:
+            messagebox.showwarning("Warning", "Please select an export to cancel")
+            return
+        if self.export_queue.cancel(int(selected[0])):
+            job = self.export_queue.jobs[int(selected[0])]
+            self.exports_tree.set(selected[0], 'Status', job.status)
+            
+    def _poll_exports(self):
+        for job in self.export_queue.poll():
+            status = job.status
+            if job.status == 'Done':
+                pages = f", {len(job.outputs)} files" if len(job.outputs) > 1 else ""
+                status = f"Done ({job.elapsed:.1f}s{pages})"
+            self.exports_tree.set(str(job.job_id), 'Status', status)
+            if job.status == 'Failed':
+                messagebox.showerror("Error", f"Failed to save {job.fmt.upper()}: {job.error}")
         
-       
+        if self.export_queue.active:
+            self.root.after(100, self._poll_exports)
+        else:
+            self.export_polling = False
+            
+    def on_close(self):
+        self.export_queue.shutdown()
+        self.thumbnail_executor.shutdown(wait=False, cancel_futures=True)
+        TIMINGS.close()
+        self.root.destroy()
         
-        # Build PDF
-        doc.build(elements)
+    def create_pdf_invoice(self, filename):
+        render_pdf_invoice(self.get_invoice_data(), filename)
         
     def create_image_invoice(self, filename):
-        subtotal, discount_amount, tax_amount, total = self.calculate_totals()
-        
-        # Create image
-        img_width, img_height = 800, 1100
-        img = Image.new('RGB', (img_width, img_height), 'white')
-        draw = ImageDraw.Draw(img)
-        
+        return render_image_invoice(self.get_invoice_data(), filename,
+                                    workers=min(4, os.cpu_count() or 1))
+
+
+def _render_batch_record(invoice, formats, output_dir, name, timed=False):
+    # Runs inside a worker process; returns the paths written and the stage
+    # timings for the parent's sinks. Files are rendered into the worker's
+    # scratch directory and moved into place once complete, the first page
+    # of a series last, so an output that exists was written in full.
+    outputs = []
+    records = []
+    scratch = os.path.join(output_dir, f"{BATCH_SCRATCH_PREFIX}{os.getpid()}")
+    os.makedirs(scratch, exist_ok=True)
+    for fmt in formats:
+        paths, timings = _render_export_job(invoice, fmt, os.path.join(scratch, f"{name}.{fmt}"), timed)
+        finals = [os.path.join(output_dir, os.path.basename(path)) for path in paths]
+        for path, final in reversed(list(zip(paths, finals))):
+            os.replace(path, final)
+        outputs.extend(finals)
+        records.extend(timings)
+    return outputs, records
+
+
+def _batch_name(invoice, line_no):
+    name = invoice['invoice_number'] or f"invoice-{line_no}"
+    return "".join(c if c.isalnum() or c in '-_.' else '_' for c in name)
+
+
+def verify_export(path, fmt):
+    # Cheap check that a file left by an earlier run is complete: the PDF
+    # trailer, a parseable image, the text footer. Other exporters' files
+    # only have to be non-empty.
+    try:
+        if fmt == 'pdf':
+            with open(path, 'rb') as file:
+                head = file.read(5)
+                file.seek(max(0, os.path.getsize(path) - 1024))
+                return head == b'%PDF-' and b'%%EOF' in file.read()
+        if fmt in ('jpg', 'png', 'tiff', 'webp'):
+            with Image.open(path) as img:
+                img.verify()
+            return True
+        if fmt == 'txt':
+            footer = ('=' * 80 + '\n').encode('utf-8')
+            with open(path, 'rb') as file:
+                file.seek(max(0, os.path.getsize(path) - len(footer)))
+                return file.read() == footer
+        return os.path.getsize(path) > 0
+    except Exception:
+        return False
+
+
+def existing_exports(output_dir, name, fmt):
+    # The verified files a previous run wrote for one record and format
+    # (name.fmt, or the name-001.fmt... page series), or None
+    filename = os.path.join(output_dir, f"{name}.{fmt}")
+    paths = [filename]
+    if not os.path.exists(filename):
+        paths = []
+        for page_number in itertools.count(1):
+            path = image_page_filename(filename, page_number)
+            if not os.path.exists(path):
+                break
+            paths.append(path)
+    if paths and all(verify_export(path, fmt) for path in paths):
+        return paths
+    return None
+
+
+# Record columns of an invoice CSV other than the item ones; the invoice's
+# values are repeated on each of its rows
+INVOICE_CSV_COLUMNS = INVOICE_FIELDS + ('logo_path',)
+INVOICE_CSV_ITEM_COLUMNS = {
+    'description': 'description', 'quantity': 'quantity', 'rate': 'rate',
+    'item_tax_rate': 'tax_rate', 'item_discount': 'discount',
+}
+
+
+def read_invoice_csv(path, start_after=0):
+    # One row per line item. Adjacent rows for the same invoice (the same
+    # invoice_number, or the same invoice columns when there is none) make
+    # up one record, numbered by its first row; only that group is held
+    with open(path, encoding='utf-8-sig', newline='') as file:
+        reader = csv.DictReader(file)
+        reader.fieldnames = [name.strip().lower() for name in reader.fieldnames or []]
+
+        def invoice_key(numbered_row):
+            row = numbered_row[1]
+            return row.get('invoice_number') or tuple(row.get(column) for column in INVOICE_CSV_COLUMNS)
+
+        for _, group in itertools.groupby(enumerate(reader, 2), invoice_key):
+            row_no, first = next(group)
+            if row_no <= start_after:
+                continue
+            record = {column: first.get(column) for column in INVOICE_CSV_COLUMNS}
+            record['items'] = [
+                {key: row[column] for column, key in INVOICE_CSV_ITEM_COLUMNS.items() if row.get(column)}
+                for _, row in itertools.chain([(row_no, first)], group)
+            ]
+            try:
+                yield row_no, load_invoice_record(record), None
+            except ValueError as e:
+                yield row_no, None, str(e)
+
+
+def read_invoice_records(path, start_after=0):
+    # Yields (line number, invoice or error) for every non-blank JSONL line
+    # after start_after; a .csv file is read with read_invoice_csv
+    if os.path.splitext(path)[1].lower() == '.csv':
+        yield from read_invoice_csv(path, start_after)
+        return
+    with open(path, encoding='utf-8') as file:
+        for line_no, line in enumerate(file, 1):
+            if line_no <= start_after or not line.strip():
+                continue
+            try:
+                yield line_no, load_invoice_record(json.loads(line)), None
+            except (ValueError, AttributeError) as e:
+                yield line_no, None, str(e)
+
+
+BATCH_CHECKPOINT_NAME = '.batch-checkpoint.json'
+BATCH_SCRATCH_PREFIX = '.partial-'
+# Seconds between checkpoint writes as records finish. Anything finished
+# since the last write is found again on resume, as verified outputs.
+BATCH_CHECKPOINT_INTERVAL = 0.5
+
+
+class BatchCheckpoint:
+    # Progress of a batch run, rewritten atomically as records finish.
+    # Every record up to line `committed` is finished, as are those in
+    # `done`, which finished ahead of a slower one, except the records in
+    # `failed`: `committed` moves on past them, but they are not finished
+    # and the next run retries them. `numbers` holds the invoice numbers
+    # given to records not yet committed (or failed); they are saved before
+    # the record is rendered, so a resumed run names it the same.
+    # `source` ties the file to one input file and format list.
+    def __init__(self, path, source):
+        self.path = path
+        self.source = source
+        self.committed = 0
+        self.done = set()
+        self.failed = set()
+        self.numbers = {}
+        self._pending = deque()
+        self._settled = set()
+        self._saved = 0.0
+
+    @classmethod
+    def open(cls, path, source, restart=False):
+        checkpoint = cls(path, source)
+        if restart or not os.path.exists(path):
+            return checkpoint
+        with open(path, encoding='utf-8') as file:
+            data = json.load(file)
+        if data.get('source') != source:
+            raise ValueError(f"{path} is from a run over a different input or format list "
+                             f"(use --restart to discard it)")
+        checkpoint.committed = int(data['committed'])
+        checkpoint.done = set(map(int, data['done']))
+        checkpoint.failed = set(map(int, data.get('failed', ())))
+        checkpoint.numbers = {int(line_no): number for line_no, number in data['numbers'].items()}
+        return checkpoint
+
+    @property
+    def outstanding(self):
+        # Records started but not yet committed
+        return len(self._pending)
+
+    @property
+    def resume_after(self):
+        # Line to read the input from: the first failed record or past the
+        # committed ones
+        return min(self.failed) - 1 if self.failed else self.committed
+
+    def finished(self, line_no):
+        return (line_no <= self.committed or line_no in self.done) and line_no not in self.failed
+
+    def start(self, line_no):
+        self._pending.append(line_no)
+
+    def assign_number(self, line_no, allocator):
+        number = self.numbers.get(line_no)
+        if number is None:
+            number = self.numbers[line_no] = allocator.next()
+            self.save()
+        return number
+
+    def finish(self, line_no, failed=False):
+        # Marks a started record finished (or failed) and moves `committed`
+        # up over the run of settled records at the front. A retried record
+        # may lie behind `committed`, which never moves back.
+        if failed:
+            self.failed.add(line_no)
+        else:
+            self.failed.discard(line_no)
+            self.done.add(line_no)
+        self._settled.add(line_no)
+        while self._pending and self._pending[0] in self._settled:
+            line = self._pending.popleft()
+            self._settled.discard(line)
+            self.done.discard(line)
+            if line not in self.failed:
+                self.numbers.pop(line, None)
+            self.committed = max(self.committed, line)
+        if time.monotonic() - self._saved >= BATCH_CHECKPOINT_INTERVAL:
+            self.save()
+
+    def save(self):
+        data = {'source': self.source, 'committed': self.committed, 'done': sorted(self.done),
+                'failed': sorted(self.failed),
+                'numbers': {str(line_no): number for line_no, number in self.numbers.items()}}
+        temp = f"{self.path}.tmp"
+        with open(temp, 'w', encoding='utf-8') as file:
+            json.dump(data, file)
+        os.replace(temp, self.path)
+        self._saved = time.monotonic()
+
+
+def add_render_options(parser, images=True):
+    # Layout and encoding options shared by the rendering subcommands
+    parser.add_argument('--template', help="JSON file with PDF layout settings (colours, columns, footer)")
+    parser.add_argument('--pdf-profile', choices=sorted(PDF_PROFILES),
+                        help="PDF encoding: default, or compact (binary streams, logo resampled to 150 dpi)")
+    if images:
+        parser.add_argument('--image-profile', choices=sorted(IMAGE_PROFILES),
+                            help="Image encoding: default, compact (gray/palette PNG, progressive JPEG, "
+                                 "lossless WebP) or bilevel (1-bit)")
+        parser.add_argument('--image-scale', type=float,
+                            help="Image resolution factor; 1 is 800x1100 at 96 dpi, 3.125 is 300 dpi")
+
+
+def apply_render_options(args):
+    # Checks the add_render_options() values and puts them in the
+    # environment, where the exporters and worker processes read them.
+    # Prints the problem and returns False if one is invalid.
+    if args.template:
+        # Checked once here; each worker compiles it on first use
+        try:
+            load_pdf_template(args.template)
+        except (OSError, ValueError) as e:
+            print(f"Invalid PDF template {args.template}: {e}", file=sys.stderr)
+            return False
+        os.environ['INVOICE_PDF_TEMPLATE'] = os.path.abspath(args.template)
+    if args.pdf_profile:
+        os.environ['INVOICE_PDF_PROFILE'] = args.pdf_profile
+    if getattr(args, 'image_profile', None):
+        os.environ['INVOICE_IMAGE_PROFILE'] = args.image_profile
+    if getattr(args, 'image_scale', None):
         try:
-            # Try to use a system font
-            title_font = ImageFont.truetype("arial.ttf", 24)
-            header_font = ImageFont.truetype("arial.ttf", 14)
-            normal_font = ImageFont.truetype("arial.ttf", 12)
-            small_font = ImageFont.truetype("arial.ttf", 10)
-        except:
-            # Fallback to default font
-            title_font = ImageFont.load_default()
-            header_font = ImageFont.load_default()
-            normal_font = ImageFont.load_default()
-            small_font = ImageFont.load_default()
-        
-        y_pos = 30
-        
-        # Add logo if available
-        if self.logo_path:
+            image_scale(args.image_scale)
+        except ValueError as e:
+            print(e, file=sys.stderr)
+            return False
+        os.environ['INVOICE_IMAGE_SCALE'] = str(args.image_scale)
+    return True
+
+
+def run_batch(args):
+    formats = [fmt.strip().lower() for fmt in args.format.split(',') if fmt.strip()]
+    unknown = [fmt for fmt in formats if fmt not in export_formats()]
+    if not formats or unknown:
+        print(f"Unsupported format(s): {', '.join(unknown) or args.format}", file=sys.stderr)
+        return 2
+    os.makedirs(args.output_dir, exist_ok=True)
+    if args.font_path:
+        # Inherited by the worker processes' font registries
+        os.environ['INVOICE_FONT_PATH'] = os.pathsep.join(
+            filter(None, [args.font_path, os.environ.get('INVOICE_FONT_PATH')]))
+        FONTS.add_search_path(args.font_path)
+    if not apply_render_options(args):
+        return 2
+    # The workers pick the render cache up from the environment
+    if args.no_cache:
+        os.environ['INVOICE_RENDER_CACHE'] = ''
+    elif args.cache_dir:
+        os.environ['INVOICE_RENDER_CACHE'] = os.path.abspath(args.cache_dir)
+    elif args.cache:
+        os.environ['INVOICE_RENDER_CACHE'] = DEFAULT_RENDER_CACHE_DIR
+    try:
+        TIMINGS.configure(os.environ.get('INVOICE_TIMINGS'))
+        for spec in args.timings or []:
+            TIMINGS.configure(spec)
+    except (OSError, ValueError) as e:
+        print(f"Invalid --timings: {e}", file=sys.stderr)
+        return 2
+
+    try:
+        source = {'input': os.path.abspath(args.input), 'size': os.path.getsize(args.input),
+                  'mtime_ns': os.stat(args.input).st_mtime_ns, 'formats': formats}
+        checkpoint = BatchCheckpoint.open(args.checkpoint or os.path.join(args.output_dir, BATCH_CHECKPOINT_NAME),
+                                          source, restart=args.restart)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Cannot resume batch: {e}", file=sys.stderr)
+        return 2
+    if checkpoint.committed:
+        retry = f", retrying {len(checkpoint.failed)} failed" if checkpoint.failed else ""
+        print(f"Resuming after line {checkpoint.committed}{retry}")
+
+    failures = 0
+    rendered = 0
+    skipped = 0
+    written = 0
+    start = time.perf_counter()
+    # Numbers for records without one come from the shared sequence,
+    # reserved a block at a time
+    allocator = InvoiceNumberAllocator(args.sequence_db, number_format=args.number_format,
+                                       block_size=args.number_block)
+    # Only a few records are in memory at once: at most `window` rendering
+    # and, behind a slow one, at most `lookahead` read but not committed
+    window = max(1, args.workers or os.cpu_count() or 1) * 2
+    lookahead = window * 8
+    try:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=args.workers) as executor:
+            futures = {}
+
+            def collect():
+                nonlocal failures, rendered, written
+                done, _ = concurrent.futures.wait(futures, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    line_no = futures.pop(future)
+                    try:
+                        outputs, timings = future.result()
+                        for record in timings:
+                            TIMINGS.emit(record)
+                        written += sum(os.path.getsize(path) for path in outputs)
+                        rendered += 1
+                    except Exception as e:
+                        failures += 1
+                        print(f"Line {line_no}: {e}", file=sys.stderr)
+                        checkpoint.finish(line_no, failed=True)
+                    else:
+                        checkpoint.finish(line_no)
+
+            for line_no, invoice, error in read_invoice_records(args.input, checkpoint.resume_after):
+                if checkpoint.finished(line_no):
+                    if line_no > checkpoint.committed:
+                        # Finished out of order before the interruption
+                        checkpoint.start(line_no)
+                        checkpoint.finish(line_no)
+                    continue
+                while futures and (len(futures) >= window or checkpoint.outstanding >= lookahead):
+                    collect()
+                checkpoint.start(line_no)
+                if error:
+                    failures += 1
+                    print(f"Line {line_no}: {error}", file=sys.stderr)
+                    checkpoint.finish(line_no, failed=True)
+                    continue
+                if not invoice['invoice_number']:
+                    invoice['invoice_number'] = checkpoint.assign_number(line_no, allocator)
+                name = _batch_name(invoice, line_no)
+                if not args.overwrite and all(existing_exports(args.output_dir, name, fmt) for fmt in formats):
+                    skipped += 1
+                    checkpoint.finish(line_no)
+                    continue
+                future = executor.submit(_render_batch_record, invoice, formats, args.output_dir,
+                                         name, TIMINGS.enabled)
+                futures[future] = line_no
+
+            while futures:
+                collect()
+    finally:
+        checkpoint.save()
+        allocator.close()
+        TIMINGS.close()
+        # Files a worker was writing when the run stopped
+        for entry in os.scandir(args.output_dir):
+            if entry.name.startswith(BATCH_SCRATCH_PREFIX) and entry.is_dir():
+                shutil.rmtree(entry.path, ignore_errors=True)
+
+    elapsed = time.perf_counter() - start
+    rate = rendered / elapsed if elapsed else 0.0
+    print(f"Rendered {rendered} invoices ({failures} failed, {skipped} already done) in {elapsed:.2f}s "
+          f"- {rate:.1f} invoices/s, {written / 1e6:.1f} MB written")
+    # Failed records stay in the checkpoint until a run renders them
+    return 1 if failures or checkpoint.failed else 0
+
+
+def run_store(args):
+    store = InvoiceStore(args.db)
+    try:
+        if args.store_command == 'import':
+            errors = []
+
+            allocator = InvoiceNumberAllocator(args.db, number_format=args.number_format, block_size=1000)
+
+            def valid_records():
+                for line_no, invoice, error in assign_missing_numbers(read_invoice_records(args.input),
+                                                                      allocator):
+                    if error:
+                        errors.append(line_no)
+                        print(f"Line {line_no}: {error}", file=sys.stderr)
+                    else:
+                        yield invoice
+
+            start = time.perf_counter()
             try:
-                logo_img = Image.open(self.logo_path)
-                # Resize logo to fit (max 100px height)
-                logo_img = ImageOps.contain(logo_img, (200, 80))
-                logo_img = logo_img.convert("RGBA")
-                
-                # Paste logo at top center
-                logo_x = (img_width - logo_img.width) // 2
-                img.paste(logo_img, (logo_x, 20), logo_img)
-                
-                # Adjust y position below logo
-                y_pos = 20 + logo_img.height + 20
-            except Exception as e:
-                print(f"Error loading logo: {e}")
-        
-        # Title
-        title_text = "INVOICE"
-        title_bbox = draw.textbbox((0, 0), title_text, font=title_font)
-        title_width = title_bbox[2] - title_bbox[0]
-        draw.text(((img_width - title_width) // 2, y_pos), title_text, fill='black', font=title_font)
-        y_pos += 50
-        
-        # Draw line
-        draw.line([(50, y_pos), (img_width - 50, y_pos)], fill='black', width=2)
-        y_pos += 20
-        
-        # Company and Customer info
-        draw.text((50, y_pos), "From:", fill='black', font=header_font)
-        draw.text((400, y_pos), "To:", fill='black', font=header_font)
-        y_pos += 25
-        
-        # Company info
-        company_info = [
-            self.company_name.get(),
-            self.company_address.get(1.0, tk.END).strip(),
-            f"Phone: {self.company_phone.get()}",
-            f"Email: {self.company_email.get()}"
-        ]
-        
-        # Customer info
-        customer_info = [
-            self.customer_name.get(),
-            self.customer_address.get(1.0, tk.END).strip(),
-            f"Phone: {self.customer_phone.get()}",
-            f"Email: {self.customer_email.get()}"
-        ]
-        
-        for i, (comp_line, cust_line) in enumerate(zip(company_info, customer_info)):
-            draw.text((50, y_pos + i * 20), comp_line, fill='black', font=normal_font)
-            draw.text((400, y_pos + i * 20), cust_line, fill='black', font=normal_font)
-        
-        y_pos += 100
-        
-        # Invoice details
-        draw.line([(50, y_pos), (img_width - 50, y_pos)], fill='black', width=1)
-        y_pos += 15
-        
-        invoice_details = [
-            f"Invoice Number: {self.invoice_number.get()}",
-            f"Invoice Date: {self.invoice_date.get()}",
-            f"Due Date: {self.due_date.get()}",
-            f"Payment Terms: {self.payment_terms.get()}"
-        ]
-        
-        for i, detail in enumerate(invoice_details):
-            x_pos = 50 if i % 2 == 0 else 400
-            y_offset = (i // 2) * 20
-            draw.text((x_pos, y_pos + y_offset), detail, fill='black', font=normal_font)
-        
-        y_pos += 60
-        
-        # Items header
-        draw.line([(50, y_pos), (img_width - 50, y_pos)], fill='black', width=1)
-        y_pos += 15
-        
-        # Items table header
-        draw.text((50, y_pos), "Description", fill='black', font=header_font)
-        draw.text((400, y_pos), "Qty", fill='black', font=header_font)
-        draw.text((500, y_pos), "Rate", fill='black', font=header_font)
-        draw.text((600, y_pos), "Amount", fill='black', font=header_font)
-        y_pos += 25
-        
-        draw.line([(50, y_pos), (img_width - 50, y_pos)], fill='black', width=1)
-        y_pos += 15
-        
-        # Items
-        for item in self.items:
-            draw.text((50, y_pos), item['description'][:40], fill='black', font=normal_font)
-            draw.text((400, y_pos), f"{item['quantity']:.1f}", fill='black', font=normal_font)
-            draw.text((500, y_pos), f"₨{item['rate']:.2f}", fill='black', font=normal_font)
-            draw.text((600, y_pos), f"₨{item['amount']:.2f}", fill='black', font=normal_font)
-            y_pos += 20
-        
-        y_pos += 20
-        draw.line([(50, y_pos), (img_width - 50, y_pos)], fill='black', width=1)
-        y_pos += 15
-        
-        # Totals
-        totals = [
-            f"Subtotal: ₨{subtotal:>11.2f}",
-            f"Discount: ₨{discount_amount:>11.2f}",
-            f"Tax: ₨{tax_amount:>11.2f}",
-            f"TOTAL: ₨{total:>11.2f}"
-        ]
-        
-        for total_line in totals:
-            draw.text((500, y_pos), total_line, fill='black', font=normal_font)
-            y_pos += 20
-        
-        # Final total with emphasis
-        draw.line([(450, y_pos), (img_width - 50, y_pos)], fill='black', width=2)
-        y_pos += 30
-        
-        # Footer
-        
-        
-        # Save image
-        img.save(filename, 'JPEG' if filename.lower().endswith('.jpg') else 'PNG', quality=95)
+                saved = store.save_many(valid_records())
+            finally:
+                allocator.close()
+            print(f"Saved {saved} invoices ({len(errors)} skipped) in {time.perf_counter() - start:.2f}s")
+            return 1 if errors else 0
 
-if __name__ == "__main__":
+        rows = store.search(invoice_number=args.number, customer=args.customer,
+                            date_from=args.date_from, date_to=args.date_to,
+                            due_to=args.due_before, before_id=args.before_id, limit=args.limit)
+        for row in rows:
+            print(f"{row['id']:>8}  {row['invoice_number']:<20} {row['customer_name']:<30} "
+                  f"{row['invoice_date']:<10}  due {row['due_date'] or '-':<10} {row['total']:>12.2f}")
+        return 0
+    finally:
+        store.close()
+
+
+def run_statement(args):
+    if not apply_render_options(args):
+        return 2
+
+    failures = 0
+    if args.input:
+        # Kept in file order
+        invoices = []
+        for line_no, invoice, error in read_invoice_records(args.input):
+            if error:
+                failures += 1
+                print(f"Line {line_no}: {error}", file=sys.stderr)
+            else:
+                invoices.append(invoice)
+    else:
+        store = InvoiceStore(args.db)
+        try:
+            ids, before_id = [], None
+            while True:
+                rows = store.search(customer=args.customer, date_from=args.date_from, date_to=args.date_to,
+                                    before_id=before_id, limit=500)
+                if not rows:
+                    break
+                ids += [row['id'] for row in rows]
+                before_id = rows[-1]['id']
+            invoices = [store.load(invoice_id=invoice_id) for invoice_id in ids]
+        finally:
+            store.close()
+        invoices.sort(key=lambda invoice: (invoice['invoice_date'], invoice['invoice_number']))
+    if not invoices:
+        print("No invoices to put on the statement", file=sys.stderr)
+        return 1
+
+    start = time.perf_counter()
+    TIMINGS.configure(os.environ.get('INVOICE_TIMINGS'))
+    try:
+        render_pdf_statement(invoices, args.output, args.template, args.pdf_profile)
+    finally:
+        TIMINGS.close()
+    print(f"Wrote {len(invoices)} invoices to {args.output} ({os.path.getsize(args.output)} bytes) "
+          f"in {time.perf_counter() - start:.2f}s")
+    return 1 if failures else 0
+
+
+def run_report(args):
+    kinds = [kind.strip().lower() for kind in args.kind.split(',') if kind.strip()]
+    unknown = [kind for kind in kinds if kind not in REPORTS]
+    if not kinds or unknown:
+        print(f"Unknown report(s): {', '.join(unknown) or args.kind}", file=sys.stderr)
+        return 2
+    if args.as_of:
+        try:
+            datetime.strptime(args.as_of, '%Y-%m-%d')
+        except ValueError:
+            print(f"Invalid --as-of date: {args.as_of} (expected YYYY-MM-DD)", file=sys.stderr)
+            return 2
+    ext = os.path.splitext(args.output or '')[1].lower()
+    if args.output and ext not in ('.csv', '.pdf'):
+        print(f"Reports are written as .csv or .pdf, not {args.output}", file=sys.stderr)
+        return 2
+
+    start = time.perf_counter()
+    store = InvoiceStore(args.db)
+    try:
+        data = ReportData(store, customer=args.customer, date_from=args.date_from, date_to=args.date_to)
+        reports = build_reports(data, kinds, args.as_of)
+    except (RuntimeError, ValueError) as e:
+        print(e, file=sys.stderr)
+        return 2
+    finally:
+        store.close()
+    elapsed = time.perf_counter() - start
+    if not len(data):
+        print("No stored invoices match", file=sys.stderr)
+        return 1
+
+    if not args.output:
+        print('\n'.join(format_report_text(report) for report in reports))
+    elif ext == '.csv':
+        write_reports_csv(reports, args.output)
+    else:
+        details = [f"{len(data)} invoices",
+                   f"customer {args.customer}" if args.customer else "",
+                   f"from {args.date_from}" if args.date_from else "",
+                   f"to {args.date_to}" if args.date_to else "",
+                   f"generated on {datetime.now().strftime('%Y-%m-%d')}"]
+        render_pdf_report(reports, args.output, args.template, subtitle=', '.join(filter(None, details)))
+    print(f"Summarised {len(data)} invoices in {elapsed:.2f}s")
+    return 0
+
+
+SERVE_CONTENT_TYPES = {
+    'pdf': 'application/pdf',
+    'jpg': 'image/jpeg',
+    'png': 'image/png',
+    'tiff': 'image/tiff',
+    'webp': 'image/webp',
+    'txt': 'text/plain; charset=utf-8',
+}
+SERVE_KEEPALIVE_SECONDS = 15
+
+
+def _serve_render(invoice, fmt, timed=False):
+    # Runs inside a server worker process; same contract as _render_export_job
+    if not timed:
+        return export_bytes(invoice, fmt), []
+    with TIMINGS.collect() as records:
+        data = export_bytes(invoice, fmt)
+    return data, records
+
+
+def _warm_server_worker(formats):
+    # Imports the exporters' backends up front so the first real request in
+    # each worker doesn't pay for Pillow/ReportLab
+    for fmt in formats:
+        get_exporter(fmt).load()
+    return os.getpid()
+
+
+class RenderServer:
+    # Minimal HTTP/1.1 front end for the exporters:
+    #   POST /render/<format>  invoice JSON in, rendered file out
+    #   GET  /health           pool and queue counters as JSON
+    # Rendering runs on a fixed process pool. At most workers + queue_limit
+    # renders are admitted at once; anything beyond that gets 429 right away
+    # instead of queueing without bound. A request that takes longer than
+    # `timeout` gets 504, but its slot is only freed once the worker is done
+    # with it, so a slow render still counts against the limit.
+    def __init__(self, workers=None, queue_limit=32, timeout=30.0, max_body=16 * 1024 * 1024,
+                 allocator=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.queue_limit = queue_limit
+        self.capacity = self.workers + queue_limit
+        self.timeout = timeout
+        self.max_body = max_body
+        self.allocator = allocator
+        self.in_flight = 0
+        self.counts = {'served': 0, 'rejected': 0, 'timed_out': 0, 'failed': 0}
+        self._executor = None
+        self._loop = None
+
+    async def serve(self, host='127.0.0.1', port=8080):
+        self._loop = asyncio.get_running_loop()
+        self._executor = concurrent.futures.ProcessPoolExecutor(
+            max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'))
+        formats = [fmt for fmt in SERVE_CONTENT_TYPES if fmt in export_formats()]
+        await asyncio.gather(*(self._loop.run_in_executor(self._executor, _warm_server_worker, formats)
+                               for _ in range(self.workers)))
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        stop = asyncio.Event()
+        with contextlib.suppress(NotImplementedError):
+            # Not available on Windows, where Ctrl+C is the way out
+            self._loop.add_signal_handler(signal.SIGTERM, stop.set)
+        async with server:
+            bound = server.sockets[0].getsockname()
+            print(f"Serving invoices on http://{bound[0]}:{bound[1]} "
+                  f"({self.workers} workers, queue limit {self.queue_limit})", flush=True)
+            await stop.wait()
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'),
+                                                  SERVE_KEEPALIVE_SECONDS)
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError,
+                        asyncio.TimeoutError, ConnectionError):
+                    break
+                try:
+                    request_line, *header_lines = head.decode('latin-1').split('\r\n')
+                    method, target, version = request_line.split(' ')
+                    headers = {}
+                    for line in filter(None, header_lines):
+                        name, _, value = line.partition(':')
+                        headers[name.strip().lower()] = value.strip()
+                    length = int(headers.get('content-length') or 0)
+                except ValueError:
+                    await self.respond(writer, 400, {'error': "Malformed request"}, keep_alive=False)
+                    break
+                if length > self.max_body:
+                    await self.respond(writer, 413, {'error': f"Body over {self.max_body} bytes"},
+                                       keep_alive=False)
+                    break
+                try:
+                    body = await asyncio.wait_for(reader.readexactly(length),
+                                                  SERVE_KEEPALIVE_SECONDS) if length else b''
+                except asyncio.TimeoutError:
+                    await self.respond(writer, 408, {'error': "Timed out reading the body"},
+                                       keep_alive=False)
+                    break
+                keep_alive = (version == 'HTTP/1.1'
+                              and headers.get('connection', '').lower() != 'close')
+                status, payload, extra = await self.dispatch(method, target, body)
+                await self.respond(writer, status, payload, keep_alive, extra)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def respond(self, writer, status, payload, keep_alive=True, extra=None):
+        from http import HTTPStatus
+        if isinstance(payload, tuple):
+            content_type, body = payload
+        else:
+            content_type, body = 'application/json', json.dumps(payload).encode('utf-8')
+        head = [f"HTTP/1.1 {status} {HTTPStatus(status).phrase}",
+                f"Content-Type: {content_type}",
+                f"Content-Length: {len(body)}",
+                f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+        head.extend(f"{name}: {value}" for name, value in (extra or {}).items())
+        writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1') + body)
+        await writer.drain()
+
+    async def dispatch(self, method, target, body):
+        # Returns (status, payload, extra headers); payload is a JSON-able
+        # object or a (content type, bytes) pair
+        path = target.partition('?')[0]
+        if path == '/health':
+            return 200, dict(self.counts, status='ok', workers=self.workers,
+                             in_flight=self.in_flight, capacity=self.capacity), None
+        if not path.startswith('/render/'):
+            return 404, {'error': f"No such endpoint: {path}"}, None
+        fmt = path[len('/render/'):].lower()
+        fmt = {'jpeg': 'jpg', 'tif': 'tiff', 'text': 'txt'}.get(fmt, fmt)
+        if fmt not in SERVE_CONTENT_TYPES or fmt not in export_formats():
+            return 404, {'error': f"Unsupported format: {fmt}"}, None
+        if method != 'POST':
+            return 405, {'error': "Use POST"}, {'Allow': 'POST'}
+        if self.in_flight >= self.capacity:
+            self.counts['rejected'] += 1
+            return 429, {'error': "Too many invoices in progress"}, {'Retry-After': '1'}
+        try:
+            record = json.loads(body)
+            if not isinstance(record, dict):
+                raise ValueError("Expected a JSON object")
+            invoice = load_invoice_record(record)
+        except (ValueError, TypeError) as e:
+            return 400, {'error': str(e)}, None
+        if not invoice['invoice_number'] and self.allocator is not None:
+            invoice['invoice_number'] = self.allocator.next()
+        return await self.render(invoice, fmt)
+
+    async def render(self, invoice, fmt):
+        self.in_flight += 1
+        future = self._executor.submit(_serve_render, invoice, fmt, TIMINGS.enabled)
+        future.add_done_callback(lambda _: self._loop.call_soon_threadsafe(self._release))
+        try:
+            # shield: a timeout answers the client but leaves the render to
+            # finish (or be dropped, if it never started) on its own
+            data, records = await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)),
+                                                   self.timeout)
+        except asyncio.TimeoutError:
+            future.cancel()
+            self.counts['timed_out'] += 1
+            return 504, {'error': f"Rendering took longer than {self.timeout:g}s"}, None
+        except ValueError as e:
+            # e.g. a jpg/png that needs more than one page
+            self.counts['failed'] += 1
+            return 422, {'error': str(e)}, None
+        except Exception as e:
+            self.counts['failed'] += 1
+            return 500, {'error': f"{type(e).__name__}: {e}"}, None
+        for record in records:
+            TIMINGS.emit(record)
+        self.counts['served'] += 1
+        return 200, (SERVE_CONTENT_TYPES[fmt], data), {'X-Invoice-Number': invoice['invoice_number']}
+
+    def _release(self):
+        self.in_flight -= 1
+
+
+def run_serve(args):
+    try:
+        TIMINGS.configure(os.environ.get('INVOICE_TIMINGS'))
+        for spec in args.timings or []:
+            TIMINGS.configure(spec)
+    except (OSError, ValueError) as e:
+        print(f"Invalid --timings: {e}", file=sys.stderr)
+        return 2
+    if not apply_render_options(args):
+        return 2
+
+    allocator = InvoiceNumberAllocator(args.sequence_db, number_format=args.number_format,
+                                       block_size=args.number_block)
+    server = RenderServer(workers=args.workers, queue_limit=args.queue_limit, timeout=args.timeout,
+                          max_body=args.max_body_mb * 1024 * 1024, allocator=allocator)
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        allocator.close()
+        TIMINGS.close()
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Professional Invoice Generator")
+    subparsers = parser.add_subparsers(dest='command')
+
+    batch = subparsers.add_parser('batch', help="Render invoices from a JSONL or CSV file without the GUI")
+    batch.add_argument('--input', required=True,
+                       help="JSONL file with one invoice per line, or CSV with one line item per row")
+    batch.add_argument('--format', default='pdf', help="Comma-separated formats: pdf, jpg, png, tiff, txt or a registered exporter")
+    batch.add_argument('--workers', type=int, default=os.cpu_count(), help="Worker processes")
+    batch.add_argument('--output-dir', default='invoices', help="Directory for rendered files")
+    batch.add_argument('--font-path', help="Extra directory to search for fonts")
+    add_render_options(batch)
+    batch.add_argument('--cache', action='store_true',
+                       help="Keep PDF and image exports in the render cache (~/.invoice_generator/render-cache) "
+                            "and copy unchanged invoices out of it")
+    batch.add_argument('--cache-dir', help="Render cache directory (implies --cache)")
+    batch.add_argument('--no-cache', action='store_true',
+                       help="Always render, ignoring the render cache even if INVOICE_RENDER_CACHE is set")
+    batch.add_argument('--timings', action='append', metavar='SINK',
+                       help="Record per-stage render times: jsonl:PATH or prometheus:PATH (repeatable)")
+    batch.add_argument('--sequence-db', default=DEFAULT_STORE_PATH,
+                       help="SQLite file holding the invoice number sequence")
+    batch.add_argument('--number-format', default=DEFAULT_NUMBER_FORMAT,
+                       help="Template for new invoice numbers, with {seq} and {date}")
+    batch.add_argument('--number-block', type=int, default=1000,
+                       help="Invoice numbers reserved per database round trip")
+    batch.add_argument('--checkpoint',
+                       help=f"Progress file for resuming an interrupted run (default OUTPUT_DIR/{BATCH_CHECKPOINT_NAME})")
+    batch.add_argument('--restart', action='store_true', help="Ignore the checkpoint and start from the first record")
+    batch.add_argument('--overwrite', action='store_true',
+                       help="Render invoices whose outputs already exist instead of skipping them")
+
+    store = subparsers.add_parser('store', help="Import into or search the local invoice store")
+    store.add_argument('--db', default=DEFAULT_STORE_PATH, help="SQLite database file")
+    store_commands = store.add_subparsers(dest='store_command', required=True)
+    store_import = store_commands.add_parser('import', help="Bulk-insert invoices from a JSONL file")
+    store_import.add_argument('--input', required=True,
+                              help="JSONL file with one invoice per line, or CSV with one line item per row")
+    store_import.add_argument('--number-format', default=DEFAULT_NUMBER_FORMAT,
+                              help="Template for invoices without a number, with {seq} and {date}")
+    store_search = store_commands.add_parser('search', help="List stored invoices, newest first")
+    store_search.add_argument('--number', help="Invoice number prefix")
+    store_search.add_argument('--customer', help="Customer name prefix (case-insensitive)")
+    store_search.add_argument('--from', dest='date_from', help="Earliest invoice date (YYYY-MM-DD)")
+    store_search.add_argument('--to', dest='date_to', help="Latest invoice date (YYYY-MM-DD)")
+    store_search.add_argument('--due-before', help="Latest due date (YYYY-MM-DD)")
+    store_search.add_argument('--limit', type=int, default=50, help="Rows per page")
+    store_search.add_argument('--before-id', type=int, help="Continue after the last id shown")
+
+    statement = subparsers.add_parser('statement', help="Render several invoices into one PDF with a summary page")
+    statement.add_argument('--output', required=True, help="PDF file to write")
+    statement.add_argument('--input', help="JSONL or CSV file with the invoices (default: take them from the store)")
+    statement.add_argument('--db', default=DEFAULT_STORE_PATH, help="SQLite database file")
+    statement.add_argument('--customer', help="Customer name prefix (case-insensitive)")
+    statement.add_argument('--from', dest='date_from', help="Earliest invoice date (YYYY-MM-DD)")
+    statement.add_argument('--to', dest='date_to', help="Latest invoice date (YYYY-MM-DD)")
+    add_render_options(statement, images=False)
+
+    report = subparsers.add_parser('report', help="Revenue, tax, discount and aging summaries of the store")
+    report.add_argument('--db', default=DEFAULT_STORE_PATH, help="SQLite database file")
+    report.add_argument('--kind', default=','.join(REPORTS),
+                        help="Comma-separated reports: customer, month, tax (per tax rate) and aging")
+    report.add_argument('--output', help="CSV or PDF file to write (default: print the tables)")
+    report.add_argument('--customer', help="Customer name prefix (case-insensitive)")
+    report.add_argument('--from', dest='date_from', help="Earliest invoice date (YYYY-MM-DD)")
+    report.add_argument('--to', dest='date_to', help="Latest invoice date (YYYY-MM-DD)")
+    report.add_argument('--as-of', help="Date receivables are aged to (default today)")
+    report.add_argument('--template', help="JSON file with PDF colours and currency")
+
+    serve = subparsers.add_parser('serve', help="Render invoices over HTTP (POST /render/<format>)")
+    serve.add_argument('--host', default='127.0.0.1', help="Address to listen on")
+    serve.add_argument('--port', type=int, default=8080, help="Port to listen on")
+    serve.add_argument('--workers', type=int, default=os.cpu_count(), help="Worker processes")
+    serve.add_argument('--queue-limit', type=int, default=32,
+                       help="Requests allowed to wait for a worker before answering 429")
+    serve.add_argument('--timeout', type=float, default=30.0, help="Seconds per render before answering 504")
+    serve.add_argument('--max-body-mb', type=int, default=16, help="Largest accepted request body")
+    add_render_options(serve)
+    serve.add_argument('--timings', action='append', metavar='SINK',
+                       help="Record per-stage render times: jsonl:PATH or prometheus:PATH (repeatable)")
+    serve.add_argument('--sequence-db', default=DEFAULT_STORE_PATH,
+                       help="SQLite file holding the invoice number sequence")
+    serve.add_argument('--number-format', default=DEFAULT_NUMBER_FORMAT,
+                       help="Template for new invoice numbers, with {seq} and {date}")
+    serve.add_argument('--number-block', type=int, default=100,
+                       help="Invoice numbers reserved per database round trip")
+
+    args = parser.parse_args(argv)
+    if args.command == 'batch':
+        return run_batch(args)
+    if args.command == 'store':
+        return run_store(args)
+    if args.command == 'statement':
+        return run_statement(args)
+    if args.command == 'serve':
+        return run_serve(args)
+    if args.command == 'report':
+        return run_report(args)
+
+    TIMINGS.configure(os.environ.get('INVOICE_TIMINGS'))
     root = tk.Tk()
     app = InvoiceGenerator(root)
-    root.mainloop()
\ No newline at end of file
+    root.mainloop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,69 @@
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import InvoiceNumberAllocator
+
+
+def allocate(path, count, block_size):
+    # Runs in a separate process with its own connection
+    allocator = InvoiceNumberAllocator(path, number_format="{seq}", block_size=block_size)
+    try:
+        return [int(allocator.next()) for _ in range(count)]
+    finally:
+        allocator.close()
+
+
+class InvoiceNumberAllocatorTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = os.path.join(self.tmp.name, 'seq.db')
+
+    def test_processes_never_share_a_number(self):
+        with multiprocessing.get_context('spawn').Pool(4) as pool:
+            results = pool.starmap(allocate, [(self.path, 60, block_size) for block_size in (1, 1, 7, 7)])
+        numbers = [number for result in results for number in result]
+        self.assertEqual(len(set(numbers)), len(numbers))
+        for result in results:
+            self.assertEqual(result, sorted(result))
+        # Blocks of 1 and 7 reserved 60 + 60 + 63 + 63 values between them
+        self.assertEqual(allocate(self.path, 1, 1), [247])
+
+    def test_threads_share_one_allocator(self):
+        allocator = InvoiceNumberAllocator(self.path, number_format="{seq}", block_size=5)
+        self.addCleanup(allocator.close)
+        numbers = []
+
+        def worker():
+            for _ in range(50):
+                numbers.append(allocator.next())
+
+        threads = [threading.Thread(target=worker) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        # Threads that run out of a block at once may each reserve one, so
+        # numbers can be skipped, but never handed out twice
+        self.assertEqual(len(set(numbers)), 200)
+
+    def test_format_and_persistence(self):
+        allocator = InvoiceNumberAllocator(self.path, number_format="INV-{seq:04d}", block_size=10)
+        self.assertEqual([allocator.next(), allocator.next()], ["INV-0001", "INV-0002"])
+        allocator.close()
+        # The rest of the block is skipped, not handed out again
+        reopened = InvoiceNumberAllocator(self.path, number_format="INV-{seq:04d}")
+        self.addCleanup(reopened.close)
+        self.assertEqual(reopened.next(), "INV-0011")
+        with self.assertRaises(KeyError):
+            InvoiceNumberAllocator(self.path, number_format="{number}")
+
+
+if __name__ == '__main__':
+    unittest.main()
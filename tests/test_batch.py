@@ -0,0 +1,185 @@
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main
+from main import BATCH_CHECKPOINT_NAME, BatchCheckpoint
+
+SOURCE = {'input': 'in.jsonl', 'formats': ['txt']}
+
+
+def render_flaky(invoice, output):
+    # Exporter for the batch tests: fails for the invoice numbers listed in
+    # FLAKY_FAIL (read in the worker process)
+    if invoice['invoice_number'] in os.environ.get('FLAKY_FAIL', '').split(','):
+        raise OSError("disk full")
+    with open(output, 'w', encoding='utf-8') as file:
+        file.write(invoice['invoice_number'])
+    return [output]
+
+
+class Allocator:
+    def __init__(self):
+        self.issued = 0
+
+    def next(self):
+        self.issued += 1
+        return f"N-{self.issued}"
+
+
+class LoadInvoiceRecordTest(unittest.TestCase):
+    def test_malformed_items_raise_value_error(self):
+        for items in (5, "abc", {'description': "Line"}):
+            with self.assertRaisesRegex(ValueError, "Invalid items"):
+                main.load_invoice_record({'items': items})
+
+
+class BatchCheckpointTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, BATCH_CHECKPOINT_NAME)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def reopen(self, checkpoint):
+        checkpoint.save()
+        return BatchCheckpoint.open(self.path, SOURCE)
+
+    def test_commits_only_the_settled_front(self):
+        checkpoint = BatchCheckpoint(self.path, SOURCE)
+        for line_no in (1, 2, 3):
+            checkpoint.start(line_no)
+        checkpoint.finish(2)
+        self.assertEqual((checkpoint.committed, checkpoint.done), (0, {2}))
+        self.assertTrue(checkpoint.finished(2))
+        self.assertFalse(checkpoint.finished(1))
+        checkpoint.finish(1)
+        self.assertEqual((checkpoint.committed, checkpoint.done, checkpoint.outstanding), (2, set(), 1))
+
+        resumed = self.reopen(checkpoint)
+        self.assertEqual(resumed.resume_after, 2)
+        self.assertFalse(resumed.finished(3))
+
+    def test_resume_reuses_saved_numbers(self):
+        allocator = Allocator()
+        checkpoint = BatchCheckpoint(self.path, SOURCE)
+        checkpoint.start(1)
+        self.assertEqual(checkpoint.assign_number(1, allocator), "N-1")
+
+        # Interrupted before line 1 finished
+        resumed = BatchCheckpoint.open(self.path, SOURCE)
+        resumed.start(1)
+        self.assertEqual(resumed.assign_number(1, allocator), "N-1")
+        self.assertEqual(allocator.issued, 1)
+        resumed.finish(1)
+        self.assertEqual(resumed.numbers, {})
+
+    def test_failed_lines_are_retried(self):
+        allocator = Allocator()
+        checkpoint = BatchCheckpoint(self.path, SOURCE)
+        for line_no in (1, 2, 3):
+            checkpoint.start(line_no)
+            checkpoint.assign_number(line_no, allocator)
+        checkpoint.finish(1, failed=True)
+        checkpoint.finish(2)
+        checkpoint.finish(3, failed=True)
+        self.assertEqual((checkpoint.committed, checkpoint.failed), (3, {1, 3}))
+        self.assertEqual(checkpoint.numbers, {1: "N-1", 3: "N-3"})
+
+        resumed = self.reopen(checkpoint)
+        self.assertEqual(resumed.resume_after, 0)
+        self.assertEqual([line_no for line_no in (1, 2, 3) if not resumed.finished(line_no)], [1, 3])
+        resumed.start(1)
+        resumed.start(3)
+        # Line 3 failing again must not settle line 1, still being retried
+        resumed.finish(3, failed=True)
+        self.assertEqual(resumed.outstanding, 2)
+        self.assertEqual(resumed.assign_number(1, allocator), "N-1")
+        resumed.finish(1)
+        self.assertEqual((resumed.committed, resumed.failed, resumed.outstanding), (3, {3}, 0))
+        self.assertEqual(resumed.numbers, {3: "N-3"})
+        self.assertEqual(allocator.issued, 3)
+
+    def test_other_source_is_refused(self):
+        BatchCheckpoint(self.path, SOURCE).save()
+        with self.assertRaises(ValueError):
+            BatchCheckpoint.open(self.path, dict(SOURCE, formats=['pdf']))
+        self.assertEqual(BatchCheckpoint.open(self.path, dict(SOURCE, formats=['pdf']), restart=True).committed, 0)
+
+
+class RunBatchTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.input = os.path.join(self.tmp.name, 'in.jsonl')
+        self.output_dir = os.path.join(self.tmp.name, 'out')
+        records = [{'customer_name': f"Customer {n}",
+                    'items': [{'description': "Line", 'quantity': 1, 'rate': n + 1}]} for n in range(6)]
+        records[1]['invoice_number'] = "FIXED-1"
+        lines = [json.dumps(record) for record in records]
+        lines.insert(4, json.dumps({'customer_name': "No items"}))
+        with open(self.input, 'w', encoding='utf-8') as file:
+            file.write('\n'.join(lines) + '\n')
+
+        main.register_exporter('flaky', 'test_batch:render_flaky')
+        patcher = mock.patch.dict(os.environ, {'INVOICE_EXPORTERS': 'flaky=test_batch:render_flaky',
+                                               'INVOICE_RENDER_CACHE': ''})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(main.EXPORTERS.pop, 'flaky', None)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def run_batch(self, fail=()):
+        os.environ['FLAKY_FAIL'] = ','.join(fail)
+        argv = ['batch', '--input', self.input, '--format', 'flaky', '--workers', '2',
+                '--output-dir', self.output_dir, '--sequence-db', os.path.join(self.tmp.name, 'seq.db'),
+                '--number-format', 'INV-{seq:05d}']
+        with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+            return main.main(argv)
+
+    def checkpoint(self):
+        with open(os.path.join(self.output_dir, BATCH_CHECKPOINT_NAME), encoding='utf-8') as file:
+            return json.load(file)
+
+    def outputs(self):
+        return sorted(name for name in os.listdir(self.output_dir) if not name.startswith('.'))
+
+    def test_failed_records_are_retried_under_their_numbers(self):
+        self.assertEqual(self.run_batch(fail=["INV-00002", "FIXED-1"]), 1)
+        state = self.checkpoint()
+        # Line 5 has no items, lines 2 and 3 failed to render
+        self.assertEqual((state['committed'], state['failed']), (7, [2, 3, 5]))
+        self.assertEqual(state['numbers'], {'3': "INV-00002"})
+        self.assertEqual(self.outputs(), ["INV-00001.flaky", "INV-00003.flaky",
+                                          "INV-00004.flaky", "INV-00005.flaky"])
+
+        # Still failing: nothing is lost and the run still fails
+        self.assertEqual(self.run_batch(fail=["INV-00002"]), 1)
+        self.assertEqual(self.checkpoint()['failed'], [3, 5])
+        self.assertIn("FIXED-1.flaky", self.outputs())
+
+        self.assertEqual(self.run_batch(), 1)
+        state = self.checkpoint()
+        self.assertEqual((state['failed'], state['numbers']), ([5], {}))
+        self.assertEqual(self.outputs(), ["FIXED-1.flaky", "INV-00001.flaky", "INV-00002.flaky",
+                                          "INV-00003.flaky", "INV-00004.flaky", "INV-00005.flaky"])
+
+        # Only the unrenderable line is left; nothing else is rendered again
+        with open(os.path.join(self.output_dir, "INV-00001.flaky"), 'w', encoding='utf-8') as file:
+            file.write("kept")
+        self.assertEqual(self.run_batch(), 1)
+        with open(os.path.join(self.output_dir, "INV-00001.flaky"), encoding='utf-8') as file:
+            self.assertEqual(file.read(), "kept")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+import io
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image
+
+import main
+from main import (IMAGE_PAGE_SIZE, export_bytes, export_to_stream, iter_image_page_bytes, load_invoice_record,
+                  render_export)
+
+
+def make_invoice(count=3):
+    return load_invoice_record({
+        'customer_name': "Customer",
+        'invoice_number': "B-1",
+        'invoice_date': "2026-01-01",
+        'items': [{'description': f"Line {n}", 'quantity': 1, 'rate': n + 1} for n in range(count)],
+    })
+
+
+def render_file_only(invoice, output):
+    with open(output, 'w', encoding='utf-8') as file:
+        file.write(invoice['invoice_number'])
+    return [output]
+
+
+class ExportBytesTest(unittest.TestCase):
+    def test_pdf(self):
+        data = export_bytes(make_invoice(), 'pdf')
+        self.assertTrue(data.startswith(b'%PDF-'))
+        self.assertIn(b'%%EOF', data[-1024:])
+
+    def test_image_page(self):
+        with Image.open(io.BytesIO(export_bytes(make_invoice(), 'png'))) as img:
+            self.assertEqual((img.format, img.size), ('PNG', IMAGE_PAGE_SIZE))
+
+    def test_text_matches_the_file_export(self):
+        invoice = make_invoice()
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'invoice.txt')
+            render_export(invoice, 'txt', path)
+            with open(path, 'rb') as file:
+                on_disk = file.read()
+        # Only the "Generated on" time may differ
+        def lines(data):
+            return [line for line in data.splitlines() if not line.startswith(b'Generated on')]
+        self.assertEqual(lines(export_bytes(invoice, 'txt')), lines(on_disk))
+
+    def test_multi_page_images_need_tiff(self):
+        invoice = make_invoice(120)
+        with self.assertRaises(ValueError):
+            export_bytes(invoice, 'png')
+        with Image.open(io.BytesIO(export_bytes(invoice, 'tiff'))) as img:
+            self.assertGreater(img.n_frames, 1)
+
+    def test_page_iterator_records_its_timings_when_closed_early(self):
+        with main.TIMINGS.collect() as records:
+            pages = iter_image_page_bytes(make_invoice(120))
+            next(pages)
+            pages.close()
+        self.assertIn('total', {record['stage'] for record in records})
+
+    def test_file_only_exporter_is_refused(self):
+        main.register_exporter('fileonly', lambda: render_file_only)
+        self.addCleanup(main.EXPORTERS.pop, 'fileonly', None)
+        with self.assertRaisesRegex(ValueError, "can only write files"):
+            export_to_stream(make_invoice(), 'fileonly', io.BytesIO())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+import os
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main
+from main import EXPORT_SCRATCH_PREFIX, ExportQueue
+
+RELEASE = threading.Event()
+
+
+def render_blocking(invoice, output):
+    # Exporter for the queue tests: writes its file, then waits for RELEASE
+    with open(output, 'w', encoding='utf-8') as file:
+        file.write(invoice['invoice_number'])
+    if not RELEASE.wait(5):
+        raise OSError("never released")
+    if invoice['invoice_number'] == 'FAIL':
+        raise OSError("disk full")
+    return [output]
+
+
+class ExportQueueTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        RELEASE.clear()
+        self.addCleanup(RELEASE.set)
+        main.register_exporter('blocking', 'test_export_queue:render_blocking')
+        self.addCleanup(main.EXPORTERS.pop, 'blocking', None)
+        self.queue = ExportQueue()
+        # Threads instead of worker processes; the queue only needs submit()
+        self.queue._executor = ThreadPoolExecutor(1)
+        self.addCleanup(self.queue.shutdown)
+        self.target = os.path.join(self.tmp.name, 'invoice.blocking')
+        with open(self.target, 'w', encoding='utf-8') as file:
+            file.write("original")
+
+    def submit(self, number):
+        return self.queue.submit({'invoice_number': number}, 'blocking', self.target)
+
+    def wait(self, job):
+        deadline = time.monotonic() + 5
+        while not job.finished and time.monotonic() < deadline:
+            self.queue.poll()
+            time.sleep(0.01)
+
+    def target_text(self):
+        with open(self.target, encoding='utf-8') as file:
+            return file.read()
+
+    def leftovers(self):
+        return [name for name in os.listdir(self.tmp.name) if name.startswith(EXPORT_SCRATCH_PREFIX)]
+
+    def test_done_job_replaces_the_target(self):
+        job = self.submit("NEW")
+        self.assertEqual(self.target_text(), "original")
+        RELEASE.set()
+        self.wait(job)
+        self.assertEqual((job.status, job.outputs), ('Done', [self.target]))
+        self.assertEqual(self.target_text(), "NEW")
+        self.assertEqual(self.leftovers(), [])
+
+    def test_cancelled_rendering_job_keeps_the_existing_file(self):
+        job = self.submit("NEW")
+        while not job.future.running():
+            time.sleep(0.01)
+        self.assertTrue(self.queue.cancel(job.job_id))
+        self.assertEqual(job.status, 'Cancelling')
+        RELEASE.set()
+        self.wait(job)
+        self.assertEqual(job.status, 'Cancelled')
+        self.assertEqual(self.target_text(), "original")
+        self.assertEqual(self.leftovers(), [])
+
+    def test_cancelled_queued_job_never_runs(self):
+        running = self.submit("FIRST")
+        queued = self.submit("SECOND")
+        self.assertTrue(self.queue.cancel(queued.job_id))
+        self.assertEqual(queued.status, 'Cancelled')
+        RELEASE.set()
+        self.wait(running)
+        self.assertEqual(self.target_text(), "FIRST")
+        self.assertEqual(self.leftovers(), [])
+
+    def test_failed_job_leaves_nothing_behind(self):
+        job = self.submit("FAIL")
+        RELEASE.set()
+        self.wait(job)
+        self.assertEqual(job.status, 'Failed')
+        self.assertEqual(self.target_text(), "original")
+        self.assertEqual(self.leftovers(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main
+from main import export_formats, get_exporter, lazy_import, register_exporter
+
+# Module names that ran under the tests; appended to by the probe modules
+EXECUTED = []
+
+
+def render_stub(invoice, output):
+    return [output]
+
+
+class FakeEntryPoint:
+    def __init__(self, name, target):
+        self.name = name
+        self.target = target
+
+    def load(self):
+        return main._import_object(self.target)
+
+
+class ExporterRegistryTest(unittest.TestCase):
+    def setUp(self):
+        patchers = [mock.patch.dict(main.EXPORTERS), mock.patch.object(main, '_exporters_discovered', False)]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_backend_is_loaded_on_first_use(self):
+        loads = []
+
+        def loader():
+            loads.append(1)
+            return render_stub
+
+        exporter = register_exporter('stub', loader, "Stub")
+        self.assertFalse(exporter.loaded)
+        self.assertEqual(get_exporter('stub').render({}, 'out.stub'), ['out.stub'])
+        get_exporter('stub').render({}, 'again.stub')
+        self.assertTrue(exporter.loaded)
+        self.assertEqual(loads, [1])
+
+    def test_unknown_format(self):
+        with mock.patch('importlib.metadata.entry_points', return_value=[]):
+            with self.assertRaisesRegex(ValueError, "Unknown export format"):
+                get_exporter('nope')
+
+    def test_environment_and_entry_points_add_exporters(self):
+        points = [FakeEntryPoint('fromplugin', 'test_exporters:render_stub'),
+                  FakeEntryPoint('txt', 'test_exporters:render_stub')]
+        env = {'INVOICE_EXPORTERS': 'fromenv=test_exporters:render_stub, pdf=test_exporters:render_stub'}
+        builtins = dict(main.EXPORTERS)
+        with mock.patch.dict(os.environ, env), mock.patch('importlib.metadata.entry_points', return_value=points):
+            formats = export_formats()
+        self.assertIn('fromenv', formats)
+        self.assertIn('fromplugin', formats)
+        # Built-in names win
+        self.assertIs(main.EXPORTERS['pdf'], builtins['pdf'])
+        self.assertIs(main.EXPORTERS['txt'], builtins['txt'])
+        self.assertEqual(get_exporter('fromplugin').render({}, 'x'), ['x'])
+
+    def test_entry_points_without_group_selection(self):
+        # importlib.metadata before Python 3.10
+        def entry_points():
+            return {'invoice_generator.exporters': [FakeEntryPoint('fromplugin', 'test_exporters:render_stub')]}
+
+        with mock.patch('importlib.metadata.entry_points', entry_points):
+            self.assertIn('fromplugin', export_formats())
+
+
+class LazyImportTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        sys.path.insert(0, self.tmp.name)
+        self.addCleanup(sys.path.remove, self.tmp.name)
+
+    def write_probe(self, name):
+        with open(os.path.join(self.tmp.name, f'{name}.py'), 'w', encoding='utf-8') as file:
+            file.write("import sys\nsys.modules['test_exporters'].EXECUTED.append(__name__)\nVALUE = 42\n")
+        self.addCleanup(sys.modules.pop, name, None)
+
+    def test_module_runs_on_first_attribute_access(self):
+        self.write_probe('lazy_probe')
+        module = lazy_import('lazy_probe')
+        self.assertNotIn('lazy_probe', EXECUTED)
+        self.assertIs(lazy_import('lazy_probe'), module)
+        main.load_modules(module)
+        self.assertEqual(EXECUTED.count('lazy_probe'), 1)
+        self.assertEqual(module.VALUE, 42)
+
+    def test_missing_module(self):
+        with self.assertRaises(ModuleNotFoundError):
+            lazy_import('no_such_module_anywhere')
+
+
+if __name__ == '__main__':
+    unittest.main()
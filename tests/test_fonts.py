@@ -0,0 +1,61 @@
+import contextlib
+import io
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import reportlab
+
+from main import FontRegistry
+
+# A TrueType font that ships with ReportLab, so the tests need no system fonts
+VERA = os.path.join(os.path.dirname(reportlab.__file__), 'fonts', 'Vera.ttf')
+
+
+class FontRegistryTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.fonts = os.path.join(self.tmp.name, 'fonts')
+        os.makedirs(os.path.join(self.fonts, 'nested'))
+        self.arial = shutil.copy(VERA, os.path.join(self.fonts, 'nested', 'Arial.TTF'))
+
+    def test_search_path_comes_first_and_names_match_case_insensitively(self):
+        registry = FontRegistry([self.fonts])
+        self.assertEqual(registry.resolve('Arial'), self.arial)
+        self.assertEqual(registry.search_path[0], self.fonts)
+
+    def test_fonts_and_measurements_are_shared(self):
+        registry = FontRegistry([self.fonts])
+        font = registry.get('arial', 12)
+        self.assertIs(registry.get('ARIAL', 12), font)
+        self.assertIsNot(registry.get('arial', 14), font)
+        width, height = registry.measure("Subtotal:", 'arial', 12)
+        self.assertGreater(width, height)
+        hits = registry.measure.cache_info().hits
+        self.assertEqual(registry.measure("Subtotal:", 'arial', 12), (width, height))
+        self.assertEqual(registry.measure.cache_info().hits, hits + 1)
+
+    def test_missing_family_falls_back_to_the_default_font(self):
+        registry = FontRegistry([self.tmp.name])
+        registry.search_path = [self.tmp.name]
+        with contextlib.redirect_stderr(io.StringIO()) as stderr:
+            self.assertIsNone(registry.resolve('nosuchfont'))
+        self.assertIn("nosuchfont", stderr.getvalue())
+        self.assertIsNotNone(registry.get('nosuchfont', 12))
+
+    def test_added_search_path_is_picked_up(self):
+        registry = FontRegistry([])
+        registry.search_path = []
+        with contextlib.redirect_stderr(io.StringIO()):
+            self.assertIsNone(registry.resolve('arial'))
+        registry.add_search_path(self.fonts)
+        self.assertEqual(registry.resolve('arial'), self.arial)
+
+
+if __name__ == '__main__':
+    unittest.main()
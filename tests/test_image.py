@@ -0,0 +1,97 @@
+import io
+import os
+import random
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image
+
+from main import (IMAGE_BOTTOM_MARGIN, IMAGE_CONTINUED_HEADER, IMAGE_FIRST_HEADER, IMAGE_PAGE_SIZE,
+                  IMAGE_ROW_HEIGHT, IMAGE_TOTALS_HEIGHT, iter_image_page_bytes, load_invoice_record,
+                  paginate_image_items, render_image_invoice)
+
+
+def make_invoice(count):
+    return load_invoice_record({
+        'customer_name': "Customer",
+        'invoice_number': "I-1",
+        'invoice_date': "2026-01-01",
+        'items': [{'description': f"Line {n}", 'quantity': 1, 'rate': n + 1} for n in range(count)],
+    })
+
+
+class PaginateImageItemsTest(unittest.TestCase):
+    def test_pages_cover_every_item_within_the_page(self):
+        bottom = IMAGE_PAGE_SIZE[1] - IMAGE_BOTTOM_MARGIN
+        for count in (0, 1, 30, 31, 32, 500):
+            pages = paginate_image_items(count, 30)
+            self.assertEqual(pages[0][0], 0)
+            self.assertEqual(pages[-1][1], count)
+            for (_, end), (start, _) in zip(pages, pages[1:]):
+                self.assertEqual(end, start)
+            for index, (start, end) in enumerate(pages):
+                header = IMAGE_FIRST_HEADER if index == 0 else IMAGE_CONTINUED_HEADER
+                used = 30 + header + (end - start) * IMAGE_ROW_HEIGHT
+                if index == len(pages) - 1:
+                    used += IMAGE_TOTALS_HEIGHT
+                self.assertLessEqual(used, bottom, (count, pages))
+
+    def test_totals_that_do_not_fit_get_a_page_of_their_own(self):
+        # Exactly a full first page of rows leaves no room for the totals
+        rows = (IMAGE_PAGE_SIZE[1] - IMAGE_BOTTOM_MARGIN - 30 - IMAGE_FIRST_HEADER) // IMAGE_ROW_HEIGHT
+        self.assertEqual(paginate_image_items(rows, 30), [(0, rows), (rows, rows)])
+
+
+class RenderImageInvoiceTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def test_long_invoice_becomes_a_numbered_series(self):
+        invoice = make_invoice(120)
+        filename = os.path.join(self.tmp.name, 'invoice.png')
+        paths = render_image_invoice(invoice, filename, workers=2)
+        pages = paginate_image_items(120, 30)
+        self.assertEqual(paths, [os.path.join(self.tmp.name, f'invoice-{n:03d}.png')
+                                 for n in range(1, len(pages) + 1)])
+        for path in paths:
+            with Image.open(path) as img:
+                self.assertEqual(img.size, IMAGE_PAGE_SIZE)
+
+    def test_short_invoice_is_one_file(self):
+        filename = os.path.join(self.tmp.name, 'invoice.jpg')
+        self.assertEqual(render_image_invoice(make_invoice(3), filename), [filename])
+
+    def test_tiff_holds_every_page(self):
+        filename = os.path.join(self.tmp.name, 'invoice.tiff')
+        self.assertEqual(render_image_invoice(make_invoice(120), filename), [filename])
+        with Image.open(filename) as img:
+            self.assertEqual(img.n_frames, len(paginate_image_items(120, 30)))
+
+
+
+class ImageProfileTest(unittest.TestCase):
+    def test_compact_webp_is_lossless_only_without_a_logo(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            # Noise stands in for a photo
+            rng = random.Random(5)
+            logo = os.path.join(tmp, 'photo.png')
+            Image.frombytes('RGB', (160, 120), bytes(rng.randrange(256) for _ in range(160 * 120 * 3))).save(logo)
+            text_page, = iter_image_page_bytes(make_invoice(3), 'WEBP', profile='compact')
+            photo_page, = iter_image_page_bytes(dict(make_invoice(3), logo_path=logo), 'WEBP', profile='compact')
+        # Lossless WebP stores a VP8L chunk, lossy a "VP8 " one
+        self.assertEqual(text_page[12:16], b'VP8L')
+        self.assertEqual(photo_page[12:16], b'VP8 ')
+
+    def test_tiff_records_its_dpi_at_every_scale(self):
+        for scale in (1, 2):
+            page, = iter_image_page_bytes(make_invoice(3), 'TIFF', scale=scale)
+            with Image.open(io.BytesIO(page)) as img:
+                self.assertEqual(tuple(round(value) for value in img.info['dpi']), (96 * scale,) * 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+import json
+import os
+import sys
+import tempfile
+import unittest
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import parse_item_file
+
+
+class ParseItemFileTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def write(self, name, text):
+        path = os.path.join(self.tmp.name, name)
+        with open(path, 'w', encoding='utf-8', newline='') as file:
+            file.write(text)
+        return path
+
+    def parse(self, path, **options):
+        items, errors = [], []
+        for chunk_items, chunk_errors in parse_item_file(path, **options):
+            items += chunk_items
+            errors += chunk_errors
+        return items, errors
+
+    def test_csv_headers_match_case_insensitively(self):
+        path = self.write('items.csv', "﻿Description, Quantity ,RATE,tax_rate\r\n"
+                                       "Widget,2,1.25,5\r\n"
+                                       ",1,1\r\n"
+                                       "Gadget,x,1\r\n")
+        items, errors = self.parse(path)
+        self.assertEqual([(item['description'], item['amount'], item['tax_rate']) for item in items],
+                         [("Widget", Decimal('2.50'), Decimal('5'))])
+        self.assertEqual([row for row, _ in errors], [3, 4])
+        self.assertIn("missing description", errors[0][1])
+
+    def test_json_list_or_object_with_items(self):
+        rows = [{'description': "A", 'quantity': 1, 'rate': 2}, "not an item"]
+        for data in (rows, {'items': rows}):
+            items, errors = self.parse(self.write('items.json', json.dumps(data)))
+            self.assertEqual([item['description'] for item in items], ["A"])
+            self.assertEqual([row for row, _ in errors], [2])
+
+    def test_chunks_and_progress(self):
+        lines = [json.dumps({'description': f"Line {n}", 'quantity': 1, 'rate': 1}) for n in range(25)]
+        path = self.write('items.jsonl', '\n'.join(lines[:10] + [''] + lines[10:]) + '\n')
+        progress = []
+        chunks = list(parse_item_file(path, chunk_size=10, progress=progress.append))
+        self.assertEqual([len(items) for items, _ in chunks], [10, 10, 5])
+        self.assertEqual(chunks[2][0][-1]['description'], "Line 24")
+        self.assertEqual(progress, [])
+
+        progress = []
+        big = self.write('big.jsonl', '\n'.join(lines * 200) + '\n')
+        self.assertEqual(sum(len(items) for items, _ in parse_item_file(big, progress=progress.append)), 5000)
+        self.assertEqual(len(progress), 2)
+        self.assertTrue(0 < progress[0] < progress[1] <= 1)
+
+    def test_malformed_jsonl_line_is_reported(self):
+        path = self.write('items.jsonl', '{"description": "A", "quantity": 1, "rate": 1}\n'
+                                         '{"description": "B",\n'
+                                         '{"description": "C", "quantity": 1, "rate": 1}\n')
+        items, errors = self.parse(path)
+        self.assertEqual([item['description'] for item in items], ["A", "C"])
+        self.assertEqual([row for row, _ in errors], [2])
+        self.assertIn("invalid JSON", errors[0][1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+import os
+import random
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import ItemStore
+
+
+class ItemStoreTest(unittest.TestCase):
+    def assert_matches(self, store, ids, items):
+        self.assertEqual(len(store), len(items))
+        self.assertEqual(list(store), items)
+        for position, item_id in enumerate(ids):
+            self.assertEqual(store.index(item_id), position)
+            self.assertIs(store.get(item_id), items[position])
+        if items:
+            self.assertIs(store[-1], items[-1])
+
+    def test_against_a_list(self):
+        # Enough adds and removes to grow the tree past its first capacity
+        # and to compact the holes away more than once
+        rng = random.Random(11)
+        store = ItemStore()
+        ids, items = [], []
+        for step in range(3000):
+            if items and rng.random() < 0.45:
+                position = rng.randrange(len(items))
+                self.assertIs(store.remove(ids.pop(position)), items.pop(position))
+            else:
+                item = {'description': f"Line {step}"}
+                ids.append(store.add(item))
+                items.append(item)
+            if step % 97 == 0:
+                self.assert_matches(store, ids, items)
+        self.assert_matches(store, ids, items)
+
+        for position in range(0, len(items), 7):
+            self.assertIs(store[position], items[position])
+        for start, count in [(0, 10), (5, 3), (len(items) - 2, 10), (len(items), 5)]:
+            self.assertEqual(store.window(start, count),
+                             list(zip(ids, items))[start:start + count])
+
+    def test_ids_stay_stable_across_compaction(self):
+        store = ItemStore({'n': n} for n in range(200))
+        for item_id in range(150):
+            store.remove(item_id)
+        self.assertEqual(store.get(199), {'n': 199})
+        self.assertEqual(store.index(150), 0)
+        self.assertEqual(store.add({'n': 200}), 200)
+        self.assertEqual(store.window(49, 5), [(199, {'n': 199}), (200, {'n': 200})])
+
+    def test_out_of_range(self):
+        store = ItemStore([{'n': 0}])
+        with self.assertRaises(IndexError):
+            store[1]
+        with self.assertRaises(KeyError):
+            store.remove(5)
+        store.clear()
+        self.assertEqual(len(store), 0)
+        self.assertEqual(store.window(0, 10), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image
+
+from main import LogoCache
+
+
+def write_logo(path, size=(400, 100), color='red'):
+    Image.new('RGB', size, color).save(path)
+    return path
+
+
+class LogoCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = write_logo(os.path.join(self.tmp.name, 'logo.png'))
+
+    def test_same_file_is_decoded_once(self):
+        cache = LogoCache()
+        asset = cache.get(self.path)
+        self.assertIs(cache.get(os.path.relpath(self.path)), asset)
+        self.assertEqual(asset.contained.size, (200, 50))
+        self.assertEqual(asset.contained.mode, 'RGBA')
+        self.assertAlmostEqual(asset.pdf_width / asset.pdf_height, 4)
+
+    def test_changed_file_replaces_the_old_entry(self):
+        cache = LogoCache()
+        old = cache.get(self.path)
+        write_logo(self.path, (100, 100), 'blue')
+        os.utime(self.path, ns=(0, os.stat(self.path).st_mtime_ns + 10 ** 9))
+        new = cache.get(self.path)
+        self.assertIsNot(new, old)
+        self.assertEqual(new.contained.size, (80, 80))
+        self.assertEqual(cache.total_bytes, new.nbytes)
+
+    def test_evicts_least_recently_used_by_bytes(self):
+        paths = [write_logo(os.path.join(self.tmp.name, f'logo{n}.png')) for n in range(3)]
+        cache = LogoCache(max_bytes=1)
+        first = cache.get(paths[0])
+        cache.get(paths[1])
+        # Over the budget, only the newest entry is kept
+        self.assertEqual(len(cache._entries), 1)
+        self.assertIsNot(cache.get(paths[0]), first)
+
+        cache = LogoCache(max_bytes=2 * first.nbytes)
+        a, b = cache.get(paths[0]), cache.get(paths[1])
+        cache.get(paths[0])
+        cache.get(paths[2])
+        self.assertIs(cache.get(paths[0]), a)
+        self.assertIsNot(cache.get(paths[1]), b)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,184 @@
+import base64
+import io
+import json
+import os
+import re
+import sys
+import tempfile
+import threading
+import unittest
+import zlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import (PDF_LARGE_ITEM_THRESHOLD, PDF_PROFILES, PdfTemplate, load_invoice_record, load_pdf_template,
+                  render_pdf_invoice, render_pdf_statement)
+
+
+def make_invoice(count=3, **fields):
+    record = {
+        'customer_name': "Customer",
+        'invoice_number': "P-1",
+        'invoice_date': "2026-01-01",
+        'items': [{'description': f"Line {n}", 'quantity': 1, 'rate': n + 1} for n in range(count)],
+    }
+    record.update(fields)
+    return load_invoice_record(record)
+
+
+def render(invoice, **options):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'invoice.pdf')
+        render_pdf_invoice(invoice, path, **options)
+        with open(path, 'rb') as file:
+            return file.read()
+
+
+def pdf_strings(data):
+    # Every string drawn on the pages, in drawing order
+    strings = []
+    for match in re.finditer(rb'/Filter \[ ([^\]]*)\] /Length \d+\s*>>\s*stream\r?\n(.*?)endstream', data, re.S):
+        filters, stream = match.groups()
+        if b'/ASCII85Decode' in filters:
+            stream = base64.a85decode(stream.strip()[:-2])
+        if b'/FlateDecode' in filters:
+            stream = zlib.decompress(stream)
+        strings += [text.decode('latin-1') for text in re.findall(rb'\((.*?)\) Tj', stream)]
+    return strings
+
+
+def page_count(data):
+    return len(re.findall(rb'/Type /Page\b', data))
+
+
+class LargePdfTest(unittest.TestCase):
+    def test_every_item_is_drawn_in_order_across_pages(self):
+        count = 1200
+        data = render(make_invoice(count), large=True)
+        strings = pdf_strings(data)
+        lines = [text for text in strings if text.startswith("Line ")]
+        self.assertEqual(lines, [f"Line {n}" for n in range(count)])
+        pages = page_count(data)
+        self.assertGreater(pages, 20)
+        self.assertEqual([text for text in strings if re.fullmatch(r"Page \d+", text)],
+                         [f"Page {n}" for n in range(1, pages + 1)])
+        self.assertIn(f"{sum(range(1, count + 1)):.2f}", ''.join(strings[-6:]))
+
+    def test_canvas_path_draws_the_same_cells(self):
+        invoice = make_invoice(5, company_name="Seller", due_date="2026-02-01")
+        story = {text.strip() for text in pdf_strings(render(invoice, large=False))}
+        canvas = {text.strip() for text in pdf_strings(render(invoice, large=True))}
+        self.assertLessEqual(story, canvas)
+
+    def test_switches_to_the_canvas_path_above_the_threshold(self):
+        small = pdf_strings(render(make_invoice(PDF_LARGE_ITEM_THRESHOLD)))
+        large = pdf_strings(render(make_invoice(PDF_LARGE_ITEM_THRESHOLD + 1)))
+        self.assertNotIn("Page 1", small)
+        self.assertIn("Page 1", large)
+
+
+class PdfTemplateTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.path = os.path.join(self.tmp.name, 'template.json')
+
+    def write_template(self, settings, mtime_ns=None):
+        with open(self.path, 'w', encoding='utf-8') as file:
+            json.dump(settings, file)
+        if mtime_ns is not None:
+            os.utime(self.path, ns=(mtime_ns, mtime_ns))
+
+    def test_compiled_once_per_file_version(self):
+        self.write_template({'title': "FACTURE"}, 10 ** 18)
+        template = load_pdf_template(self.path)
+        self.assertIs(load_pdf_template(self.path), template)
+        self.write_template({'title': "RECHNUNG"}, 10 ** 18 + 10 ** 9)
+        self.assertEqual(load_pdf_template(self.path).title, "RECHNUNG")
+        self.assertIs(load_pdf_template(), load_pdf_template())
+
+    def test_read_only_once_compiled(self):
+        with self.assertRaises(AttributeError):
+            load_pdf_template().title = "CHANGED"
+
+    def test_invalid_settings_are_refused(self):
+        for settings in ({'colour': 'red'}, {'columns': ['description', 'sku']}, {'columns': []}):
+            with self.assertRaises(ValueError):
+                PdfTemplate(settings)
+
+    def test_both_paths_follow_the_template(self):
+        template = PdfTemplate({'title': "FACTURE", 'currency': "EUR ", 'footer': "Merci",
+                                'columns': ['description', {'key': 'amount', 'heading': "Montant", 'width': 2}]})
+        for large in (False, True):
+            strings = pdf_strings(render(make_invoice(2), large=large, template=template))
+            self.assertIn("FACTURE", strings)
+            self.assertIn("Montant", strings)
+            self.assertNotIn("Rate", strings)
+            self.assertIn("EUR 2.00", strings)
+            if not large:
+                self.assertIn("Merci", strings)
+
+
+class StatementTest(unittest.TestCase):
+    def render(self, invoices):
+        stream = io.BytesIO()
+        render_pdf_statement(invoices, stream)
+        return stream.getvalue()
+
+    def test_summary_then_one_bookmarked_invoice_per_page(self):
+        invoices = [make_invoice(invoice_number=f"S-{n}", invoice_date=f"2026-01-0{n + 1}") for n in range(3)]
+        data = self.render(invoices)
+        self.assertEqual(page_count(data), 4)
+        outline = [title for title in re.findall(rb'/Title \((.*?)\)\s', data) if title != b'Statement']
+        self.assertEqual(outline, [b"Summary", b"S-0 \\(2026-01-01\\)",
+                                   b"S-1 \\(2026-01-02\\)", b"S-2 \\(2026-01-03\\)"])
+
+    def test_shared_logo_is_embedded_once(self):
+        from PIL import Image
+        with tempfile.TemporaryDirectory() as tmp:
+            logo = os.path.join(tmp, 'logo.png')
+            Image.new('RGB', (200, 100), 'red').save(logo)
+            data = self.render([make_invoice(invoice_number=f"S-{n}", logo_path=logo) for n in range(3)])
+        self.assertEqual(data.count(b'/Subtype /Image'), 1)
+
+    def test_needs_an_invoice(self):
+        with self.assertRaises(ValueError):
+            self.render([])
+
+
+class PdfProfileTest(unittest.TestCase):
+    def test_compact_encoding_stays_in_its_own_thread(self):
+        from reportlab import rl_config
+        seen = []
+        with PDF_PROFILES['compact'].encoding():
+            thread = threading.Thread(target=lambda: seen.append(rl_config.useA85))
+            thread.start()
+            thread.join()
+            self.assertEqual(rl_config.useA85, 0)
+        self.assertEqual(seen, [1])
+        self.assertEqual(rl_config.useA85, 1)
+
+    def test_default_render_beside_compact_render_keeps_ascii85(self):
+        results = {}
+        entered = threading.Event()
+        release = threading.Event()
+
+        def compact():
+            with PDF_PROFILES['compact'].encoding():
+                entered.set()
+                release.wait(5)
+                results['compact'] = render(make_invoice(), profile='compact')
+
+        thread = threading.Thread(target=compact)
+        thread.start()
+        entered.wait(5)
+        results['default'] = render(make_invoice(), profile='default')
+        release.set()
+        thread.join()
+        self.assertIn(b'/ASCII85Decode', results['default'])
+        self.assertNotIn(b'/ASCII85Decode', results['compact'])
+        self.assertLess(len(results['compact']), len(results['default']))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,146 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import (PREVIEW_MAX_CHANGES, InvoiceGenerator, invoice_text_footer, invoice_text_header,
+                  invoice_totals, load_invoice_record)
+
+
+class FakeRoot:
+    def __init__(self):
+        self.pending = {}
+        self.scheduled = 0
+
+    def after(self, ms, callback):
+        self.scheduled += 1
+        after_id = f"after#{self.scheduled}"
+        self.pending[after_id] = callback
+        return after_id
+
+    def after_cancel(self, after_id):
+        self.pending.pop(after_id, None)
+
+
+class FakeText:
+    # The parts of tk.Text the preview uses: "line.column" and "end"
+    # indices, with the trailing newline Tk always keeps
+    def __init__(self):
+        self.text = '\n'
+        self.state = 'normal'
+        self.rewrites = 0
+
+    def offset(self, index):
+        if index == 'end':
+            return len(self.text) - 1
+        line, column = (int(part) for part in str(index).split('.'))
+        start = 0
+        for _ in range(line - 1):
+            start = self.text.find('\n', start) + 1
+            if start == 0:
+                return len(self.text) - 1
+        return min(start + column, len(self.text) - 1)
+
+    def insert(self, index, text):
+        offset = self.offset(index)
+        self.text = self.text[:offset] + text + self.text[offset:]
+
+    def delete(self, start, end):
+        if self.offset(start) == 0 and end == 'end':
+            self.rewrites += 1
+        start, end = self.offset(start), self.offset(end)
+        self.text = self.text[:start] + self.text[end:]
+
+    def configure(self, state=None):
+        self.state = state
+
+
+def make_item(n):
+    return load_invoice_record({'items': [{'description': f"Line {n}", 'quantity': 1, 'rate': n}]})['items'][0]
+
+
+class PreviewTest(unittest.TestCase):
+    def setUp(self):
+        self.invoice = load_invoice_record({'customer_name': "Customer", 'invoice_number': "V-1",
+                                            'invoice_date': "2026-01-01",
+                                            'items': [{'description': "Line 0", 'quantity': 1, 'rate': 1}]})
+        self.thumbnails = []
+        app = self.app = InvoiceGenerator.__new__(InvoiceGenerator)
+        app.root = FakeRoot()
+        app.preview_text = FakeText()
+        app.preview_after = None
+        app.preview_header = None
+        app.preview_footer_key = None
+        app.preview_lines = (0, 0)
+        app.preview_changes = [('reset',)]
+        app.get_invoice_data = lambda: dict(self.invoice, items=list(self.invoice['items']))
+        app.calculate_totals = lambda: invoice_totals(self.invoice)
+        app.request_thumbnail = lambda invoice, totals: self.thumbnails.append(totals)
+        app.update_preview()
+
+    def expected(self):
+        lines = ''.join(InvoiceGenerator.preview_line(item) for item in self.invoice['items'])
+        return invoice_text_header(self.invoice) + lines + invoice_text_footer(invoice_totals(self.invoice))
+
+    def assertPreview(self):
+        def strip(text):
+            return [line for line in text.splitlines() if not line.startswith("Generated on")]
+        # Less the newline Tk keeps at the end
+        self.assertEqual(strip(self.app.preview_text.text[:-1]), strip(self.expected()))
+
+    def add(self, item):
+        self.invoice['items'].append(item)
+        self.app.preview_items_changed(('add', item))
+
+    def remove(self, position):
+        del self.invoice['items'][position]
+        self.app.preview_items_changed(('remove', position))
+
+    def test_edits_are_applied_in_place(self):
+        self.assertPreview()
+        self.add(make_item(1))
+        self.add(make_item(2))
+        self.remove(0)
+        self.invoice['customer_name'] = "Someone Else"
+        self.app.update_preview()
+        self.assertPreview()
+        self.remove(1)
+        self.app.update_preview()
+        self.assertPreview()
+        # Only the first update rebuilt the whole text
+        self.assertEqual(self.app.preview_text.rewrites, 1)
+        self.assertEqual(len(self.thumbnails), 3)
+
+    def test_updates_are_debounced(self):
+        self.add(make_item(1))
+        self.add(make_item(2))
+        self.assertEqual(len(self.app.root.pending), 1)
+        self.app.root.pending.popitem()[1]()
+        self.assertPreview()
+        self.assertIsNone(self.app.preview_after)
+
+    def test_unchanged_preview_is_left_alone(self):
+        text = self.app.preview_text.text
+        self.app.update_preview()
+        self.assertEqual(self.app.preview_text.text, text)
+        self.assertEqual(len(self.thumbnails), 1)
+
+    def test_too_many_changes_become_one_rebuild(self):
+        for n in range(PREVIEW_MAX_CHANGES + 1):
+            self.add(make_item(n))
+        self.assertEqual(self.app.preview_changes, [('reset',)])
+        self.app.update_preview()
+        self.assertPreview()
+        self.assertEqual(self.app.preview_text.rewrites, 2)
+
+    def test_preview_is_read_only_between_updates(self):
+        self.assertEqual(self.app.preview_text.state, 'disabled')
+        self.add(make_item(1))
+        self.app.update_preview()
+        self.assertPreview()
+        self.assertEqual(self.app.preview_text.state, 'disabled')
+
+
+if __name__ == '__main__':
+    unittest.main()
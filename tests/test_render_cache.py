@@ -0,0 +1,149 @@
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import RenderCache, get_render_cache, load_invoice_record
+
+
+def make_invoice(**fields):
+    record = {
+        'customer_name': "Customer",
+        'invoice_number': "C-1",
+        'invoice_date': "2026-01-01",
+        'items': [{'description': "Line", 'quantity': 2, 'rate': "1.25"}],
+    }
+    record.update(fields)
+    return load_invoice_record(record)
+
+
+def write(path, data):
+    with open(path, 'wb') as file:
+        file.write(data)
+    return path
+
+
+def read(path):
+    with open(path, 'rb') as file:
+        return file.read()
+
+
+class RenderCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache = RenderCache(os.path.join(self.tmp.name, 'cache'))
+        self.out = os.path.join(self.tmp.name, 'out')
+        os.mkdir(self.out)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def output(self, name):
+        return os.path.join(self.out, name)
+
+    def test_miss_then_hit(self):
+        key = self.cache.key(make_invoice(), 'pdf', '1')
+        self.assertIsNone(self.cache.fetch(key, self.output('a.pdf')))
+        self.assertTrue(self.cache.store(key, self.output('a.pdf'), [write(self.output('a.pdf'), b'%PDF a')]))
+        self.assertEqual(self.cache.fetch(key, self.output('b.pdf')), [self.output('b.pdf')])
+        self.assertEqual(read(self.output('b.pdf')), b'%PDF a')
+
+    def test_pages_follow_the_requested_name(self):
+        key = self.cache.key(make_invoice(), 'jpg', '1')
+        pages = [write(self.output('first-001.jpeg'), b'one'), write(self.output('first-002.jpeg'), b'two')]
+        self.assertTrue(self.cache.store(key, self.output('first.jpeg'), pages))
+        paths = self.cache.fetch(key, self.output('second.jpg'))
+        self.assertEqual(paths, [self.output('second-001.jpg'), self.output('second-002.jpg')])
+        self.assertEqual([read(path) for path in paths], [b'one', b'two'])
+
+    def test_outputs_not_named_after_the_request_are_not_stored(self):
+        key = self.cache.key(make_invoice(), 'pdf', '1')
+        self.assertFalse(self.cache.store(key, self.output('a.pdf'), [write(self.output('other.pdf'), b'x')]))
+        self.assertIsNone(self.cache.fetch(key, self.output('a.pdf')))
+
+    def test_damaged_entry_is_a_miss(self):
+        key = self.cache.key(make_invoice(), 'pdf', '1')
+        self.cache.store(key, self.output('a.pdf'), [write(self.output('a.pdf'), b'0123456789')])
+        entry_path = self.cache._entry_path(key)
+        write(entry_path, read(entry_path)[:-4])
+        self.assertIsNone(self.cache.fetch(key, self.output('b.pdf')))
+        self.assertFalse(os.path.exists(entry_path))
+
+    def test_key_changes_with_what_the_export_shows(self):
+        base = make_invoice()
+        key = self.cache.key(base, 'pdf', '1')
+        self.assertEqual(self.cache.key(make_invoice(), 'pdf', '1'), key)
+        changed = [
+            make_invoice(items=[{'description': "Line", 'quantity': 3, 'rate': "1.25"}]),
+            make_invoice(items=[{'description': "Other", 'quantity': 2, 'rate': "1.25"}]),
+            make_invoice(items=[{'description': "Line", 'quantity': 2, 'rate': "1.25", 'tax_rate': "5"}]),
+            make_invoice(items=[{'description': "Line", 'quantity': 2, 'rate': "1.25"}] * 2),
+            make_invoice(customer_name="Someone else"),
+        ]
+        for invoice in changed:
+            self.assertNotEqual(self.cache.key(invoice, 'pdf', '1'), key)
+        self.assertNotEqual(self.cache.key(base, 'png', '1'), key)
+        self.assertNotEqual(self.cache.key(base, 'pdf', '2'), key)
+
+    def test_key_follows_logo_content(self):
+        logo = write(os.path.join(self.tmp.name, 'logo.png'), b'first logo')
+        os.utime(logo, ns=(1_000_000_000, 1_000_000_000))
+        key = self.cache.key(make_invoice(logo_path=logo), 'pdf', '1')
+        self.assertNotEqual(key, self.cache.key(make_invoice(), 'pdf', '1'))
+
+        write(logo, b'other logo')
+        os.utime(logo, ns=(2_000_000_000, 2_000_000_000))
+        self.assertNotEqual(self.cache.key(make_invoice(logo_path=logo), 'pdf', '1'), key)
+
+        os.remove(logo)
+        self.assertNotEqual(self.cache.key(make_invoice(logo_path=logo), 'pdf', '1'), key)
+
+    def test_evicts_least_recently_used_to_low_water(self):
+        cache = RenderCache(os.path.join(self.tmp.name, 'small'), max_bytes=5000, low_water=0.5)
+        keys = []
+        for n in range(4):
+            key = cache.key(make_invoice(invoice_number=f"C-{n}"), 'pdf', '1')
+            cache.store(key, self.output('a.pdf'), [write(self.output('a.pdf'), bytes(1000))])
+            os.utime(cache._entry_path(key), (1000 + n, 1000 + n))
+            keys.append(key)
+        # Reading the oldest entry makes it the most recently used
+        self.assertIsNotNone(cache.fetch(keys[0], self.output('b.pdf')))
+
+        key = cache.key(make_invoice(invoice_number="C-4"), 'pdf', '1')
+        cache.store(key, self.output('a.pdf'), [write(self.output('a.pdf'), bytes(1000))])
+        self.assertLessEqual(cache.total_bytes, 2500)
+        self.assertEqual(cache.total_bytes, sum(size for _, size, _ in cache._entries()))
+        self.assertIsNotNone(cache.fetch(keys[0], self.output('b.pdf')))
+        self.assertIsNotNone(cache.fetch(key, self.output('b.pdf')))
+        for old in keys[1:]:
+            self.assertIsNone(cache.fetch(old, self.output('b.pdf')))
+
+    def test_clear(self):
+        key = self.cache.key(make_invoice(), 'pdf', '1')
+        self.cache.store(key, self.output('a.pdf'), [write(self.output('a.pdf'), b'x')])
+        self.cache.clear()
+        self.assertEqual(self.cache.total_bytes, 0)
+        self.assertIsNone(self.cache.fetch(key, self.output('a.pdf')))
+
+
+class GetRenderCacheTest(unittest.TestCase):
+    def test_off_unless_configured(self):
+        with mock.patch.dict(os.environ, clear=True):
+            self.assertIsNone(get_render_cache())
+        with mock.patch.dict(os.environ, {'INVOICE_RENDER_CACHE': ''}):
+            self.assertIsNone(get_render_cache())
+
+    def test_directory_from_the_environment(self):
+        with tempfile.TemporaryDirectory() as tmp, \
+                mock.patch.dict(os.environ, {'INVOICE_RENDER_CACHE': tmp, 'INVOICE_RENDER_CACHE_MB': '1'}):
+            cache = get_render_cache()
+            self.assertEqual(cache.path, tmp)
+            self.assertEqual(cache.max_bytes, 1024 * 1024)
+            self.assertIs(get_render_cache(), cache)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+import csv
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import (InvoiceStore, ReportData, build_reports, invoice_totals, load_invoice_record,
+                  write_reports_csv)
+
+RECORDS = [
+    # customer, date, due, tax, discount, items as (quantity, rate, line tax, line discount)
+    ("Acme", "2026-01-05", "2026-02-04", "10", "0", [(1, "10.00", None, None), (3, "0.335", "5", None)]),
+    ("acme", "2026-01-20", "2026-04-01", "10", "2.5", [(2, "19.99", "5.0", "10"), (1, "7.01", None, None)]),
+    ("Bolt", "2026-02-11", "", "7.25", "0", [(7, "1.13", None, "0"), (1, "100", None, None)]),
+    ("Bolt", "2026-03-01", "2026-03-31", "0", "5", [(1, "0.05", "20", None)]),
+]
+
+
+def make_invoice(number, customer, date, due, tax, discount, items):
+    return load_invoice_record({
+        'customer_name': customer, 'invoice_number': number, 'invoice_date': date, 'due_date': due,
+        'tax_rate': tax, 'discount': discount,
+        'items': [{'description': "Line", 'quantity': quantity, 'rate': rate,
+                   'tax_rate': line_tax, 'discount': line_discount}
+                  for quantity, rate, line_tax, line_discount in items],
+    })
+
+
+def cents(value):
+    return int(value * 100)
+
+
+class ReportsTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.store = InvoiceStore(os.path.join(self.tmp.name, 'store.db'))
+        self.addCleanup(self.store.close)
+        self.invoices = [make_invoice(f"R-{n}", *record) for n, record in enumerate(RECORDS)]
+        self.store.save_many(self.invoices)
+        self.reports = {report.title.split(' as of')[0]: report
+                        for report in build_reports(ReportData(self.store), as_of="2026-03-15")}
+
+    def expected(self, invoices):
+        totals = [invoice_totals(invoice) for invoice in invoices]
+        return [sum(cents(t[column]) for t in totals) for column in range(4)]
+
+    def test_every_report_adds_up_to_the_invoice_totals(self):
+        subtotal, discount, tax, total = self.expected(self.invoices)
+        self.assertEqual(self.reports["Revenue by customer"].total_row()[2:], [subtotal, discount, tax, total])
+        self.assertEqual(self.reports["Revenue by month"].total_row()[2:], [subtotal, discount, tax, total])
+        tax_row = self.reports["Tax by rate"].total_row()
+        self.assertEqual([tax_row[2], tax_row[3], tax_row[5]], [subtotal, discount, tax])
+        self.assertEqual(self.reports["Receivables aging"].total_row()[-1], total)
+
+    def test_customers_group_case_insensitively(self):
+        rows = {row[0]: row for row in self.reports["Revenue by customer"].rows}
+        self.assertEqual(sorted(rows), ["Acme", "Bolt"])
+        self.assertEqual(rows["Acme"][1], 2)
+        self.assertEqual(rows["Acme"][5], self.expected(self.invoices[:2])[3])
+
+    def test_tax_rates_merge_equal_texts(self):
+        # "5" and "5.0" are one rate; R-3's invoice rate of 0 has no items under it
+        rates = [row[:2] for row in self.reports["Tax by rate"].rows]
+        self.assertEqual(rates, [["5%", 2], ["7.25%", 2], ["10%", 2], ["20%", 1]])
+
+    def test_aging_buckets(self):
+        rows = {row[0]: row for row in self.reports["Receivables aging"].rows}
+        totals = [cents(invoice_totals(invoice)[3]) for invoice in self.invoices]
+        # Acme: R-0 is 39 days overdue, R-1 not yet due
+        self.assertEqual(rows["Acme"][1:7], [totals[1], 0, totals[0], 0, 0, 0])
+        # Bolt: R-2 has no due date, R-3 is not yet due
+        self.assertEqual(rows["Bolt"][1:7], [totals[3], 0, 0, 0, 0, totals[2]])
+
+    def test_filters_and_csv(self):
+        data = ReportData(self.store, customer="bolt")
+        self.assertEqual(len(data), 2)
+        path = os.path.join(self.tmp.name, 'report.csv')
+        write_reports_csv(build_reports(data, ['customer']), path)
+        with open(path, encoding='utf-8', newline='') as file:
+            rows = list(csv.reader(file))
+        total = self.expected(self.invoices[2:])[3]
+        self.assertEqual(rows[0], ["Revenue by customer"])
+        self.assertEqual(rows[-2][-1], f"{total // 100}.{total % 100:02d}")
+
+
+if __name__ == '__main__':
+    unittest.main()
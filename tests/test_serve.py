@@ -0,0 +1,111 @@
+import asyncio
+import concurrent.futures
+import json
+import os
+import sys
+import threading
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main
+from main import RenderServer
+
+RECORD = {'customer_name': "Customer", 'invoice_number': "S-1",
+          'items': [{'description': "Line", 'quantity': 1, 'rate': "9.50"}]}
+
+
+class RenderServerTest(unittest.TestCase):
+    # Renders run on a thread pool here; the server only needs submit()
+    def setUp(self):
+        self.release = threading.Event()
+        self.addCleanup(self.release.set)
+
+    def blocking_render(self, invoice, fmt, timed=False):
+        self.release.wait(5)
+        return b"rendered", []
+
+    def run_server(self, coroutine_function, **options):
+        server = RenderServer(**options)
+
+        async def run():
+            server._loop = asyncio.get_running_loop()
+            server._executor = concurrent.futures.ThreadPoolExecutor(server.workers)
+            try:
+                return await coroutine_function(server)
+            finally:
+                self.release.set()
+                server._executor.shutdown(wait=True)
+
+        return asyncio.run(run()), server
+
+    def test_malformed_body_gets_400(self):
+        async def post(server):
+            listener = await asyncio.start_server(server.handle_connection, '127.0.0.1', 0)
+            async with listener:
+                port = listener.sockets[0].getsockname()[1]
+                reader, writer = await asyncio.open_connection('127.0.0.1', port)
+                statuses = []
+                for body in (b'{"items": 5}', b'[1, 2]', b'not json'):
+                    writer.write(b"POST /render/txt HTTP/1.1\r\nContent-Length: %d\r\n\r\n" % len(body) + body)
+                    head = await reader.readuntil(b'\r\n\r\n')
+                    length = int(head.split(b'Content-Length: ')[1].split(b'\r\n')[0])
+                    payload = json.loads(await reader.readexactly(length))
+                    statuses.append((int(head.split(b' ')[1]), 'error' in payload))
+                writer.close()
+                return statuses
+
+        statuses, _ = self.run_server(post, workers=1)
+        self.assertEqual(statuses, [(400, True)] * 3)
+
+    def test_stalled_body_gets_408(self):
+        async def stall(server):
+            listener = await asyncio.start_server(server.handle_connection, '127.0.0.1', 0)
+            async with listener:
+                port = listener.sockets[0].getsockname()[1]
+                reader, writer = await asyncio.open_connection('127.0.0.1', port)
+                writer.write(b"POST /render/txt HTTP/1.1\r\nContent-Length: 100\r\n\r\n{\"items\"")
+                head = await reader.readuntil(b'\r\n\r\n')
+                writer.close()
+                return head
+
+        with mock.patch.object(main, 'SERVE_KEEPALIVE_SECONDS', 0.05):
+            head, _ = self.run_server(stall, workers=1)
+        self.assertEqual(head.split(b' ')[1], b'408')
+        self.assertIn(b"Connection: close", head)
+
+    def test_requests_over_capacity_get_429(self):
+        async def flood(server):
+            body = json.dumps(RECORD).encode('utf-8')
+            first = asyncio.ensure_future(server.dispatch('POST', '/render/txt', body))
+            await asyncio.sleep(0.05)
+            status, _, extra = await server.dispatch('POST', '/render/txt', body)
+            self.release.set()
+            return status, extra, (await first)[0]
+
+        with mock.patch.object(main, '_serve_render', self.blocking_render):
+            (status, extra, first_status), server = self.run_server(flood, workers=1, queue_limit=0)
+        self.assertEqual((status, extra), (429, {'Retry-After': '1'}))
+        self.assertEqual(first_status, 200)
+        self.assertEqual((server.counts['rejected'], server.counts['served']), (1, 1))
+
+    def test_slow_render_gets_504_and_keeps_its_slot(self):
+        async def slow(server):
+            body = json.dumps(RECORD).encode('utf-8')
+            status, payload, _ = await server.dispatch('POST', '/render/txt', body)
+            # The worker is still busy, so the slot stays taken until it finishes
+            in_flight = server.in_flight
+            self.release.set()
+            while server.in_flight:
+                await asyncio.sleep(0.01)
+            return status, in_flight
+
+        with mock.patch.object(main, '_serve_render', self.blocking_render):
+            (status, in_flight), server = self.run_server(slow, workers=1, timeout=0.05)
+        self.assertEqual((status, in_flight), (504, 1))
+        self.assertEqual(server.counts['timed_out'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,44 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import InvoiceStore, load_invoice_record
+
+
+def make_invoice(number):
+    return load_invoice_record({
+        'customer_name': "Customer",
+        'invoice_number': number,
+        'invoice_date': "2026-01-01",
+        'items': [{'description': "Line", 'quantity': 2, 'rate': "1.25"}],
+    })
+
+
+class SaveManyTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = InvoiceStore(os.path.join(self.tmp.name, 'store.db'))
+
+    def tearDown(self):
+        self.store.close()
+        self.tmp.cleanup()
+
+    def test_list_is_saved_once(self):
+        self.assertEqual(self.store.save_many([make_invoice("A-1")]), 1)
+        self.assertEqual(self.store.count(), 1)
+
+    def test_list_spanning_batches(self):
+        invoices = [make_invoice(f"A-{n}") for n in range(5)]
+        self.assertEqual(self.store.save_many(invoices, batch_size=2), 5)
+        self.assertEqual(self.store.count(), 5)
+
+    def test_generator(self):
+        self.assertEqual(self.store.save_many(make_invoice(f"G-{n}") for n in range(3)), 3)
+        self.assertEqual(str(self.store.load(invoice_number="G-2")['items'][0]['amount']), "2.50")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import TEXT_CHUNK_LINES, build_invoice_text, iter_invoice_text, load_invoice_record, write_invoice_text
+
+
+def make_invoice(count):
+    return load_invoice_record({
+        'customer_name': "Customer",
+        'invoice_number': "T-1",
+        'invoice_date': "2026-01-01",
+        'items': [{'description': f"Line {n}", 'quantity': 1, 'rate': "0.50"} for n in range(count)],
+    })
+
+
+def without_timestamp(text):
+    return [line for line in text.splitlines() if not line.startswith("Generated on")]
+
+
+class InvoiceTextTest(unittest.TestCase):
+    def test_items_come_in_chunks_between_header_and_footer(self):
+        count = 2 * TEXT_CHUNK_LINES + 500
+        chunks = list(iter_invoice_text(make_invoice(count)))
+        self.assertEqual(len(chunks), 5)
+        self.assertIn("Invoice Number: T-1", chunks[0])
+        self.assertEqual([chunk.count('\n') for chunk in chunks[1:4]], [TEXT_CHUNK_LINES, TEXT_CHUNK_LINES, 500])
+        self.assertTrue(chunks[1].startswith("Line 0 "))
+        self.assertTrue(chunks[3].splitlines()[-1].startswith(f"Line {count - 1} "))
+        self.assertIn(f"TOTAL:    ₨{count * 0.5:>11.2f}", chunks[4])
+
+    def test_short_invoice_has_one_item_chunk(self):
+        self.assertEqual(len(list(iter_invoice_text(make_invoice(3)))), 3)
+
+    def test_written_file_matches_the_built_text(self):
+        invoice = make_invoice(TEXT_CHUNK_LINES + 1)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'invoice.txt')
+            write_invoice_text(invoice, path)
+            with open(path, encoding='utf-8') as file:
+                written = file.read()
+        self.assertEqual(without_timestamp(written), without_timestamp(build_invoice_text(invoice)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import os
+import sys
+import tempfile
+import threading
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import PrometheusTextfileSink, Timings
+
+INVOICE = {'invoice_number': "T-1", 'items': 3}
+
+
+def record(timings, operation='pdf'):
+    timer = timings.start(operation, INVOICE)
+    with timer.stage('layout'):
+        pass
+    timer.done()
+
+
+class TimingsTest(unittest.TestCase):
+    def test_collect_leaves_other_threads_on_the_sinks(self):
+        timings = Timings()
+        emitted = []
+        timings.add_sink(emitted.append)
+        inside = threading.Event()
+        other_done = threading.Event()
+
+        def other_thread():
+            inside.wait(5)
+            record(timings, 'serve')
+            other_done.set()
+
+        thread = threading.Thread(target=other_thread)
+        thread.start()
+        with timings.collect() as records:
+            inside.set()
+            other_done.wait(5)
+            record(timings)
+        thread.join()
+        self.assertEqual({r['operation'] for r in records}, {'pdf'})
+        self.assertEqual({r['operation'] for r in emitted}, {'serve'})
+
+    def test_nested_collect_restores_the_outer_list(self):
+        timings = Timings()
+        with timings.collect() as outer:
+            with timings.collect() as inner:
+                record(timings, 'inner')
+            record(timings, 'outer')
+        self.assertEqual({r['operation'] for r in inner}, {'inner'})
+        self.assertEqual({r['operation'] for r in outer}, {'outer'})
+        self.assertFalse(timings.enabled)
+
+    def test_prometheus_label_values_are_escaped(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'metrics.prom')
+            sink = PrometheusTextfileSink(path)
+            sink({'operation': 'my"fmt\\x', 'stage': 'a\nb', 'seconds': 0.5, 'count': 1})
+            sink.close()
+            with open(path, encoding='utf-8') as file:
+                lines = file.read().splitlines()
+        self.assertIn('invoice_render_stage_seconds_count{operation="my\\"fmt\\\\x",stage="a\\nb"} 1', lines)
+        self.assertEqual(len(lines), 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
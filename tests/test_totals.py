@@ -0,0 +1,54 @@
+import os
+import random
+import sys
+import unittest
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import TotalsEngine, compute_totals, make_item
+
+
+def random_items(rng, count):
+    rates = [None, "0", "5", "12.5", "17"]
+    return [make_item(f"Line {n}", rng.choice(["1", "2", "0.5", "3.333"]), f"{rng.randint(1, 99999) / 100:.2f}",
+                      rng.choice(rates), rng.choice(rates))
+            for n in range(count)]
+
+
+class TotalsEngineTest(unittest.TestCase):
+    def test_known_totals(self):
+        items = [make_item("A", 3, "0.35"), make_item("B", 1, "10.00", tax_rate="0", discount="50")]
+        # Group (None, None): 1.05, 10% discount 0.105 -> 0.11, tax 15% of 0.94 = 0.141 -> 0.14
+        # Group (0, 50): 10.00, discount 5.00, no tax
+        self.assertEqual(compute_totals(items, tax_rate="15", discount="10"),
+                         (Decimal("11.05"), Decimal("5.11"), Decimal("0.14"), Decimal("6.08")))
+
+    def test_matches_compute_totals_after_adds_and_removes(self):
+        rng = random.Random(7)
+        engine = TotalsEngine()
+        live = []
+        for item in random_items(rng, 400):
+            engine.add(item)
+            live.append(item)
+            if rng.random() < 0.3:
+                engine.remove(live.pop(rng.randrange(len(live))))
+        for tax_rate, discount in [("0", "0"), ("7.5", "0"), ("20", "12.5")]:
+            self.assertEqual(engine.totals(tax_rate, discount), compute_totals(live, tax_rate, discount))
+        self.assertEqual(engine.item_count, len(live))
+
+    def test_removing_everything_leaves_zero(self):
+        items = random_items(random.Random(3), 20)
+        engine = TotalsEngine(items)
+        for item in items:
+            engine.remove(item)
+        self.assertEqual(engine.totals("10", "5"), (Decimal("0.00"),) * 4)
+        self.assertEqual(engine.item_count, 0)
+
+    def test_malformed_rate_raises(self):
+        with self.assertRaises(ValueError):
+            TotalsEngine([make_item("A", 1, 1)]).totals("abc", "0")
+
+
+if __name__ == '__main__':
+    unittest.main()